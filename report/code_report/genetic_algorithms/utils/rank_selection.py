@@ -1,6 +1,16 @@
+import sys
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import numpy as np
 
+# The rank selection itself is the scheduling engines' (`scheduling/app/utils/rank_selection.py`), the report only plots it
+SCHEDULING_PATH = Path(__file__).resolve().parents[4] / "scheduling"
+if str(SCHEDULING_PATH) not in sys.path:
+    sys.path.append(str(SCHEDULING_PATH))
+
+from app.utils.rank_selection import exponential_rank_selection, linear_rank_selection  # noqa: E402
+
 
 def heatmap_rank_selection(
     fitness_scores: list[float],
@@ -60,7 +70,7 @@ def handle_linear_rank_case(fitness_scores: list[float], selection_pressures: np
     y_label = "Selection Pressure (sp)"
     file_name = "linear_rank_selection_selection_pressure_effect.png"
 
-    fitness_matrix = np.array([linear_rank_selection(fitness_scores, sp) for sp in selection_pressures])
+    fitness_matrix = linear_rank_selection(fitness_scores, selection_pressures)  # <-- every selection pressure at once
 
     return y_tick_labels, y_label, file_name, fitness_matrix
 
@@ -79,68 +89,6 @@ def handle_exponential_rank_case(fitness_scores: list[float], weights: np.ndarra
     y_label = "Weight (w)"
     file_name = "exponential_rank_selection_weight_effect.png"
 
-    fitness_matrix = np.array([exponential_rank_selection(fitness_scores, w) for w in weights])
+    fitness_matrix = exponential_rank_selection(fitness_scores, weights)  # <-- every weight at once
 
     return y_tick_labels, y_label, file_name, fitness_matrix
-
-
-def naive_rank_selection(fitness_scores: list[float]) -> list[float]:
-    ranks = ranking(fitness_scores)
-    fitness = [rank / sum(ranks) for rank in ranks]
-    return fitness
-
-
-def linear_rank_selection(fitness_scores: list[float], selection_pressure: float) -> list[float]:
-    assert 1 <= selection_pressure <= 2, "Selection pressure must be between 1 and 2"
-
-    ranks = ranking(fitness_scores)
-    n = len(ranks)
-    sp = selection_pressure
-
-    fitness = []
-    for rank in ranks:
-        fitness.append((2 - sp + 2 * (sp - 1) * ((rank - 1) / (n - 1))) / n)
-
-    return fitness
-
-
-def exponential_rank_selection(fitness_scores: list[float], weight: float) -> list[float]:
-    assert 0 <= weight <= 1, "Weight must be between 0 and 1"
-
-    ranks = ranking(fitness_scores)
-    n = len(ranks)
-    weight_sum = sum([weight**i for i in range(n)])
-
-    fitness = []
-    for rank in ranks:
-        fitness.append((weight) ** (n - rank) / weight_sum)
-
-    return fitness
-
-
-def ranking(fitness_scores: list[float]) -> list[int]:
-    """
-    Ranks the fitness scores in ascending order from 1 to N ('num elements'). But retains the original index of the fitness score.
-    """
-    sorting_indices = get_sorting_indices(fitness_scores)
-    ranks = get_rank_from_sorting_indices(sorting_indices)
-
-    return ranks
-
-
-def get_rank_from_sorting_indices(sorting_indices: list[int]) -> list[int]:
-    """
-    Returns the rank of each element in the list from the sorting indices.
-    """
-    n = len(sorting_indices)
-    ranks = [sorting_indices.index(i) + 1 for i in range(n)]
-    return ranks
-
-
-def get_sorting_indices(some_list: list) -> list[int]:
-    """
-    Returns the indices that would sort the list in ascending order.
-    """
-    n = len(some_list)
-    sorting_indices = sorted(range(n), key=some_list.__getitem__)
-    return sorting_indices
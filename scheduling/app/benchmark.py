@@ -0,0 +1,156 @@
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from app.utils.instance_generator import generate_instance
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solver_backends import BACKENDS, solve_with_backend
+
+RESULT_PATH = "data/results/benchmarks/scaling.csv"
+
+# The default grid - from one sector-month up to a quarter
+BENCHMARK_AGENTS = [10, 20, 40]
+BENCHMARK_TASKS = [6, 10]
+BENCHMARK_DAYS = [31, 92]
+BENCHMARK_DENSITIES = [0.5]
+
+
+def peak_memory_mb() -> float | None:
+    """Peak resident memory of the current process in MB (None where the platform doesn't report it)."""
+    try:
+        import resource
+    except ImportError:  # <-- Windows
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024  # <-- bytes on macOS, kilobytes on Linux
+
+
+def benchmark_instance(
+    path: str, sparse: bool = True, max_time_in_seconds: float = 60.0, backend: str = "CP-SAT"
+) -> dict[str, float | int | str]:
+    """
+    Parse, build and solve a single data-file, timing each stage.
+
+    NOTE: Run this in a fresh process per instance, otherwise the peak memory is that of the largest instance so far.
+
+    :param path: Path to the data-file.
+    :param sparse: (optional) Whether to build the sparse model. Default is True.
+    :param max_time_in_seconds: (optional) Time limit for the solver. Default is 60 seconds.
+    :param backend: (optional) The solver, one of `BACKENDS` (the MIP solvers solve the same model, see `MipModel`). Default is CP-SAT.
+
+    :return: Dictionary of metrics for the instance.
+    """
+    start = time.perf_counter()
+    workbook = read_workbook(path)
+    tasks, task_schedules, agents = parse_constraints(workbook)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    back_model = BackSchedulingModel(
+        tasks, task_schedules, agents, sparse=sparse, dates=workbook.dates, requirements=read_requirements(workbook)
+    ).build()
+    build_time = time.perf_counter() - start
+
+    model_proto = back_model.model.Proto()
+    status, objective, bound, solve_time, _ = solve_with_backend(back_model, backend, max_time_in_seconds)
+
+    return {
+        "backend": backend,
+        "parse_s": parse_time,
+        "build_s": build_time,
+        "variables": len(model_proto.variables),
+        "constraints": len(model_proto.constraints),
+        "solve_s": solve_time,
+        "status": status,
+        "objective": objective,
+        "bound": bound,
+        "peak_mb": peak_memory_mb(),
+    }
+
+
+def benchmark_backends(
+    path: str, backends: list[str], sparse: bool = True, max_time_in_seconds: float = 60.0, verbose: bool = True
+) -> list[dict[str, float | int | str]]:
+    """
+    Benchmark every backend on the same data-file, each in its own process.
+
+    :return: List of the metrics of each backend.
+    """
+    rows = []
+    for backend in backends:
+        # A fresh process per run, such that the peak memory belongs to this run only
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+            rows.append(executor.submit(benchmark_instance, path, sparse, max_time_in_seconds, backend).result())
+        if verbose:
+            print(", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in rows[-1].items()))
+
+    return rows
+
+
+def run_benchmarks(
+    agents: list[int],
+    tasks: list[int],
+    days: list[int],
+    densities: list[float],
+    seed: int = 0,
+    sparse: bool = True,
+    max_time_in_seconds: float = 60.0,
+    verbose: bool = True,
+    backends: list[str] | None = None,
+    instance_paths: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Generate an instance for every combination of the grid (or take the given data-files) and benchmark every backend on it.
+
+    :return: DataFrame with one row of metrics per instance and backend.
+    """
+    backends = backends or ["CP-SAT"]
+
+    rows = []
+    for path in instance_paths or []:
+        rows += [{"instance": path} | metrics for metrics in benchmark_backends(path, backends, sparse, max_time_in_seconds, verbose)]
+
+    if instance_paths:
+        return pd.DataFrame(rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_agents, num_tasks, num_days, density in itertools.product(agents, tasks, days, densities):
+            instance = {"agents": num_agents, "tasks": num_tasks, "days": num_days, "density": density, "seed": seed}
+            path = os.path.join(tmp_dir, f"instance_{num_agents}_{num_tasks}_{num_days}_{density}_{seed}.xlsx")
+            generate_instance(path, num_agents, num_tasks, num_days, qualification_density=density, seed=seed)
+
+            rows += [instance | metrics for metrics in benchmark_backends(path, backends, sparse, max_time_in_seconds, verbose)]
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    description = "Scaling benchmark of the back (ryg) scheduling engine (and of its solver backends) on synthetic instances."
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--agents", type=int, nargs="+", default=BENCHMARK_AGENTS)
+    parser.add_argument("--tasks", type=int, nargs="+", default=BENCHMARK_TASKS)
+    parser.add_argument("--days", type=int, nargs="+", default=BENCHMARK_DAYS)
+    parser.add_argument("--densities", type=float, nargs="+", default=BENCHMARK_DENSITIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dense", action="store_true", help="Benchmark the dense model instead of the sparse one.")
+    parser.add_argument("--time-limit", type=float, default=60.0)
+    parser.add_argument("--backends", nargs="+", default=["CP-SAT"], choices=BACKENDS, help="Solvers to compare on the same instances.")
+    parser.add_argument("--instances", nargs="+", help="Benchmark these data-files instead of the synthetic grid.")
+    parser.add_argument("--output", default=RESULT_PATH)
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.agents, args.tasks, args.days, args.densities, args.seed, not args.dense, args.time_limit, True, args.backends, args.instances
+    )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"\n{results.to_string(index=False)}\n\nBenchmark results written to {args.output}")
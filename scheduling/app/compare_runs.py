@@ -0,0 +1,14 @@
+import argparse
+import sys
+
+from app.utils.telemetry import compare_log
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag solve regressions between the two latest runs of every instance family in a solve log.")
+    parser.add_argument("log", help="The solve log (JSON lines), see `back_scheduling(telemetry_path=...)`.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative worsening of a metric that counts as a regression.")
+    args = parser.parse_args()
+
+    regressions = compare_log(args.log, args.tolerance)
+
+    sys.exit(1 if regressions else 0)
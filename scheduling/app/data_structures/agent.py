@@ -1,21 +1,87 @@
+import numpy as np
+
+
+class AgentTable:
+    """
+    Compact, array-backed representation of a roster.
+
+    Agents and tasks are addressed by integer indices, and the roster is stored as three matrices:
+    an agent x task qualification matrix, an agent x day availability matrix and an agent x day preference matrix.
+    Eligibility queries are therefore O(1) lookups and can be vectorized over all agents at once.
+    """
+
+    def __init__(self, names: list[str], tasks: list[str], num_days: int) -> None:
+        self.names = list(names)
+        self.tasks = list(tasks)
+        self.agent_index = {name: indx for indx, name in enumerate(self.names)}
+        self.task_index = {task: indx for indx, task in enumerate(self.tasks)}
+
+        self.qualifications = np.zeros((len(self.names), len(self.tasks)), dtype=bool)
+        self.availability = np.ones((len(self.names), num_days), dtype=bool)
+        self.preferences = np.zeros((len(self.names), num_days), dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_days(self) -> int:
+        return self.availability.shape[1]
+
+    def agents(self) -> list["Agent"]:
+        """Returns an `Agent` view for every row of the table."""
+        return [Agent(self, indx) for indx in range(len(self.names))]
+
+    def set_preferences(self, indx: int, preferences: list[int]) -> None:
+        horizon = len(preferences)
+        if horizon > self.preferences.shape[1]:
+            # The rolling chart may reach further than the doctor charts
+            padding = np.zeros((len(self.names), horizon - self.preferences.shape[1]), dtype=np.int8)
+            self.preferences = np.hstack([self.preferences, padding])
+        self.preferences[indx, :] = 0
+        self.preferences[indx, :horizon] = preferences
+
+
 class Agent:
-    def __init__(self, name: str) -> None:
-        self.name = name
-        self.qualifications = {}
-        self.days_off = []
-        self.task_preferences = []
+    """Thin view of a single row in an `AgentTable`."""
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: AgentTable, index: int) -> None:
+        self.table = table
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.index]
+
+    @property
+    def qualifications(self) -> dict[str, bool]:
+        return dict(zip(self.table.tasks, self.table.qualifications[self.index].tolist(), strict=True))
+
+    @property
+    def days_off(self) -> list[int]:
+        return np.flatnonzero(~self.table.availability[self.index]).tolist()
+
+    @property
+    def task_preferences(self) -> list[int]:
+        return self.table.preferences[self.index].tolist()
 
     def add_qualifications(self, qualifications: dict[str, bool]) -> None:
-        self.qualifications = qualifications
+        for task, qualified in qualifications.items():
+            self.table.qualifications[self.index, self.table.task_index[task]] = qualified
 
     def add_task_preferences(self, preferences: list[int]) -> None:
-        self.task_preferences = preferences
+        self.table.set_preferences(self.index, preferences)
 
     def add_days_off(self, days_off: list[int]) -> None:
-        self.days_off = days_off
+        self.table.availability[self.index, :] = True
+        self.table.availability[self.index, days_off] = False
 
     def qualified(self, task: str) -> bool:
-        return self.qualifications[task]
+        return bool(self.table.qualifications[self.index, self.table.task_index[task]])
+
+    def available(self, day: int) -> bool:
+        return day >= self.table.num_days or bool(self.table.availability[self.index, day])
 
     def __str__(self) -> str:
         return f"{self.name}: \n{self.qualifications}\n{self.task_preferences}\n{self.days_off}"
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+X_MARKERS = ["x", "X"]
+DAYS_OFF_KEYWORDS = ["ønskefridag", "afspadsere", "ønskefri", "FU-dag"]
+
+
+class ScheduleWorkbook:
+    """
+    The sheets of a data-file, read in a single pass over the workbook.
+
+    The "x" markers and the day-off keywords are turned into boolean matrices once, such that the preprocessing
+    and the output (`write_schedule_to_excel`) share the parsed result instead of re-reading the Excel file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        # First column as index - except for the rolling chart, where the dates are in the second column
+        # The rolling chart only exists for sectors with 'Rygvagt', and the requirements sheet is optional (see `requirements`)
+        with pd.ExcelFile(path) as excel:
+            self.tasks = excel.parse("tasks", index_col=0)
+            self.doctors = excel.parse("doctors", index_col=0)
+            self.doctor_charts = excel.parse("doctor_charts", index_col=0)
+            self.rolling_chart = excel.parse("rolling_chart", index_col=1) if "rolling_chart" in excel.sheet_names else None
+            self.requirements_sheet = excel.parse("requirements", index_col=0) if "requirements" in excel.sheet_names else None
+
+        self.task_markers = self.tasks.isin(X_MARKERS).to_numpy()  # <-- day x task
+        self.qualification_markers = self.doctors.isin(X_MARKERS).to_numpy()  # <-- agent x task
+        self.days_off_markers = self.doctor_charts.isin(DAYS_OFF_KEYWORDS).to_numpy()  # <-- day x agent
+
+    @property
+    def dates(self) -> pd.Index:
+        return self.tasks.index
+
+    @property
+    def task_names(self) -> list[str]:
+        return list(self.tasks.columns)
+
+    @property
+    def agent_names(self) -> list[str]:
+        return list(self.doctors.index)
+
+    @property
+    def rolling_chart_names(self) -> np.ndarray:
+        """The agent (or neuro-surgeon) on 'Rygvagt' for each day of the rolling chart."""
+        return self.rolling_chart[self.rolling_chart.columns[1]].to_numpy()
+
+    @property
+    def requirements(self) -> dict[str, int]:
+        """The number of agents each task requires, from the 'requirements' sheet (task, agents) - empty if there is none."""
+        if self.requirements_sheet is None:
+            return {}
+        counts = self.requirements_sheet[self.requirements_sheet.columns[0]]
+        return {str(task): int(count) for task, count in counts.items()}
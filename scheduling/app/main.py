@@ -1,12 +1,21 @@
 from app.utils.os_structure import write_schedule_to_excel
-from app.utils.schedule_preprocess import parse_constraints
+from app.utils.replan import replan_schedule
+from app.utils.rolling_horizon import rolling_horizon_scheduling
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
 from app.utils.scheduling_engines import back_scheduling
 
 DATA_PATH = "data/2025_january/ryg_data.xlsx"
 RESULT_PATH = "data/results/2025_january/ryg_results.xlsx"
+INCUMBENT_PATH = "data/results/2025_january/ryg_incumbent.xlsx"  # <-- best schedule so far, while the solver is running
+CACHE_DIR = "data/cache"  # <-- solve results of unchanged inputs are reused, see `SolveCache`
+TELEMETRY_PATH = "data/results/telemetry.jsonl"  # <-- solve metrics of every run, compare them with `python -m app.compare_runs`
+PREVIOUS_RESULT_PATH = None  # <-- e.g. "data/results/2024_december/ryg_results.xlsx", to continue from the previous period
+PUBLISHED_RESULT_PATH = None  # <-- e.g. RESULT_PATH, to re-plan the published schedule with as few changes as possible
 
 if __name__ == "__main__":
-    tasks, task_schedules, agents = parse_constraints(DATA_PATH)
+    workbook = read_workbook(DATA_PATH)
+    tasks, task_schedules, agents = parse_constraints(workbook)
+    requirements = read_requirements(workbook)  # <-- the 'requirements' sheet, and the ryg sector's for the tasks it doesn't list
     print("*** Agents ***")
     for agent in agents:
         print(agent)
@@ -15,7 +24,21 @@ if __name__ == "__main__":
     print(tasks)
     print(task_schedules)
 
-    results = back_scheduling(tasks, task_schedules, agents)
+    if PUBLISHED_RESULT_PATH is not None:
+        results = replan_schedule(tasks, task_schedules, agents, PUBLISHED_RESULT_PATH, dates=workbook.dates, requirements=requirements)
+    elif PREVIOUS_RESULT_PATH is None:
+        results = back_scheduling(
+            tasks,
+            task_schedules,
+            agents,
+            incumbent_path=INCUMBENT_PATH,
+            data=workbook,
+            cache_dir=CACHE_DIR,
+            telemetry_path=TELEMETRY_PATH,
+            requirements=requirements,
+        )
+    else:
+        results = rolling_horizon_scheduling(tasks, task_schedules, agents, workbook.dates, PREVIOUS_RESULT_PATH, requirements=requirements)
     if results is not None:
         assignments, agent_assignments = results
-        write_schedule_to_excel(RESULT_PATH, DATA_PATH, assignments, agent_assignments)
+        write_schedule_to_excel(RESULT_PATH, workbook, assignments, agent_assignments)
@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from ortools.sat.python import cp_model
+
+from app.data_structures.agent import Agent
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solution_callbacks import IncumbentCallback
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_WORKERS = 2  # <-- concurrent solves, each using all the solver's workers
+
+# Edits that only take options away can reuse the built model of the instance (its variables are fixed to 0),
+# edits that add options need a model of their own
+RESTRICTING_EDITS = {"day_off", "unqualify"}
+EDITS = RESTRICTING_EDITS | {"qualify", "task_day"}
+EDIT_FIELDS = {  # <-- the fields of each edit and their JSON types
+    "day_off": {"agent": str, "day": int},
+    "qualify": {"agent": str, "task": str},
+    "unqualify": {"agent": str, "task": str},
+    "task_day": {"task": str, "day": int},
+}
+
+
+class Instance:
+    """A parsed data-file, kept in memory together with its built model (built on first use)."""
+
+    def __init__(self, instance_id: str, path: str) -> None:
+        self.id = instance_id
+        self.path = path
+        workbook = read_workbook(path)
+        self.dates = workbook.dates
+        self.tasks, self.task_schedules, self.agents = parse_constraints(workbook)
+        self.requirements = read_requirements(workbook)
+        self._back_model = None
+        self._lock = threading.Lock()
+
+    @property
+    def back_model(self) -> BackSchedulingModel:
+        with self._lock:  # <-- jobs of the same instance may start at once
+            if self._back_model is None:
+                # No presolve and no symmetry breaking, such that the model stays valid under restricting edits
+                self._back_model = BackSchedulingModel(
+                    self.tasks, self.task_schedules, self.agents, symmetry_breaking=False, dates=self.dates, requirements=self.requirements
+                ).build()
+            return self._back_model
+
+    def summary(self) -> dict:
+        num_days = max(max(self.task_schedules[task]) for task in self.tasks) + 1
+        return {"instance": self.id, "path": self.path, "agents": len(self.agents), "tasks": self.tasks, "days": num_days}
+
+
+def apply_edits(
+    tasks: list[str], task_schedules: dict[str, list[int]], agents: list[Agent], edits: list[dict]
+) -> tuple[list[str], dict[str, list[int]], list[Agent]]:
+    """
+    Apply what-if edits to a copy of a parsed instance. The edits are dictionaries with an 'edit' key:
+    - {"edit": "day_off", "agent": name, "day": day}
+    - {"edit": "qualify" / "unqualify", "agent": name, "task": task}
+    - {"edit": "task_day", "task": task, "day": day} (the task is also scheduled on the day)
+
+    :return: Tuple of the edited tasks, task schedules and agents (the original instance is untouched).
+    """
+    task_schedules = copy.deepcopy(task_schedules)
+    agents = copy.deepcopy(agents)  # <-- the agents share one `AgentTable`, which is copied once
+    by_name = {agent.name: agent for agent in agents}
+
+    for edit in edits:
+        match edit.get("edit"):
+            case "day_off":
+                agent = by_name[edit["agent"]]
+                agent.add_days_off(sorted(set(agent.days_off) | {int(edit["day"])}))
+            case "qualify" | "unqualify":
+                if edit["task"] not in task_schedules:
+                    raise ValueError(f"Unknown task '{edit['task']}' in edit {edit}")
+                by_name[edit["agent"]].add_qualifications({edit["task"]: edit["edit"] == "qualify"})
+            case "task_day":
+                task_schedules[edit["task"]] = sorted(set(task_schedules[edit["task"]]) | {int(edit["day"])})
+            case _:
+                raise ValueError(f"Unknown edit {edit}, expected one of {sorted(EDITS)}")
+
+    return tasks, task_schedules, agents
+
+
+def check_edits(edits: object) -> list[dict]:
+    """
+    Check the shape of what-if edits (see `apply_edits`) before they are queued, such that a malformed request is refused
+    rather than failing its job.
+
+    :return: The edits.
+    """
+    if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+        raise ValueError(f"Expected a list of edits, got {edits!r}")
+    for edit in edits:
+        if edit.get("edit") not in EDITS:
+            raise ValueError(f"Unknown edit {edit}, expected one of {sorted(EDITS)}")
+        for field, field_type in EDIT_FIELDS[edit["edit"]].items():
+            if not isinstance(edit.get(field), field_type) or isinstance(edit.get(field), bool):
+                raise ValueError(f"Edit {edit} needs '{field}' of type {field_type.__name__}")
+    return edits
+
+
+class Job:
+    """
+    A solve of an instance under what-if edits. Progress is published as events, to be streamed to any number of listeners.
+    """
+
+    def __init__(self, job_id: str, instance: Instance, edits: list[dict], max_time_in_seconds: float, loop: asyncio.AbstractEventLoop) -> None:
+        self.id = job_id
+        self.instance = instance
+        self.edits = edits
+        self.max_time_in_seconds = max_time_in_seconds
+        self.loop = loop
+
+        self.status = "queued"
+        self.events = []
+        self.listeners = []  # <-- asyncio queues of the streaming requests
+        self.result = None
+        self.solver = None
+        self.cancelled = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ["done", "infeasible", "cancelled", "failed"]
+
+    def publish(self, event: dict) -> None:
+        """Publish an event from any thread (the solver's included)."""
+        self.loop.call_soon_threadsafe(self._append, event)
+
+    def _append(self, event: dict) -> None:
+        self.events.append(event)
+        for queue in self.listeners:
+            queue.put_nowait(event)
+
+    def set_status(self, status: str, **details: object) -> None:
+        self.status = status
+        self.publish({"event": "status", "status": status} | details)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        if self.solver is not None:
+            self.solver.StopSearch()  # <-- thread-safe, the solve returns its best solution so far
+
+    def state(self) -> dict:
+        return {"job": self.id, "instance": self.instance.id, "status": self.status, "edits": self.edits, "result": self.result}
+
+    def model(self) -> tuple[BackSchedulingModel, cp_model.CpModel]:
+        """The model to solve: the instance's model with the edits as fixed variables if possible, otherwise a new one."""
+        if all(edit.get("edit") in RESTRICTING_EDITS for edit in self.edits):
+            names = {agent.name for agent in self.instance.agents}
+            for edit in self.edits:
+                if edit["agent"] not in names:
+                    raise ValueError(f"Unknown agent '{edit['agent']}' in edit {edit}")  # <-- rather than silently solving without it
+                if edit["edit"] == "unqualify" and edit["task"] not in self.instance.task_schedules:
+                    raise ValueError(f"Unknown task '{edit['task']}' in edit {edit}")
+
+            back_model = self.instance.back_model
+            model = back_model.model.Clone()
+            for edit in self.edits:
+                for (name, task, day), var in back_model.x.items():
+                    if name == edit["agent"] and (day == int(edit["day"]) if edit["edit"] == "day_off" else task == edit["task"]):
+                        model.Add(model.GetBoolVarFromProtoIndex(var.Index()) == 0)
+            return back_model, model
+
+        tasks, task_schedules, agents = apply_edits(self.instance.tasks, self.instance.task_schedules, self.instance.agents, self.edits)
+        back_model = BackSchedulingModel(
+            tasks, task_schedules, agents, symmetry_breaking=False, dates=self.instance.dates, requirements=self.instance.requirements
+        ).build()
+        return back_model, back_model.model
+
+    def run(self) -> None:
+        """Solve the job (in a worker thread)."""
+        if self.cancelled.is_set():
+            self.set_status("cancelled")
+            return
+
+        try:
+            self.set_status("building")
+            back_model, model = self.model()
+
+            def on_incumbent(incumbent: dict) -> bool:
+                event = {key: incumbent[key] for key in ["objective", "bound", "elapsed"]}
+                self.publish({"event": "incumbent"} | event)
+                return self.cancelled.is_set()
+
+            def stop_if_cancelled(_: str) -> None:
+                # `StopSearch` is lost when called before the solve started, which the solver's log (from its very start) catches
+                if self.cancelled.is_set():
+                    self.solver.StopSearch()
+
+            callback = IncumbentCallback(back_model, on_incumbent, verbose=False)
+            self.solver = cp_model.CpSolver()
+            self.solver.parameters.max_time_in_seconds = self.max_time_in_seconds
+            self.solver.parameters.log_search_progress = True
+            self.solver.parameters.log_to_stdout = False
+            self.solver.log_callback = stop_if_cancelled
+            self.set_status("solving")
+            if self.cancelled.is_set():  # <-- cancelled while building, before `StopSearch` could reach the solver
+                self.set_status("cancelled")
+                return
+            status = self.solver.Solve(model, callback)
+
+            if callback.best is not None:
+                self.result = {
+                    "status": self.solver.StatusName(status),
+                    "objective": callback.best["objective"],
+                    "assignments": callback.best["assignments"],
+                    "agent_assignments": callback.best["agent_assignments"],
+                }
+                self.publish({"event": "result"} | self.result)
+            if self.cancelled.is_set():
+                self.set_status("cancelled")
+            else:
+                self.set_status("done" if callback.best is not None else "infeasible", solver_status=self.solver.StatusName(status))
+        except Exception as error:  # <-- any error fails the job, such that its listeners get the terminal event
+            self.set_status("failed", error=f"{type(error).__name__}: {error}")
+
+
+class SchedulingService:
+    """
+    Long-lived local scheduling service: parsed instances and their built models stay in memory between requests,
+    and what-if solves run as cancellable jobs in a worker pool.
+
+    JSON over HTTP:
+    - POST /instances {"path": ...}: parse a data-file, GET /instances: the loaded instances
+    - POST /instances/<id>/jobs {"edits": [...], "max_time": seconds}: start a what-if solve, see `apply_edits` for the edits
+    - GET /jobs/<id>: the state of a job (and its schedule, when done)
+    - GET /jobs/<id>/events: stream the job's events (status, incumbents, result) as JSON lines, until it finishes
+    - DELETE /jobs/<id>: cancel a job (it keeps its best schedule so far)
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS) -> None:
+        self.instances = {}
+        self.jobs = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)  # <-- the solver releases the GIL while solving
+        self.ids = itertools.count(1)
+
+    async def load_instance(self, body: dict) -> tuple[HTTPStatus, dict]:
+        instance_id = f"instance-{next(self.ids)}"
+        loop = asyncio.get_running_loop()
+        instance = await loop.run_in_executor(self.executor, Instance, instance_id, body["path"])
+        self.instances[instance_id] = instance
+        return HTTPStatus.CREATED, instance.summary()
+
+    def submit(self, instance_id: str, body: dict) -> tuple[HTTPStatus, dict]:
+        if instance_id not in self.instances:
+            return HTTPStatus.NOT_FOUND, {"error": f"Unknown instance '{instance_id}'"}
+
+        if not isinstance(body, dict):
+            raise ValueError(f"Expected a JSON object, got {body!r}")
+        edits, max_time_in_seconds = check_edits(body.get("edits", [])), float(body.get("max_time", 60.0))
+        job = Job(f"job-{next(self.ids)}", self.instances[instance_id], edits, max_time_in_seconds, asyncio.get_running_loop())
+        self.jobs[job.id] = job
+        job.set_status("queued")
+        self.executor.submit(job.run)
+        return HTTPStatus.ACCEPTED, {"job": job.id}
+
+    async def stream_events(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+
+        # Replay what happened so far and listen for the rest (no await in between, such that no event is missed)
+        queue = asyncio.Queue()
+        for event in job.events:
+            queue.put_nowait(event)
+        job.listeners.append(queue)
+        try:
+            while True:
+                event = await queue.get()
+                writer.write((json.dumps(event) + "\n").encode())
+                await writer.drain()
+                if event["event"] == "status" and event["status"] in ["done", "infeasible", "cancelled", "failed"]:
+                    break
+        finally:
+            job.listeners.remove(queue)
+
+    async def route(self, method: str, path: str, body: dict, writer: asyncio.StreamWriter) -> tuple[HTTPStatus, dict] | None:
+        parts = [part for part in path.split("/") if part]
+        match method, parts:
+            case "GET", ["instances"]:
+                return HTTPStatus.OK, {"instances": [instance.summary() for instance in self.instances.values()]}
+            case "POST", ["instances"]:
+                return await self.load_instance(body)
+            case "POST", ["instances", instance_id, "jobs"]:
+                return self.submit(instance_id, body)
+            case "GET", ["jobs", job_id] if job_id in self.jobs:
+                return HTTPStatus.OK, self.jobs[job_id].state()
+            case "GET", ["jobs", job_id, "events"] if job_id in self.jobs:
+                await self.stream_events(self.jobs[job_id], writer)
+                return None
+            case "DELETE", ["jobs", job_id] if job_id in self.jobs:
+                self.jobs[job_id].cancel()
+                return HTTPStatus.ACCEPTED, {"job": job_id, "cancelling": True}
+            case _:
+                return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode().split()
+            headers = {}
+            while (line := (await reader.readline()).decode().strip()) != "":
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            raw_body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            try:
+                response = await self.route(request_line[0], request_line[1], json.loads(raw_body or b"{}"), writer)
+            except (KeyError, ValueError, TypeError, AttributeError, OSError) as error:  # <-- malformed requests, not server errors
+                response = HTTPStatus.BAD_REQUEST, {"error": str(error)}
+
+            if response is not None:
+                status, payload = response
+                content = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\nContent-Length: {len(content)}\r\n"
+                writer.write(head.encode() + b"Connection: close\r\n\r\n" + content)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # <-- the client went away
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = HOST, port: int = PORT) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Scheduling service listening on http://{host}:{port} (started at {time.strftime('%H:%M:%S')})")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local scheduling service for what-if solves of the back (ryg) sector.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of concurrent solves.")
+    args = parser.parse_args()
+
+    asyncio.run(SchedulingService(args.workers).serve(args.host, args.port))
@@ -0,0 +1,205 @@
+from collections.abc import Callable
+from itertools import pairwise
+from typing import TYPE_CHECKING
+
+from app.utils.engine_utils import equivalent_agents, fairness_lower_bound
+
+if TYPE_CHECKING:
+    from app.utils.scheduling_model import BackSchedulingModel
+
+
+class ConstraintFamily:
+    """
+    A constraint family of `BackSchedulingModel` (or its objective): the function that adds it to a model, the parsed inputs
+    it needs (attributes of the model), and when it applies at all.
+
+    A family is skipped when any of its inputs is empty (e.g. the weekend rules without weekends, or the fixed assignments
+    without a presolve), when it doesn't apply to the model's mode, or when the model disables it by name.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        add: Callable[["BackSchedulingModel"], None],
+        requires: tuple[str, ...] = (),
+        applies: Callable[["BackSchedulingModel"], bool] | None = None,
+    ) -> None:
+        self.name = name
+        self.add = add
+        self.requires = requires
+        self.applies = applies
+
+    def missing_inputs(self, back_model: "BackSchedulingModel") -> list[str]:
+        """:return: The required inputs the model doesn't have (None, or empty)."""
+        missing = []
+        for name in self.requires:
+            value = getattr(back_model, name, None)
+            if value is None or len(value) == 0:
+                missing.append(name)
+        return missing
+
+    def is_needed(self, back_model: "BackSchedulingModel") -> bool:
+        if self.missing_inputs(back_model):
+            return False
+        return self.applies is None or self.applies(back_model)
+
+
+# The registered families by name, in the order they are built
+CONSTRAINT_FAMILIES: dict[str, ConstraintFamily] = {}
+
+
+def constraint_family(
+    name: str, requires: tuple[str, ...] = (), applies: Callable[["BackSchedulingModel"], bool] | None = None
+) -> Callable[[Callable[["BackSchedulingModel"], None]], Callable[["BackSchedulingModel"], None]]:
+    """
+    Register a function that adds a constraint family to a `BackSchedulingModel`, see `ConstraintFamily`.
+    Families are built in the order they are registered, after the decision variables.
+    """
+
+    def register(add: Callable[["BackSchedulingModel"], None]) -> Callable[["BackSchedulingModel"], None]:
+        if name in CONSTRAINT_FAMILIES:
+            raise ValueError(f"The constraint family '{name}' is already registered")
+        CONSTRAINT_FAMILIES[name] = ConstraintFamily(name, add, requires, applies)
+        return add
+
+    return register
+
+
+def states_eligibility(back_model: "BackSchedulingModel") -> bool:
+    """Qualifications and days off are constraints in the dense model and in diagnose mode - the sparse model has no such variables."""
+    return not back_model.sparse or back_model.diagnose
+
+
+def optimizes(back_model: "BackSchedulingModel") -> bool:
+    """The diagnose mode only checks feasibility."""
+    return not back_model.diagnose
+
+
+@constraint_family("fixed_assignments", requires=("fixed",))
+def add_fixed_assignments(back_model: "BackSchedulingModel") -> None:
+    for agent_indx, task_indx, day in back_model.fixed:
+        back_model.model.Add(back_model.x[(back_model.agents[agent_indx].name, back_model.tasks[task_indx], day)] == 1)
+
+
+@constraint_family("qualifications", requires=("x",), applies=states_eligibility)
+def add_qualification_constraints(back_model: "BackSchedulingModel") -> None:
+    # Agents can only be assigned to qualified tasks
+    for (name, task, _), var in back_model.x.items():
+        if not back_model.qualified[back_model.agent_position[name], back_model.task_position[task]]:
+            back_model.guard(back_model.model.Add(var == 0), "qualifications")
+
+
+@constraint_family("days_off", requires=("x",), applies=states_eligibility)
+def add_days_off_constraints(back_model: "BackSchedulingModel") -> None:
+    # Agents cannot be assigned on unavailable days
+    for (name, _, day), var in back_model.x.items():
+        if not back_model.available[back_model.agent_position[name], day]:
+            key = ("days_off", name, day) if back_model.refine else ("days_off", name)
+            back_model.guard(back_model.model.Add(var == 0), *key)
+
+
+@constraint_family("coverage", requires=("task_schedules",))
+def add_coverage_constraints(back_model: "BackSchedulingModel") -> None:
+    # Each task must be performed on its scheduled days
+    for task in back_model.tasks:
+        num_agents_required = back_model.requirements[task]
+        for day in back_model.task_schedules[task]:
+            # NOTE: An empty sum (nobody eligible) correctly renders the model infeasible
+            key = ("coverage", task, day) if back_model.refine else ("coverage",)
+            covered = sum(back_model.by_task_day[(task, day)])
+            back_model.guard(back_model.model.AddLinearConstraint(covered, num_agents_required, num_agents_required), *key)
+
+
+@constraint_family("one_task_per_day", requires=("by_agent_day",))
+def add_one_task_per_day_constraints(back_model: "BackSchedulingModel") -> None:
+    # Agents can perform at most one task per day
+    for agent in back_model.agents:
+        for day in back_model.all_days:
+            if len(back_model.by_agent_day[(agent.name, day)]) > 1:
+                back_model.guard(back_model.model.AddAtMostOne(back_model.by_agent_day[(agent.name, day)]), "one_task_per_day")
+
+
+@constraint_family("weekend_pairing", requires=("weekend_info",))
+def add_weekend_pairing_constraints(back_model: "BackSchedulingModel") -> None:
+    for info in back_model.weekend_info:
+        saturday = info["saturday"]
+        sunday = info["sunday"]
+
+        if back_model.sparse:
+            # Only weekends where both days are covered by the roster are paired. When one of the days is taken by someone
+            # outside the roster (the neuro-surgeons), there is nothing to pair with.
+            scheduled = back_model.task_schedules["Rygvagt"]
+            if saturday not in scheduled or sunday not in scheduled:
+                continue
+
+        # Enforce the same agent works Rygvagt on both days
+        for agent in back_model.agents:
+            works_saturday = back_model.x.get((agent.name, "Rygvagt", saturday))
+            works_sunday = back_model.x.get((agent.name, "Rygvagt", sunday))
+            if works_saturday is not None and works_sunday is not None:
+                back_model.guard(back_model.model.Add(works_saturday == works_sunday), "weekend_pairing")
+            elif works_saturday is not None:
+                back_model.guard(back_model.model.Add(works_saturday == 0), "weekend_pairing")
+            elif works_sunday is not None:
+                back_model.guard(back_model.model.Add(works_sunday == 0), "weekend_pairing")
+
+        if not back_model.sparse:
+            # Ensure exactly one agent is assigned to Rygvagt on Saturday
+            # (in sparse mode this is already implied by the coverage constraints)
+            saturday_agents = [back_model.x[(agent.name, "Rygvagt", saturday)] for agent in back_model.agents if agent.qualified("Rygvagt")]
+            back_model.model.AddExactlyOne(saturday_agents)
+
+
+@constraint_family("monday_leave", requires=("weekend_info",))
+def add_monday_leave_constraints(back_model: "BackSchedulingModel") -> None:
+    # Agents working the weekend must have corresponding Mondays off
+    for info in back_model.weekend_info:
+        saturday = info["saturday"]
+        for agent in back_model.agents:
+            works_weekend = back_model.x.get((agent.name, "Rygvagt", saturday))
+            if works_weekend is None:
+                continue
+
+            for monday in [info["monday_before"], info["monday_after"]]:
+                if monday is None or not back_model.by_agent_day[(agent.name, monday)]:
+                    continue
+                mondays_off = back_model.model.Add(sum(back_model.by_agent_day[(agent.name, monday)]) == 0)
+                mondays_off.OnlyEnforceIf(works_weekend)
+                back_model.guard(mondays_off, "monday_leave")
+
+
+@constraint_family("fairness", requires=("agents",), applies=optimizes)
+def add_fairness_objective(back_model: "BackSchedulingModel") -> None:
+    # Compute total assignments per agent (including what they carry over from previous periods)
+    capacities = back_model.capacities()
+    for agent, carried, capacity in zip(back_model.agents, back_model.carried.tolist(), capacities.tolist(), strict=True):
+        total = back_model.model.NewIntVar(carried, carried + capacity, f"total_assignments_{agent.name}")
+        back_model.total_assignments[agent.name] = total
+        back_model.model.Add(total == carried + sum(back_model.by_agent[agent.name]))
+
+    # Minimize the maximum assignments - which can't be less than what it takes to cover the demand
+    back_model.lower_bound = fairness_lower_bound(back_model.coverage_demand(), capacities, back_model.carried)
+    upper_bound = max([back_model.lower_bound] + (back_model.carried + capacities).tolist())
+    back_model.max_assignments = back_model.model.NewIntVar(back_model.lower_bound, upper_bound, "max_assignments")
+    back_model.model.AddMaxEquality(back_model.max_assignments, [back_model.total_assignments[agent.name] for agent in back_model.agents])
+
+    if back_model.preference_weight <= 0:
+        back_model.model.Minimize(back_model.max_assignments)
+        return
+
+    # Reward the rolling chart's preferences next to the fairness
+    preferred = back_model.preferred_variables()
+    back_model.satisfied_preferences = back_model.model.NewIntVar(0, len(preferred), "satisfied_preferences")
+    back_model.model.Add(back_model.satisfied_preferences == sum(preferred))
+    objective = (len(preferred) + 1) * back_model.max_assignments - back_model.preference_weight * back_model.satisfied_preferences
+    back_model.model.Minimize(objective)
+
+
+@constraint_family("symmetry_breaking", requires=("total_assignments",), applies=lambda back_model: back_model.symmetry_breaking)
+def add_symmetry_breaking_constraints(back_model: "BackSchedulingModel") -> None:
+    # Interchangeable agents are ordered by their total assignments, which removes all permutations of their schedules
+    keys = [back_model.symmetry_key(indx) for indx in range(len(back_model.agents))]
+    for indices in equivalent_agents(keys):
+        totals = [back_model.total_assignments[back_model.agents[indx].name] for indx in indices]
+        for more, fewer in pairwise(totals):
+            back_model.model.Add(more >= fewer)
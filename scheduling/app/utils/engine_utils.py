@@ -1,30 +1,155 @@
-def rygvagt_mandatory_leave_info(num_days: int, all_days: list[int]) -> tuple[dict[int, int], list[dict[str, int]]]:
+import numpy as np
+import pandas as pd
+
+from app.data_structures.agent import Agent
+
+
+def rygvagt_mandatory_leave_info(
+    num_days: int, all_days: list[int], day_offset: int = 2, dates: pd.Index | None = None
+) -> tuple[dict[int, int], list[dict[str, int]]]:
     """
     Utility for the constraint regarding how the 'rygvagt' task is scheduled on weekends.
 
     :param num_days: Number of days in the scheduling horizon.
     :param all_days: List of all days in the scheduling horizon.
+    :param day_offset: (optional) Day of the week of index 0 (0=Monday, ..., 6=Sunday), for callers without the dates.
+    Default is 2 (Wednesday, as January 2025).
+    :param dates: (optional) The date of each day, e.g. the workbook's index (`ScheduleWorkbook.dates`). If given, the days of the
+    week and the weekends (Saturday, the Sunday after it, the Mondays around it) come from the calendar, which also holds for
+    horizons with gaps, and `day_offset` is ignored. Default is None.
 
     :return: Tuple of a dictionary mapping each day to the day of the week (0=Monday, ..., 6=Sunday)
     and a list of dictionaries with information about the weekend constraints.
     """
-    # NOTE: This is horrendous and need to be fixed:
-    # Offset to align index 0 with Wednesday (0=Monday, ..., 6=Sunday)
-    day_offset = 2
-
-    # Map each day to the day of the week (0=Monday, ..., 6=Sunday), with offset
-    day_of_week = {day: (day + day_offset) % 7 for day in all_days}
+    if dates is None:
+        day_of_week = {day: (day + day_offset) % 7 for day in all_days}
+        day_number = {day: day for day in all_days}  # <-- days since index 0
+    else:
+        timestamps = pd.DatetimeIndex(dates)
+        day_of_week = {day: timestamps[day].weekday() for day in all_days}
+        day_number = {day: (timestamps[day] - timestamps[0]).days for day in all_days}
+    day_at = {number: day for day, number in day_number.items() if 0 <= day < num_days}
 
     # Identify weekends and their corresponding Mondays
     weekend_info = []
     for day in all_days:
         if day_of_week[day] == 5:  # Saturday
             saturday = day
-            sunday = day + 1 if day + 1 < num_days else None
-            monday_before = day - 5 if day - 5 >= 0 else None  # Previous Monday
-            monday_after = day + 2 if day + 2 < num_days else None  # Next Monday
+            sunday = day_at.get(day_number[day] + 1)
+            monday_before = day_at.get(day_number[day] - 5)  # Previous Monday
+            monday_after = day_at.get(day_number[day] + 2)  # Next Monday
 
             if sunday is not None and day_of_week[sunday] == 6:
                 weekend_info.append({"saturday": saturday, "sunday": sunday, "monday_before": monday_before, "monday_after": monday_after})
 
     return day_of_week, weekend_info
+
+
+def schedule_matrix(tasks: list[str], task_schedules: dict[str, list[int]], num_days: int) -> np.ndarray:
+    """
+    :return: Boolean array of shape (tasks, days), True where the task is scheduled on the day.
+    """
+    scheduled = np.zeros((len(tasks), num_days), dtype=bool)
+    for indx, task in enumerate(tasks):
+        scheduled[indx, task_schedules[task]] = True
+
+    return scheduled
+
+
+def qualification_matrix(tasks: list[str], agents: list[Agent]) -> np.ndarray:
+    """
+    :return: Boolean array of shape (agents, tasks), True where the agent is qualified for the task.
+    """
+    if not agents:
+        return np.zeros((0, len(tasks)), dtype=bool)
+
+    table = agents[0].table
+    return table.qualifications[np.ix_([agent.index for agent in agents], [table.task_index[task] for task in tasks])]
+
+
+def availability_matrix(agents: list[Agent], num_days: int) -> np.ndarray:
+    """
+    :return: Boolean array of shape (agents, days), True where the agent is available on the day.
+    Days beyond the doctor charts count as available.
+    """
+    available = np.ones((len(agents), num_days), dtype=bool)
+    if agents:
+        table = agents[0].table
+        width = min(num_days, table.num_days)
+        available[:, :width] = table.availability[[agent.index for agent in agents], :width]
+
+    return available
+
+
+def preference_matrix(agents: list[Agent], num_days: int) -> np.ndarray:
+    """
+    :return: Boolean array of shape (agents, days), True where the rolling chart puts the agent on 'Rygvagt' that day.
+    """
+    preferred = np.zeros((len(agents), num_days), dtype=bool)
+    if agents:
+        table = agents[0].table
+        width = min(num_days, table.preferences.shape[1])
+        preferred[:, :width] = table.preferences[[agent.index for agent in agents], :width] > 0
+
+    return preferred
+
+
+def eligibility_cube(tasks: list[str], task_schedules: dict[str, list[int]], agents: list[Agent], num_days: int) -> np.ndarray:
+    """
+    Vectorized eligibility of every (agent, task, day) triple, read from the agents' `AgentTable`.
+
+    :param tasks: List of task names.
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled).
+    :param agents: List of Agent objects (views of the same `AgentTable`).
+    :param num_days: Number of days in the scheduling horizon.
+
+    :return: Boolean array of shape (agents, tasks, days), True where the agent is qualified for the task,
+    available on the day, and the task is scheduled on the day.
+    """
+    qualified = qualification_matrix(tasks, agents)
+    available = availability_matrix(agents, num_days)
+    scheduled = schedule_matrix(tasks, task_schedules, num_days)
+
+    return qualified[:, :, None] & available[:, None, :] & scheduled[None, :, :]
+
+
+def fairness_lower_bound(demand: int, capacities: np.ndarray, carried: np.ndarray | None = None) -> int:
+    """
+    Lower bound on the maximum number of assignments of any agent (the min-max fairness objective).
+
+    Water-filling: the smallest `M` such that agents working at most `min(M, carried + capacity)` days in total can cover the demand.
+
+    :param demand: Total number of required assignments (task-days times the number of agents each requires).
+    :param capacities: Upper bound on the number of assignments of each agent (e.g. the days they can work at all).
+    :param carried: (optional) Assignments each agent carries over from previous periods. Default is None (none).
+
+    :return: The lower bound. If the capacities cannot cover the demand, the bound exceeds the largest capacity.
+    """
+    capacities = np.asarray(capacities, dtype=np.int64)
+    carried = np.zeros_like(capacities) if carried is None else np.asarray(carried, dtype=np.int64)
+    least = int(carried.max(initial=0))  # <-- Nobody can end below what they carry
+    if demand <= 0:
+        return least
+    if capacities.size == 0:
+        return demand
+
+    # Number of assignments that can be covered with each possible maximum (exact for every maximum above `least`)
+    totals = carried + capacities
+    coverable = np.minimum(np.arange(totals.max() + 1)[:, None], totals[None, :]).sum(axis=1) - carried.sum()
+
+    return max(least, int(np.searchsorted(coverable, demand)))
+
+
+def equivalent_agents(keys: list[bytes]) -> list[list[int]]:
+    """
+    Group agents that are interchangeable in the model, i.e. have identical keys (qualifications, availability, ...).
+
+    :param keys: A key per agent.
+
+    :return: The classes (lists of agent indices, in order) with more than one agent.
+    """
+    classes = {}
+    for indx, key in enumerate(keys):
+        classes.setdefault(key, []).append(indx)
+
+    return [indices for indices in classes.values() if len(indices) > 1]
@@ -0,0 +1,260 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import eligibility_cube
+from app.utils.rank_selection import exponential_rank_selection, linear_rank_selection
+from app.utils.sampling import stochastic_universal_sampling
+from app.utils.schedule_validator import ScheduleValidator
+from app.utils.scheduling_model import TASKS_REQUIRING_MULTIPLE_AGENTS
+
+VIOLATION_PENALTY = 1000  # <-- Any violated constraint is worse than the most unfair schedule
+ENCODING_RULES = ["one_task_per_day", "weekend_pairing", "monday_leave"]  # <-- the rules the encoding can violate
+
+
+class ScheduleEncoding:
+    """
+    Integer encoding of schedules for the genetic algorithm: one gene per task-day slot, holding the index of the assigned agent.
+    A task requiring two agents (by `requirements`, e.g. O-OP) has two slots per day.
+
+    Genes are only ever drawn from the agents eligible for the slot, so qualifications and days off always hold.
+    The remaining constraints of `back_scheduling` (one task per day, weekend Rygvagt pairing and Monday leave)
+    are penalized in the cost, which is computed for a whole population (population x slots) at once by `ScheduleValidator`.
+
+    Only NumPy arrays are kept, such that the encoding is cheap to send to worker processes.
+    """
+
+    def __init__(
+        self,
+        tasks: list[str],
+        task_schedules: dict[str, list[int]],
+        agents: list[Agent],
+        day_offset: int = 2,
+        requirements: dict[str, int] | None = None,
+    ) -> None:
+        requirements = requirements or TASKS_REQUIRING_MULTIPLE_AGENTS
+        self.num_agents = len(agents)
+        self.num_days = max(max(task_schedules[task]) for task in tasks) + 1
+        eligible = eligibility_cube(tasks, task_schedules, agents, self.num_days)
+
+        slots = [
+            (task_indx, day) for task_indx, task in enumerate(tasks) for day in task_schedules[task] for _ in range(requirements.get(task, 1))
+        ]
+        self.slot_task = np.array([task_indx for task_indx, _ in slots], dtype=np.int64)
+        self.slot_day = np.array([day for _, day in slots], dtype=np.int64)
+
+        # Eligible agents of each slot, padded to the same length
+        candidates = [np.flatnonzero(eligible[:, task_indx, day]) for task_indx, day in slots]
+        self.num_candidates = np.array([len(agents_) for agents_ in candidates], dtype=np.int64)
+        self.candidates = np.zeros((len(slots), max(self.num_candidates.max(initial=0), 1)), dtype=np.int64)
+        for slot, agents_ in enumerate(candidates):
+            self.candidates[slot, : len(agents_)] = agents_
+
+        # The rules the genes can break, checked by the validator (qualifications, days off and coverage hold by construction)
+        self.validator = ScheduleValidator(tasks, task_schedules, agents, day_offset, requirements)
+
+    @property
+    def num_slots(self) -> int:
+        return len(self.slot_task)
+
+    def feasible_slots(self) -> bool:
+        """Whether every slot has at least one eligible agent (otherwise no schedule covers all tasks)."""
+        return bool((self.num_candidates > 0).all())
+
+    def draw_agents(self, slots: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """A random eligible agent for each of the given slots."""
+        picks = (rng.random(slots.shape) * self.num_candidates[slots]).astype(np.int64)
+        return self.candidates[slots, picks]
+
+    def random_population(self, size: int, rng: np.random.Generator) -> np.ndarray:
+        return self.draw_agents(np.broadcast_to(np.arange(self.num_slots), (size, self.num_slots)), rng)
+
+    def assignment_counts(self, population: np.ndarray) -> np.ndarray:
+        """:return: Integer array of shape (population, agents), the total assignments of each agent."""
+        counts = np.zeros((len(population), self.num_agents), dtype=np.int64)
+        np.add.at(counts, (np.arange(len(population))[:, None], population), 1)
+        return counts
+
+    def violations(self, population: np.ndarray) -> np.ndarray:
+        """:return: Integer array of shape (population,), the number of violated constraints of each schedule."""
+        counts = self.validator.violation_counts(population, self.slot_task, self.slot_day, ENCODING_RULES)
+        return counts.sum(axis=1)
+
+    def cost(self, population: np.ndarray) -> np.ndarray:
+        """
+        Cost of each schedule (lower is better): the violations, then the maximum assignments of any agent,
+        then the fraction of agents at the maximum (the way off the plateaus of the min-max objective).
+        """
+        counts = self.assignment_counts(population)
+        maximum = counts.max(axis=1, initial=0)
+        crowding = (counts == maximum[:, None]).sum(axis=1) / (self.num_agents + 1)
+
+        return VIOLATION_PENALTY * self.violations(population) + maximum + crowding
+
+
+# The encoding of the worker processes, sent once when the pool starts (not with every population)
+_worker_encoding = None
+
+
+def _init_worker(encoding: ScheduleEncoding) -> None:
+    global _worker_encoding
+    _worker_encoding = encoding
+
+
+def _worker_cost(population: np.ndarray) -> np.ndarray:
+    return _worker_encoding.cost(population)
+
+
+class GeneticScheduler:
+    """
+    Population-based (genetic algorithm) scheduler on a `ScheduleEncoding`.
+
+    Every generation keeps the `elite` best schedules and breeds the rest: parents are drawn by stochastic universal sampling
+    from linear or exponential rank selection (see `rank_selection` and `sampling`), children take whole days
+    from either parent (such that the days stay consistent), and genes mutate to another eligible agent. The population is
+    evaluated in chunks by `num_workers` worker processes.
+    """
+
+    def __init__(
+        self,
+        encoding: ScheduleEncoding,
+        population_size: int = 200,
+        elite: int = 4,
+        mutation_rate: float = 0.01,
+        rank_selection: str = "linear",
+        selection_pressure: float = 1.8,
+        weight: float = 0.98,
+        num_workers: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        assert rank_selection in ["linear", "exponential"], "Rank selection must be 'linear' or 'exponential'"
+
+        self.encoding = encoding
+        self.population_size = population_size
+        self.elite = elite
+        self.mutation_rate = mutation_rate
+        self.rank_selection = rank_selection
+        self.selection_pressure = selection_pressure
+        self.weight = weight
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.rng = np.random.default_rng(seed)
+
+        self.population = encoding.random_population(population_size, self.rng)
+        self.costs = None
+        self.history = []  # <-- (generation, elapsed, best cost) per generation
+
+    def evaluate(self, population: np.ndarray, executor: ProcessPoolExecutor | None = None) -> np.ndarray:
+        if executor is None:
+            return self.encoding.cost(population)
+        chunks = np.array_split(population, self.num_workers)
+        return np.concatenate(list(executor.map(_worker_cost, chunks)))
+
+    def selection_probabilities(self) -> np.ndarray:
+        fitness_scores = -self.costs  # <-- rank selection ranks the highest score best
+        if self.rank_selection == "linear":
+            probabilities = linear_rank_selection(fitness_scores, self.selection_pressure, ties="average")
+        else:
+            probabilities = exponential_rank_selection(fitness_scores, self.weight, ties="average")
+        return probabilities / probabilities.sum()  # <-- averaged ties sum to one only up to rounding
+
+    def breed(self) -> np.ndarray:
+        num_children = self.population_size - self.elite
+        parents = stochastic_universal_sampling(self.selection_probabilities(), 2 * num_children, self.rng).reshape(num_children, 2)
+
+        # Uniform crossover of whole days
+        from_first = self.rng.random((num_children, self.encoding.num_days)) < 0.5
+        from_first = from_first[:, self.encoding.slot_day]
+        children = np.where(from_first, self.population[parents[:, 0]], self.population[parents[:, 1]])
+
+        # Mutation to another eligible agent
+        rows, slots = np.nonzero(self.rng.random(children.shape) < self.mutation_rate)
+        children[rows, slots] = self.encoding.draw_agents(slots, self.rng)
+
+        elite = self.population[np.argsort(self.costs, kind="stable")[: self.elite]]
+        return np.concatenate([elite, children])
+
+    def run(self, max_time_in_seconds: float = 60.0, max_generations: int = 10_000, verbose: bool = True) -> tuple[np.ndarray, float]:
+        """
+        Evolve the population until the time limit or the number of generations.
+
+        :return: Tuple of the best schedule (gene per slot) and its cost.
+        """
+        start = time.perf_counter()
+        executor = None
+        if self.num_workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker, initargs=(self.encoding,))
+
+        try:
+            self.costs = self.evaluate(self.population, executor)
+            for generation in range(1, max_generations + 1):
+                if time.perf_counter() - start >= max_time_in_seconds:
+                    break
+                self.population = self.breed()
+                self.costs = self.evaluate(self.population, executor)
+                self.history.append((generation, time.perf_counter() - start, float(self.costs.min())))
+
+                if verbose and generation % 100 == 0:
+                    print(f"Generation {generation}: best cost {self.costs.min():.3f}, {time.perf_counter() - start:.2f} s")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        best = int(np.argmin(self.costs))
+        return self.population[best], float(self.costs[best])
+
+
+def genetic_scheduling(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    max_time_in_seconds: float = 60.0,
+    population_size: int = 200,
+    rank_selection: str = "linear",
+    num_workers: int | None = None,
+    day_offset: int = 2,
+    seed: int = 0,
+    verbose: bool = True,
+    requirements: dict[str, int] | None = None,
+) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
+    """
+    Engine for scheduling the 'back' (ryg) sector with a genetic algorithm, an anytime heuristic: it can be stopped at any
+    time limit, and the cost of a generation scales with the number of worker processes. See `GeneticScheduler`.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param max_time_in_seconds: (optional) Time limit for the evolution. Default is 60 seconds.
+    :param population_size: (optional) Number of schedules in the population. Default is 200.
+    :param rank_selection: (optional) 'linear' or 'exponential' rank selection of the parents. Default is 'linear'.
+    :param num_workers: (optional) Number of worker processes evaluating the population. Default is None (one per core).
+    :param day_offset: (optional) Day of the week of index 0 (0=Monday, ..., 6=Sunday). Default is 2.
+    :param seed: (optional) Seed for the random generator. Default is 0.
+    :param verbose: (optional) If True, prints the progress. Default is True.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each),
+    or None if no schedule without violations is found.
+    """
+    encoding = ScheduleEncoding(tasks, task_schedules, agents, day_offset, requirements)
+    if not encoding.feasible_slots():
+        print("No feasible solution found.")
+        return
+
+    scheduler = GeneticScheduler(encoding, population_size, rank_selection=rank_selection, num_workers=num_workers, seed=seed)
+    best, cost = scheduler.run(max_time_in_seconds, verbose=verbose)
+    if cost >= VIOLATION_PENALTY:
+        print(f"No feasible solution found ({int(cost // VIOLATION_PENALTY)} violations left).")
+        return
+
+    order = np.lexsort((best, encoding.slot_task, encoding.slot_day))  # <-- by day, then task, then agent
+    assignments = [
+        {"Day": int(encoding.slot_day[slot]), "Task": tasks[encoding.slot_task[slot]], "Agent": agents[best[slot]].name} for slot in order
+    ]
+    counts = encoding.assignment_counts(best[None, :])[0]
+    agent_assignments = {agent.name: int(count) for agent, count in zip(agents, counts.tolist(), strict=True)}
+
+    return assignments, agent_assignments
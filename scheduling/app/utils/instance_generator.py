@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from app.data_structures.workbook import DAYS_OFF_KEYWORDS
+from app.utils.schedule_preprocess import NEURO_SURGEONS
+
+FIXED_TASKS = ["Rygvagt", "O-OP", "O-OP (tirsdag)"]
+MIN_QUALIFIED_AGENTS = 4  # <-- O-OP needs two agents a day, and weekend agents need their Mondays off
+
+
+def generate_instance(
+    path: str,
+    num_agents: int = 20,
+    num_tasks: int = 8,
+    num_days: int = 31,
+    qualification_density: float = 0.5,
+    days_off_rate: float = 0.08,
+    neuro_rate: float = 0.1,
+    start_date: str = "2025-01-01",
+    seed: int = 0,
+) -> str:
+    """
+    Generate a synthetic data-file in the exact sheet layout of the ryg data ('tasks', 'doctors', 'doctor_charts', 'rolling_chart').
+
+    The tasks always include 'Rygvagt' (every day), 'O-OP' (weekdays, except Tuesday) and 'O-OP (tirsdag)' (Tuesdays),
+    the remaining tasks are scheduled on random weekdays.
+
+    :param path: Path of the Excel file to write.
+    :param num_agents: (optional) Number of agents (doctors). Default is 20.
+    :param num_tasks: (optional) Number of tasks, including the three fixed ryg tasks. Default is 8.
+    :param num_days: (optional) Number of days in the scheduling horizon. Default is 31.
+    :param qualification_density: (optional) Probability of an agent being qualified for a task. Default is 0.5.
+    :param days_off_rate: (optional) Probability of an agent having a given day off. Default is 0.08.
+    :param neuro_rate: (optional) Probability of a week's 'Rygvagt' weekend being taken by a neuro-surgeon. Default is 0.1.
+    :param start_date: (optional) First date of the scheduling horizon. Default is "2025-01-01".
+    :param seed: (optional) Seed for the random generator. Default is 0.
+
+    :return: The path of the written file.
+    """
+    assert num_tasks >= len(FIXED_TASKS), f"An instance needs at least the tasks {FIXED_TASKS}"
+    assert num_agents >= MIN_QUALIFIED_AGENTS, f"An instance needs at least {MIN_QUALIFIED_AGENTS} agents"
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start_date, periods=num_days, freq="D", name="Dato")
+    weekdays = dates.weekday.to_numpy()
+    tasks = FIXED_TASKS + [f"Opgave {indx}" for indx in range(1, num_tasks - len(FIXED_TASKS) + 1)]
+    agents = [f"L{indx:03d}" for indx in range(1, num_agents + 1)]
+
+    # tasks: which days each task is scheduled
+    scheduled = np.zeros((num_days, num_tasks), dtype=bool)
+    scheduled[:, 0] = True
+    scheduled[:, 1] = (weekdays < 5) & (weekdays != 1)
+    scheduled[:, 2] = weekdays == 1
+    scheduled[:, 3:] = (weekdays[:, None] < 5) & (rng.random((num_days, num_tasks - 3)) < 0.8)
+    tasks_df = pd.DataFrame(np.where(scheduled, "x", None), index=dates, columns=tasks)
+
+    # doctors: qualifications, with a minimum number of qualified agents per task
+    qualified = rng.random((num_agents, num_tasks)) < qualification_density
+    for indx in range(num_tasks):
+        missing = MIN_QUALIFIED_AGENTS - qualified[:, indx].sum()
+        if missing > 0:
+            qualified[rng.choice(np.flatnonzero(~qualified[:, indx]), size=missing, replace=False), indx] = True
+    doctors_df = pd.DataFrame(np.where(qualified, "x", None), index=pd.Index(agents, name="Læge"), columns=tasks)
+
+    # doctor_charts: days off
+    days_off = rng.random((num_days, num_agents)) < days_off_rate
+    keywords = rng.choice(DAYS_OFF_KEYWORDS, size=days_off.shape)
+    charts_df = pd.DataFrame(np.where(days_off, keywords, None), index=dates, columns=agents)
+
+    # rolling_chart: who is on 'Rygvagt' each day, with whole weekends given to the same agent
+    rygvagt_agents = np.array(agents)[qualified[:, 0]]
+    chart = rng.choice(rygvagt_agents, size=num_days).astype(object)
+    for saturday in np.flatnonzero(weekdays == 5):
+        weekend = slice(saturday, saturday + 2)
+        chart[weekend] = rng.choice(NEURO_SURGEONS) if rng.random() < neuro_rate else rng.choice(rygvagt_agents)
+    rolling_df = pd.DataFrame({"Uge": dates.isocalendar().week.to_numpy(), "Dato": dates, "Rygvagt": chart})
+
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        tasks_df.to_excel(writer, sheet_name="tasks")
+        doctors_df.to_excel(writer, sheet_name="doctors")
+        charts_df.to_excel(writer, sheet_name="doctor_charts")
+        rolling_df.to_excel(writer, sheet_name="rolling_chart", index=False)
+
+    return path
@@ -0,0 +1,256 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from app.data_structures.agent import Agent
+from app.utils.presolve import presolve_forced_assignments
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solution_format import ColumnarSolution
+
+NEIGHBOURHOODS = ["week", "agent", "task", "weekend"]
+
+
+class LargeNeighbourhoodSearch:
+    """
+    Large-neighbourhood search (LNS) around a built `BackSchedulingModel`.
+
+    Starting from an incumbent, every iteration frees a few neighbourhoods of the schedule, each in its own copy of the model
+    with every other variable fixed to the incumbent, and re-optimizes them in parallel. The best re-optimized neighbourhood
+    replaces the incumbent, unless it is worse. As only the busiest agent counts in the min-max objective, a neighbourhood is
+    re-optimized lexicographically: first the maximum, then the number of agents at the maximum (the way off a plateau).
+
+    The neighbourhoods are:
+    - 'week': every variable of one week (Monday to Sunday),
+    - 'agent': the row of the agent with the most assignments, together with the rows of `agent_group` random agents to trade with
+      (one agent's row on its own is fully determined by the rest of the schedule),
+    - 'task': the column of one task,
+    - 'weekend': one Rygvagt weekend together with the Mondays around it.
+    """
+
+    def __init__(
+        self,
+        back_model: BackSchedulingModel,
+        num_parallel: int | None = None,
+        workers_per_neighbourhood: int = 1,
+        agent_group: int = 3,
+        seed: int = 0,
+        verbose: bool = True,
+    ) -> None:
+        self.back_model = back_model
+        self.num_parallel = num_parallel or os.cpu_count() or 1
+        self.workers_per_neighbourhood = workers_per_neighbourhood
+        self.agent_group = agent_group
+        self.rng = np.random.default_rng(seed)
+        self.verbose = verbose
+
+        # Flat view of the decision variables, such that neighbourhoods are boolean masks
+        self.keys = list(back_model.x)
+        self.indices = [var.Index() for var in back_model.x.values()]
+        self.agent_of = np.array([back_model.agent_position[name] for name, _, _ in self.keys], dtype=np.int64)
+        self.task_of = np.array([back_model.task_position[task] for _, task, _ in self.keys], dtype=np.int64)
+        self.day_of = np.array([day for _, _, day in self.keys], dtype=np.int64)
+        if back_model.dates is None:
+            day_number = np.arange(len(back_model.all_days))  # <-- days since day 0
+        else:
+            day_number = (pd.DatetimeIndex(back_model.dates)[: len(back_model.all_days)] - back_model.dates[0]).days.to_numpy()
+        self.week_of = (day_number[self.day_of] + back_model.day_of_week[0]) // 7  # <-- weeks start on Mondays
+
+        self.values = None  # <-- incumbent value of each variable in `keys`
+        self.objective = None
+        self.crowding = None  # <-- number of agents at the maximum, in the incumbent
+        self.history = []  # <-- one dictionary per iteration
+
+    def set_incumbent(self, solver: cp_model.CpSolver) -> None:
+        self.values = np.array([solver.Value(var) for var in self.back_model.x.values()], dtype=np.int64)
+        totals = [solver.Value(total) for total in self.back_model.total_assignments.values()]
+        self.objective = max(totals)
+        self.crowding = totals.count(self.objective)
+
+    def incumbent_solution(self) -> ColumnarSolution:
+        """The incumbent, read from `values` rather than from a solver (see `BackSchedulingModel.extract_columnar`)."""
+        back_model = self.back_model
+        assigned = (self.values == 1) & back_model.scheduled[self.task_of, self.day_of]
+        totals = back_model.carried + np.bincount(self.agent_of[assigned], minlength=len(back_model.agents))
+        names = [agent.name for agent in back_model.agents]
+        return ColumnarSolution(self.day_of[assigned], self.task_of[assigned], self.agent_of[assigned], back_model.tasks, names, totals)
+
+    def neighbourhood(self, kind: str) -> tuple[str, np.ndarray]:
+        """
+        Draw a random neighbourhood of the given kind.
+
+        :return: Tuple of a description of the neighbourhood and the mask of the variables it frees.
+        """
+        match kind:
+            case "week":
+                week = self.rng.choice(np.unique(self.week_of))
+                return f"week {week}", self.week_of == week
+            case "agent":
+                totals = np.bincount(self.agent_of, weights=self.values, minlength=len(self.back_model.agents))
+                busiest = self.rng.choice(np.flatnonzero(totals == totals.max()))
+                others = np.delete(np.arange(len(totals)), busiest)
+                group = [busiest] + self.rng.choice(others, size=min(self.agent_group, len(others)), replace=False).tolist()
+                return "agents " + ", ".join(self.back_model.agents[indx].name for indx in group), np.isin(self.agent_of, group)
+            case "task":
+                task_indx = self.rng.integers(len(self.back_model.tasks))
+                return f"task {self.back_model.tasks[task_indx]}", self.task_of == task_indx
+            case "weekend":
+                if not self.back_model.weekend_info:
+                    return self.neighbourhood("week")
+                info = self.back_model.weekend_info[self.rng.integers(len(self.back_model.weekend_info))]
+                days = [day for day in [info["monday_before"], info["saturday"], info["sunday"], info["monday_after"]] if day is not None]
+                return f"weekend {info['saturday']}-{info['sunday']}", np.isin(self.day_of, days)
+            case _:
+                raise ValueError(f"Unknown neighbourhood '{kind}', expected one of {NEIGHBOURHOODS}")
+
+    def solve_neighbourhood(self, free: np.ndarray, max_time_in_seconds: float) -> tuple[int, cp_model.CpSolver]:
+        """
+        Re-optimize the variables in `free` with every other variable fixed to the incumbent.
+
+        The copy of the model shares the variable indices of `back_model`, so its variables can be read from the solver as usual.
+        """
+        model = self.back_model.model.Clone()
+        model.ClearHints()
+        for indx, value, is_free in zip(self.indices, self.values.tolist(), free.tolist(), strict=True):
+            var = model.GetBoolVarFromProtoIndex(indx)
+            model.AddHint(var, value)
+            if not is_free:
+                model.Add(var == value)
+        max_assignments = model.GetIntVarFromProtoIndex(self.back_model.max_assignments.Index())
+        model.Add(max_assignments <= self.objective)  # <-- never worse
+
+        # Lexicographic objective: the maximum, then the number of agents at the incumbent's maximum
+        crowding = []
+        for total in self.back_model.total_assignments.values():
+            at_maximum = model.NewBoolVar(f"at_maximum_{total.Name()}")
+            model.Add(model.GetIntVarFromProtoIndex(total.Index()) <= self.objective - 1).OnlyEnforceIf(at_maximum.Not())
+            crowding.append(at_maximum)
+        model.Minimize((len(crowding) + 1) * max_assignments + sum(crowding))
+
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = max_time_in_seconds
+        solver.parameters.num_workers = self.workers_per_neighbourhood
+        status = solver.Solve(model)
+
+        return status, solver
+
+    def run(self, max_time_in_seconds: float = 300.0, neighbourhood_time_in_seconds: float = 5.0) -> None:
+        """
+        Improve the incumbent (see `set_incumbent`) until the time limit, or until it reaches the lower bound of the model.
+        """
+        assert self.values is not None, "LNS needs an incumbent to start from"
+        start = time.perf_counter()
+        iteration = 0
+
+        with ThreadPoolExecutor(max_workers=self.num_parallel) as executor:  # <-- the solver releases the GIL while solving
+            while time.perf_counter() - start < max_time_in_seconds and self.objective > self.back_model.lower_bound:
+                kinds = [NEIGHBOURHOODS[(iteration * self.num_parallel + indx) % len(NEIGHBOURHOODS)] for indx in range(self.num_parallel)]
+                neighbourhoods = [self.neighbourhood(kind) for kind in kinds]
+                time_limit = min(neighbourhood_time_in_seconds, max(max_time_in_seconds - (time.perf_counter() - start), 0.1))
+                futures = [executor.submit(self.solve_neighbourhood, free, time_limit) for _, free in neighbourhoods]
+                results = [future.result() for future in futures]
+
+                # Keep the best re-optimized neighbourhood (the lexicographic objective is comparable across neighbourhoods)
+                best = None
+                for (description, free), (status, solver) in zip(neighbourhoods, results, strict=True):
+                    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+                        if best is None or solver.ObjectiveValue() < best[2].ObjectiveValue():
+                            best = (description, free, solver)
+
+                previous = self.objective
+                if best is not None:
+                    self.set_incumbent(best[2])
+
+                iteration += 1
+                self.history.append(
+                    {
+                        "iteration": iteration,
+                        "neighbourhood": best[0] if best is not None else None,
+                        "freed": int(best[1].sum()) if best is not None else 0,
+                        "objective": self.objective,
+                        "crowding": self.crowding,
+                        "improvement": previous - self.objective,
+                        "elapsed": time.perf_counter() - start,
+                    }
+                )
+                if self.verbose:
+                    step = self.history[-1]
+                    print(
+                        f"LNS iteration {iteration}: objective {step['objective']} (improvement {step['improvement']}), "
+                        f"{step['crowding']} agents at the maximum, "
+                        f"{step['neighbourhood']} ({step['freed']} variables), {step['elapsed']:.2f} s"
+                    )
+
+
+def lns_scheduling(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    max_time_in_seconds: float = 300.0,
+    initial_time_in_seconds: float = 60.0,
+    neighbourhood_time_in_seconds: float = 5.0,
+    num_parallel: int | None = None,
+    seed: int = 0,
+    verbose: bool = True,
+    dates: pd.Index | None = None,
+    requirements: dict[str, int] | None = None,
+) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
+    """
+    Engine for scheduling the 'back' (ryg) sector on long horizons, by large-neighbourhood search.
+
+    The first solution of the whole (presolved, sparse) model is the first incumbent, which is then improved neighbourhood by
+    neighbourhood, see `LargeNeighbourhoodSearch`.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param max_time_in_seconds: (optional) Time limit for the search, after the first incumbent. Default is 300 seconds.
+    :param initial_time_in_seconds: (optional) Time limit for finding the first incumbent. Default is 60 seconds.
+    :param neighbourhood_time_in_seconds: (optional) Time limit for re-optimizing a single neighbourhood. Default is 5 seconds.
+    :param num_parallel: (optional) Number of neighbourhoods re-optimized in parallel. Default is None (one per core).
+    :param seed: (optional) Seed for drawing the neighbourhoods. Default is 0.
+    :param verbose: (optional) If True, reports the objective improvement of every iteration. Default is True.
+    :param dates: (optional) The date of each day (e.g. `ScheduleWorkbook.dates`), for the weekends and weeks. Default is None.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each),
+    or None if no feasible solution is found.
+    """
+    eligibility, fixed, report = presolve_forced_assignments(
+        tasks, task_schedules, agents, verbose=verbose, dates=dates, requirements=requirements
+    )
+    if report["infeasible"]:
+        print("No feasible solution found.")
+        return
+
+    back_model = BackSchedulingModel(
+        tasks, task_schedules, agents, eligibility=eligibility, fixed=fixed, dates=dates, requirements=requirements
+    ).build()
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = initial_time_in_seconds
+    solver.parameters.stop_after_first_solution = True  # <-- Improving it is the job of the neighbourhoods
+    status = solver.Solve(back_model.model)
+    if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        print("No feasible solution found.")
+        return
+    if status == cp_model.OPTIMAL:
+        return back_model.extract_solution(solver)
+
+    search = LargeNeighbourhoodSearch(back_model, num_parallel, seed=seed, verbose=verbose)
+    search.set_incumbent(solver)
+    if verbose:
+        print(f"Initial incumbent: objective {search.objective}, lower bound {back_model.lower_bound}")
+    search.run(max_time_in_seconds, neighbourhood_time_in_seconds)
+
+    # Read the final incumbent through a solve of the fully fixed model, such that the solution has the usual format
+    status, solver = search.solve_neighbourhood(np.zeros(len(search.keys), dtype=bool), neighbourhood_time_in_seconds)
+    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        return back_model.extract_solution(solver)
+
+    # The fixed model wasn't solved in time: the incumbent itself is the solution
+    solution = search.incumbent_solution()
+    return solution.assignments(), solution.agent_assignments()
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+from ortools.graph.python import linear_sum_assignment
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import eligibility_cube, fairness_lower_bound, preference_matrix, rygvagt_mandatory_leave_info
+from app.utils.scheduling_model import TASKS_REQUIRING_MULTIPLE_AGENTS
+
+UNASSIGNED = -1
+
+
+def match_day(eligible: np.ndarray, slots: list[int], costs: np.ndarray) -> np.ndarray | None:
+    """
+    Assign agents to the task slots of a single day, as a min-cost bipartite assignment (the Hungarian algorithm).
+
+    :param eligible: Boolean array of shape (agents, tasks), True where the agent can take the task on the day.
+    :param slots: The task index of each slot (a task requiring two agents has two slots).
+    :param costs: Integer array of shape (agents, tasks), the cost of giving the task to the agent (e.g. their running load).
+
+    :return: The task index of each agent on the day (`UNASSIGNED` if none), or None if the slots can't all be filled.
+    """
+    num_agents = len(costs)
+    if len(slots) > num_agents:
+        return None
+
+    # Slots on the left, agents on the right. Dummy slots (free to take) make the assignment perfect.
+    assignment = linear_sum_assignment.SimpleLinearSumAssignment()
+    for slot, task_indx in enumerate(slots):
+        for agent_indx in np.flatnonzero(eligible[:, task_indx]).tolist():
+            assignment.add_arc_with_cost(slot, agent_indx, int(costs[agent_indx, task_indx]))
+    for slot in range(len(slots), num_agents):
+        for agent_indx in range(num_agents):
+            assignment.add_arc_with_cost(slot, agent_indx, 0)
+
+    if num_agents == 0 or assignment.solve() != assignment.OPTIMAL:
+        return None
+
+    day = np.full(num_agents, UNASSIGNED, dtype=np.int64)
+    for slot, task_indx in enumerate(slots):
+        day[assignment.right_mate(slot)] = task_indx
+    return day
+
+
+def rule_violations(schedule: np.ndarray, weekends: list[tuple[int, int | None, list[int]]], ryg: int | None) -> list[tuple]:
+    """
+    The weekend Rygvagt pairing and Monday leave violations of a schedule (agent x day, task index or `UNASSIGNED`).
+
+    :return: List of ('weekend_pairing', saturday, sunday) and ('monday_leave', agent index, monday) tuples.
+    """
+    if ryg is None:
+        return []
+
+    violations = []
+    for saturday, sunday, mondays in weekends:
+        works_saturday = set(np.flatnonzero(schedule[:, saturday] == ryg).tolist())
+        if sunday is not None and works_saturday != set(np.flatnonzero(schedule[:, sunday] == ryg).tolist()):
+            violations.append(("weekend_pairing", saturday, sunday))
+        for agent_indx in works_saturday:
+            for monday in mondays:
+                if schedule[agent_indx, monday] != UNASSIGNED:
+                    violations.append(("monday_leave", agent_indx, monday))
+
+    return violations
+
+
+def repair(
+    schedule: np.ndarray, eligible: np.ndarray, weekends: list[tuple[int, int | None, list[int]]], ryg: int, max_rounds: int = 10
+) -> list[tuple]:
+    """
+    Repair the weekend Rygvagt pairing and Monday leave violations of a schedule in place, by handing single assignments
+    to free eligible agents (the least loaded first).
+
+    :return: The violations that could not be repaired.
+    """
+    on_leave = np.zeros(schedule.shape, dtype=bool)  # <-- agent x day, the Mondays around the agent's Rygvagt weekends
+    for saturday, _, mondays in weekends:
+        on_leave[np.ix_(schedule[:, saturday] == ryg, mondays)] = True
+
+    def hand_over(agent_indx: int, day: int) -> bool:
+        task_indx = schedule[agent_indx, day]
+        free = (schedule[:, day] == UNASSIGNED) & eligible[:, task_indx, day] & ~on_leave[:, day]
+        if not free.any():
+            return False
+        load = (schedule != UNASSIGNED).sum(axis=1)
+        candidates = np.flatnonzero(free)
+        schedule[candidates[np.argmin(load[candidates])], day] = task_indx
+        schedule[agent_indx, day] = UNASSIGNED
+        return True
+
+    violations = rule_violations(schedule, weekends, ryg)
+    for _ in range(max_rounds):
+        if not violations:
+            break
+        for violation in violations:
+            match violation:
+                case ("monday_leave", agent_indx, monday):
+                    hand_over(agent_indx, monday)
+                case ("weekend_pairing", saturday, sunday):
+                    # Give the Sunday to the Saturday agent, or the other way around
+                    for keep, other in [(saturday, sunday), (sunday, saturday)]:
+                        agent_indx = np.flatnonzero(schedule[:, keep] == ryg)[0]
+                        taken_by = np.flatnonzero(schedule[:, other] == ryg)[0]
+                        if schedule[agent_indx, other] == UNASSIGNED and eligible[agent_indx, ryg, other]:
+                            schedule[agent_indx, other], schedule[taken_by, other] = ryg, UNASSIGNED
+                            break
+
+        on_leave[:] = False
+        for saturday, _, mondays in weekends:
+            on_leave[np.ix_(schedule[:, saturday] == ryg, mondays)] = True
+        violations = rule_violations(schedule, weekends, ryg)
+
+    return violations
+
+
+def matching_scheduling(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    day_offset: int = 2,
+    follow_rolling_chart: bool = False,
+    follow: list[tuple[str, str, int]] | None = None,
+    verbose: bool = True,
+    dates: pd.Index | None = None,
+    requirements: dict[str, int] | None = None,
+) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
+    """
+    Engine for drafting a schedule of the 'back' (ryg) sector in milliseconds, by matching day by day.
+
+    Every day is solved as a weighted bipartite assignment of the eligible agents to the day's task slots (O-OP counts twice),
+    weighted by the agents' running load. The weekend rules are kept while matching where possible: the Saturday Rygvagt agent
+    must be able to work the Sunday (and not have worked the Monday before), takes the Sunday, and has the Monday after off.
+    Days that can't be matched under these rules are matched without them, and a repair pass then restores the pairing and
+    Monday leave. If the repair can't restore them all, there is no schedule.
+
+    The result is a feasible upper bound for `back_scheduling`, and is reported against the lower bound of the fairness objective.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param day_offset: (optional) Day of the week of index 0 (0=Monday, ..., 6=Sunday). Default is 2.
+    :param follow_rolling_chart: (optional) If True, the rolling chart's 'Rygvagt' preferences are matched whenever they can be,
+    i.e. the rolling chart is completed into a schedule (e.g. to hint `back_scheduling`). Default is False.
+    :param follow: (optional) (agent name, task, day) assignments to match whenever they can be, e.g. a cached solution of
+    a similar instance. Default is None.
+    :param verbose: (optional) If True, prints the maximum assignments against the lower bound. Default is True.
+    :param dates: (optional) The date of each day (e.g. `ScheduleWorkbook.dates`), which replace `day_offset`. Default is None.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each),
+    or None if some day can't be covered at all, or the weekend rules are still violated after the repair.
+    """
+    num_days = max(max(task_schedules[task]) for task in tasks) + 1
+    _, weekend_info = rygvagt_mandatory_leave_info(num_days - 1, range(num_days), day_offset, dates)
+    eligible = eligibility_cube(tasks, task_schedules, agents, num_days)
+    requirements = requirements or TASKS_REQUIRING_MULTIPLE_AGENTS
+    required = [requirements.get(task, 1) for task in tasks]
+
+    ryg = tasks.index("Rygvagt") if "Rygvagt" in tasks else None
+    weekends = []  # <-- (saturday, sunday if paired else None, mondays), as in the presolve
+    if ryg is not None:
+        scheduled = set(task_schedules["Rygvagt"])
+        for info in weekend_info:
+            paired = info["saturday"] in scheduled and info["sunday"] in scheduled
+            mondays = [monday for monday in [info["monday_before"], info["monday_after"]] if monday is not None]
+            weekends.append((info["saturday"], info["sunday"] if paired else None, mondays))
+    saturdays = {weekend[0]: weekend for weekend in weekends}
+    sundays = {weekend[1]: weekend for weekend in weekends if weekend[1] is not None}
+
+    # Following the rolling chart (or the given assignments) outweighs any difference in load
+    bonus = np.zeros((len(agents), len(tasks), num_days), dtype=np.int64)
+    if follow_rolling_chart and ryg is not None:
+        bonus[:, ryg, :] = num_days * preference_matrix(agents, num_days)
+    if follow:
+        agent_position = {agent.name: indx for indx, agent in enumerate(agents)}
+        task_position = {task: indx for indx, task in enumerate(tasks)}
+        for name, task, day in follow:
+            if name in agent_position and task in task_position and day < num_days:
+                bonus[agent_position[name], task_position[task], day] = num_days
+
+    schedule = np.full((len(agents), num_days), UNASSIGNED, dtype=np.int64)
+    load = np.zeros(len(agents), dtype=np.int64)
+    on_leave = np.zeros((len(agents), num_days), dtype=bool)
+    for day in range(num_days):
+        slots = [task_indx for task_indx, task in enumerate(tasks) if day in task_schedules[task] for _ in range(required[task_indx])]
+        day_eligible = eligible[:, :, day] & ~on_leave[:, day, None]
+
+        if day in sundays and ryg in slots:
+            # The Saturday Rygvagt agent continues, if they can
+            saturday_agent = np.flatnonzero(schedule[:, sundays[day][0]] == ryg)
+            if saturday_agent.size and day_eligible[saturday_agent[0], ryg]:
+                day_eligible[:, ryg] = False
+                day_eligible[saturday_agent[0], ryg] = True
+        if day in saturdays and ryg in slots:
+            _, sunday, mondays = saturdays[day]
+            if sunday is not None:
+                day_eligible[:, ryg] &= eligible[:, ryg, sunday]
+            worked_monday = [monday for monday in mondays if monday < day]
+            day_eligible[(schedule[:, worked_monday] != UNASSIGNED).any(axis=1), ryg] = False
+
+        costs = load[:, None] - bonus[:, :, day]
+        matched = match_day(day_eligible, slots, costs)
+        if matched is None:
+            matched = match_day(eligible[:, :, day], slots, costs)  # <-- without the weekend rules, left to the repair
+        if matched is None:
+            if verbose:
+                print(f"No feasible solution found: day {day} can't be covered.")
+            return
+
+        schedule[:, day] = matched
+        load += matched != UNASSIGNED
+        if day in saturdays:
+            on_leave[np.ix_(matched == ryg, [monday for monday in saturdays[day][2] if monday > day])] = True
+
+    violations = repair(schedule, eligible, weekends, ryg) if ryg is not None else []
+    if violations:
+        if verbose:
+            print(f"No feasible solution found: {len(violations)} weekend rule violations can't be repaired.")
+            for violation in violations:
+                print(f"  Unrepaired: {violation}")
+        return  # <-- not a schedule `back_scheduling` would accept, neither as a result nor as a complete hint
+
+    assignments = [
+        {"Day": day, "Task": tasks[task_indx], "Agent": agents[agent_indx].name}
+        for day in range(num_days)
+        for task_indx in range(len(tasks))
+        for agent_indx in np.flatnonzero(schedule[:, day] == task_indx).tolist()
+    ]
+    totals = (schedule != UNASSIGNED).sum(axis=1)
+    agent_assignments = {agent.name: int(total) for agent, total in zip(agents, totals.tolist(), strict=True)}
+
+    if verbose:
+        demand = sum(required[task_indx] * len(task_schedules[task]) for task_indx, task in enumerate(tasks))
+        lower_bound = fairness_lower_bound(demand, eligible.any(axis=1).sum(axis=1))
+        print(f"Matching schedule: maximum assignments {totals.max(initial=0)} (lower bound {lower_bound})")
+
+    return assignments, agent_assignments
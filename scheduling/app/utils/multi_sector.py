@@ -0,0 +1,289 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import pairwise
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+from app.utils.engine_utils import equivalent_agents, rygvagt_mandatory_leave_info
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
+from app.utils.scheduling_model import BackSchedulingModel
+
+
+class Sector:
+    """A sector's data-file, parsed: its tasks, task schedules, agents and the number of agents each task requires."""
+
+    def __init__(self, name: str, path: str) -> None:
+        self.name = name
+        self.path = path
+        self.workbook = read_workbook(path)
+        self.tasks, self.task_schedules, self.agents = parse_constraints(self.workbook)
+        self.requirements = read_requirements(self.workbook)
+
+    @property
+    def agent_names(self) -> set[str]:
+        return {agent.name for agent in self.agents}
+
+
+def read_sectors(sector_paths: dict[str, str]) -> list[Sector]:
+    """
+    Parse the data-file of every sector. The sectors must cover the same dates.
+    An agent (by name) in several sectors is a single person: a day off in any sector's chart is a day off in all of them.
+
+    :param sector_paths: Dictionary of sector name to the path of its data-file.
+
+    :return: List of the parsed sectors, in the order of `sector_paths`.
+    """
+    sectors = [Sector(name, path) for name, path in sector_paths.items()]
+    for sector in sectors[1:]:
+        if not sector.workbook.dates.equals(sectors[0].workbook.dates):
+            raise ValueError(f"Sector '{sector.name}' does not cover the same dates as sector '{sectors[0].name}'")
+
+    # Merge the days off of the shared agents
+    available = {}
+    for sector in sectors:
+        for agent in sector.agents:
+            row = agent.table.availability[agent.index]
+            available[agent.name] = available[agent.name] & row if agent.name in available else row.copy()
+    for sector in sectors:
+        for agent in sector.agents:
+            agent.table.availability[agent.index] = available[agent.name]
+
+    return sectors
+
+
+def sector_components(sectors: list[Sector]) -> list[list[int]]:
+    """
+    Group the sectors that share agents (directly, or through other sectors), such that each group can be solved on its own.
+
+    :return: List of components (lists of sector indices, in order).
+    """
+    component_of = list(range(len(sectors)))  # <-- union-find over the sectors
+
+    def find(indx: int) -> int:
+        while component_of[indx] != indx:
+            component_of[indx] = component_of[component_of[indx]]
+            indx = component_of[indx]
+        return indx
+
+    first_sector = {}  # <-- agent name to the first sector it was seen in
+    for indx, sector in enumerate(sectors):
+        for name in sector.agent_names:
+            other = first_sector.setdefault(name, indx)
+            component_of[find(indx)] = find(other)
+
+    components = {}
+    for indx in range(len(sectors)):
+        components.setdefault(find(indx), []).append(indx)
+
+    return list(components.values())
+
+
+class MultiSectorModel:
+    """
+    Joint CP-SAT model of several sectors that share agents.
+
+    Every sector is a `BackSchedulingModel` built into the same `CpModel`, with its own tasks, coverage (with the sector's
+    `requirements`) and weekend rules. A shared agent - an agent in several sectors - performs at most one task per day across
+    all of them, and the weekend rules hold across them too: a Rygvagt weekend in one sector gives the Mondays off in every
+    sector, and the weekend is paired over the sectors' Rygvagt. The fairness objective minimizes the maximum of the agents'
+    total assignments over all sectors.
+
+    Symmetry breaking is done jointly: agents are only interchangeable if they are in the same sectors and interchangeable in each.
+    """
+
+    def __init__(self, sectors: list[Sector], symmetry_breaking: bool = True) -> None:
+        self.sectors = sectors
+        self.symmetry_breaking = symmetry_breaking
+
+        self.model = cp_model.CpModel()
+        self.sector_models = []
+
+        self.names = list(dict.fromkeys(agent.name for sector in sectors for agent in sector.agents))  # <-- in order of appearance
+        self.shared = [name for name in self.names if sum(name in sector.agent_names for sector in sectors) > 1]
+
+        self.total_assignments = {}
+        self.max_assignments = None
+        self.lower_bound = 0
+
+    def build(self) -> "MultiSectorModel":
+        """
+        Build every sector into the joint model, then the constraints across the sectors and the joint objective.
+
+        :return: The model itself, such that `MultiSectorModel(...).build()` can be chained.
+        """
+        for sector in self.sectors:
+            # NOTE: Each sector sets its own objective, which the joint objective replaces
+            sector_model = BackSchedulingModel(
+                sector.tasks,
+                sector.task_schedules,
+                sector.agents,
+                symmetry_breaking=False,
+                dates=sector.workbook.dates,
+                requirements=sector.requirements,
+                model=self.model,
+            )
+            self.sector_models.append(sector_model.build())
+
+        self.add_shared_one_task_per_day_constraints()
+        self.add_shared_weekend_constraints()
+        self.add_joint_fairness_objective()
+        if self.symmetry_breaking:
+            self.add_joint_symmetry_breaking_constraints()
+
+        return self
+
+    def add_shared_one_task_per_day_constraints(self) -> None:
+        # Shared agents can perform at most one task per day, across the sectors
+        num_days = max(len(sector_model.all_days) for sector_model in self.sector_models)
+        for name in self.shared:
+            for day in range(num_days):
+                variables = [var for sector_model in self.sector_models for var in sector_model.by_agent_day.get((name, day), [])]
+                if len(variables) > 1:
+                    self.model.AddAtMostOne(variables)
+
+    def add_shared_weekend_constraints(self) -> None:
+        # The sectors cover the same dates, hence have the same weekends (also the sectors without Rygvagt)
+        num_days = max(len(sector_model.all_days) for sector_model in self.sector_models)
+        _, weekend_info = rygvagt_mandatory_leave_info(num_days - 1, range(num_days), dates=self.sectors[0].workbook.dates)
+        scheduled = {day for sector_model in self.sector_models for day in sector_model.task_schedules.get("Rygvagt", [])}
+
+        for name in self.shared:
+            for info in weekend_info:
+                saturday, sunday = info["saturday"], info["sunday"]
+
+                # Shared agents working the weekend in one sector must have the corresponding Mondays off in the others
+                for sector_model in self.sector_models:
+                    works_weekend = sector_model.x.get((name, "Rygvagt", saturday))
+                    if works_weekend is None:
+                        continue
+                    for monday in [info["monday_before"], info["monday_after"]]:
+                        if monday is None:
+                            continue
+                        variables = [
+                            var
+                            for other in self.sector_models
+                            if other is not sector_model
+                            for var in other.by_agent_day.get((name, monday), [])
+                        ]
+                        if variables:
+                            self.model.Add(sum(variables) == 0).OnlyEnforceIf(works_weekend)
+
+                # Enforce the same agent works Rygvagt on both days, when the days are split over the sectors
+                works_saturday = [model.x[key] for model in self.sector_models if (key := (name, "Rygvagt", saturday)) in model.x]
+                works_sunday = [model.x[key] for model in self.sector_models if (key := (name, "Rygvagt", sunday)) in model.x]
+                if len(works_saturday) + len(works_sunday) > 1 and saturday in scheduled and sunday in scheduled:
+                    self.model.Add(sum(works_saturday) == sum(works_sunday))
+
+    def add_joint_fairness_objective(self) -> None:
+        # The total assignments of an agent are those of all sectors
+        num_days = max(len(sector_model.all_days) for sector_model in self.sector_models)
+        for name in self.names:
+            sector_totals = [model.total_assignments[name] for model in self.sector_models if name in model.total_assignments]
+            self.total_assignments[name] = self.model.NewIntVar(0, num_days, f"joint_total_assignments_{name}")
+            self.model.Add(self.total_assignments[name] == sum(sector_totals))
+
+        # Every sector's lower bound holds for the joint maximum, as an agent's joint total is at least their sector total
+        self.lower_bound = max(sector_model.lower_bound for sector_model in self.sector_models)
+        self.max_assignments = self.model.NewIntVar(self.lower_bound, max(self.lower_bound, num_days), "joint_max_assignments")
+        self.model.AddMaxEquality(self.max_assignments, list(self.total_assignments.values()))
+        self.model.Minimize(self.max_assignments)
+
+    def symmetry_key(self, name: str) -> bytes:
+        """Agents with the same key are interchangeable in every sector, hence in the joint model."""
+        key = b""
+        for sector_indx, sector_model in enumerate(self.sector_models):
+            if name in sector_model.agent_position:
+                key += np.int64(sector_indx).tobytes() + sector_model.symmetry_key(sector_model.agent_position[name])
+        return key
+
+    def add_joint_symmetry_breaking_constraints(self) -> None:
+        for indices in equivalent_agents([self.symmetry_key(name) for name in self.names]):
+            totals = [self.total_assignments[self.names[indx]] for indx in indices]
+            for more, fewer in pairwise(totals):
+                self.model.Add(more >= fewer)
+
+    def extract_solution(self, solver: cp_model.CpSolver) -> dict[str, tuple[list[dict[str, int | str]], dict[str, int]]]:
+        """
+        Read the assignments of a solved model.
+
+        :return: Dictionary of sector name to a tuple of assignments (agent assigned to task on given day) and agent assignments
+        (total assignments for each, in that sector).
+        """
+        sector_models = zip(self.sectors, self.sector_models, strict=True)
+        return {sector.name: sector_model.extract_solution(solver) for sector, sector_model in sector_models}
+
+    def joint_assignments(self, solver: cp_model.CpSolver) -> dict[str, int]:
+        """The total assignments of each agent over all sectors, of a solved model."""
+        return {name: solver.Value(total) for name, total in self.total_assignments.items()}
+
+
+def solve_sectors(sectors: list[Sector], max_time_in_seconds: float, num_workers: int = 0, verbose: bool = True) -> dict | None:
+    """
+    Solve a group of sectors jointly (see `MultiSectorModel`).
+
+    :return: Dictionary of sector name to a tuple of assignments and agent assignments, or None if no feasible solution is found.
+    """
+    multi_model = MultiSectorModel(sectors).build()
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    solver.parameters.num_workers = num_workers  # <-- 0 is every core
+    status = solver.Solve(multi_model.model)
+
+    names = ", ".join(sector.name for sector in sectors)
+    if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        print(f"No feasible solution found for the sectors {names}.")
+        return
+
+    if verbose:
+        print(f"Sectors {names} ({solver.StatusName(status)}): maximum assignments {int(solver.ObjectiveValue())}")
+        joint = multi_model.joint_assignments(solver)
+        for name in multi_model.shared:
+            print(f"  Shared agent {name}: {joint[name]} assignments")
+
+    return multi_model.extract_solution(solver)
+
+
+def multi_sector_scheduling(
+    sector_paths: dict[str, str],
+    split: bool = True,
+    max_time_in_seconds: float = 300.0,
+    num_parallel: int | None = None,
+    verbose: bool = True,
+) -> dict[str, tuple[list[dict[str, int | str]], dict[str, int]]] | None:
+    """
+    Engine for scheduling several sectors whose agents may work in more than one of them, without double-booking anyone.
+
+    The sectors are read from their own data-files. Tasks that require several agents are read from each data-file's
+    'requirements' sheet (see `read_requirements`). With `split`, the sectors are grouped into components that share no agents
+    (see `sector_components`), which are independent problems and solved in parallel.
+
+    :param sector_paths: Dictionary of sector name to the path of its data-file. The sectors must cover the same dates.
+    :param split: (optional) If True, independent components are solved separately (and in parallel). Default is True.
+    :param max_time_in_seconds: (optional) Time limit for the solver, per component. Default is 300 seconds.
+    :param num_parallel: (optional) Number of components solved at once. Default is None (as many as there are cores).
+    :param verbose: (optional) If True, prints the objective of each component and the joint load of the shared agents. Default is True.
+
+    :return: Dictionary of sector name to a tuple of assignments (agent assigned to task on given day) and agent assignments
+    (total assignments for each, in that sector), or None if some component has no feasible solution.
+    """
+    sectors = read_sectors(sector_paths)
+    components = sector_components(sectors) if split else [list(range(len(sectors)))]
+
+    # Share the cores between the components solved at once
+    num_cores = os.cpu_count() or 1
+    num_parallel = min(num_parallel or num_cores, len(components))
+    num_workers = max(1, num_cores // num_parallel)
+
+    with ThreadPoolExecutor(max_workers=num_parallel) as executor:  # <-- the solver releases the GIL while solving
+        futures = [
+            executor.submit(solve_sectors, [sectors[indx] for indx in component], max_time_in_seconds, num_workers, verbose)
+            for component in components
+        ]
+        results = [future.result() for future in futures]
+
+    if any(result is None for result in results):
+        return
+
+    return {name: result[name] for name in sector_paths for result in results if name in result}
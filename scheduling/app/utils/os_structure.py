@@ -1,38 +1,118 @@
+import os
+
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
+
+from app.data_structures.workbook import ScheduleWorkbook
+from app.utils.solution_format import ColumnarSolution
+
+# Tasks that are written under another task's name in the results
+TASK_ALIASES = {"O-OP (tirsdag)": "O-OP"}
+
+# Extra formats of the results, written next to the Excel file (see `write_schedule_to_excel`)
+RESULT_FORMATS = ["csv", "parquet"]
+
+
+def write_rows(workbook: Workbook, sheet_name: str, header: list, rows: np.ndarray) -> None:
+    """Stream a header and the rows of an object array into a new sheet of a write-only workbook (missing values as empty cells)."""
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(header)
+    cells = rows.astype(object)
+    cells[pd.isna(cells)] = None
+    for row in cells.tolist():
+        sheet.append(row)
 
 
 def write_schedule_to_excel(
-    filename: str, data_path: str, assignments: list[dict[str, int | str]], agent_assignments: dict[str, int], verbose: bool = True
+    filename: str,
+    data: str | ScheduleWorkbook,
+    assignments: list[dict[str, int | str]] | ColumnarSolution,
+    agent_assignments: dict[str, int] | None = None,
+    verbose: bool = True,
+    formats: list[str] | None = None,
 ) -> None:
     """
     Writes the schedule and agent assignment counts to an Excel file.
 
+    Both the 'Schedule' sheet (the doctor charts with the assigned tasks) and the 'Task Assignments' sheet (the task markers with the
+    assigned agents, several agents of one task joined by ', ') are filled with a single scatter of the solution's columns into
+    the parsed input, and streamed to a write-only (constant memory) workbook.
+
     :param filename: Name of the Excel file to write to.
-    :param assignments: List of assignment dictionaries with keys 'Day', 'Task' and 'Agent'.
-    :param agent_assignments: Dictionary with agent names as keys and total assignments as values.
+    :param data: Path to the data-file or the already parsed workbook (avoids re-reading the input).
+    :param assignments: List of assignment dictionaries with keys 'Day', 'Task' and 'Agent', or the solution in columns.
+    :param agent_assignments: Dictionary with agent names as keys and total assignments as values (None with a `ColumnarSolution`).
     :param verbose: (optional) If True, prints the filename. Default is True.
+    :param formats: (optional) Extra formats of the assignments to write next to the Excel file, see `RESULT_FORMATS`:
+    'csv' (a row per assignment, with its date) and 'parquet' (the `ColumnarSolution`, requires pyarrow). Default is None.
     """
-    schedule_df = pd.read_excel(data_path, index_col=0, sheet_name="doctor_charts")
-    task_df = pd.read_excel(data_path, index_col=0, sheet_name="tasks")
-    task_df = task_df.drop("O-OP (tirsdag)", axis=1)
-
-    for assignment in assignments:
-        day = schedule_df.index[assignment["Day"]]
-        agent = assignment["Agent"]
-        task = assignment["Task"]
-        if task == "O-OP (tirsdag)":
-            task = "O-OP"
-        schedule_df.loc[day, agent] = task
-        task_df.loc[day, task] = agent
-
-    # Create a DataFrame for agent assignments
-    agent_assignments_df = pd.DataFrame(list(agent_assignments.items()), columns=["Agent", "Total Assignments"])
-
-    # Write to Excel
-    with pd.ExcelWriter(filename, engine="openpyxl") as writer:
-        schedule_df.to_excel(writer, sheet_name="Schedule")
-        task_df.to_excel(writer, sheet_name="Task Assignments")
-        agent_assignments_df.to_excel(writer, sheet_name="Agent Assignments", index=False)
+    workbook = data if isinstance(data, ScheduleWorkbook) else ScheduleWorkbook(data)
+    solution = assignments
+    if not isinstance(solution, ColumnarSolution):
+        solution = ColumnarSolution.from_assignments(assignments, agent_assignments, workbook.task_names)
+
+    # The names as written in the results, per assignment
+    written_tasks = np.array([TASK_ALIASES.get(task, task) for task in solution.tasks], dtype=object)[solution.task]
+    agent_names = np.array(solution.agents, dtype=object)[solution.agent]
+
+    # Schedule: the doctor charts, with the task of each assignment
+    charts = workbook.doctor_charts
+    missing_agents = [name for name in solution.agents if name not in charts.columns]
+    agent_columns = list(charts.columns) + missing_agents
+    schedule = np.concatenate([charts.to_numpy(dtype=object), np.full((len(charts), len(missing_agents)), np.nan, dtype=object)], axis=1)
+    agent_indexer = pd.Index(agent_columns).get_indexer(agent_names)
+    if (agent_indexer < 0).any():
+        raise ValueError(f"Agents without a column in the schedule: {sorted(set(agent_names[agent_indexer < 0]))}")
+    schedule[solution.day, agent_indexer] = written_tasks
+
+    # Task Assignments: the task markers, with the agents of each task-day
+    task_columns = [task for task in workbook.tasks.columns if task not in TASK_ALIASES]
+    task_grid = workbook.tasks[task_columns].to_numpy(dtype=object)
+    assigned = pd.DataFrame({"Day": solution.day, "Task": written_tasks, "Agent": agent_names}).groupby(["Day", "Task"], sort=False)["Agent"]
+    agents_per_slot = assigned.agg(", ".join)
+    days, tasks = agents_per_slot.index.get_level_values(0).to_numpy(), agents_per_slot.index.get_level_values(1)
+    task_indexer = pd.Index(task_columns).get_indexer(tasks)
+    if (task_indexer < 0).any():
+        raise ValueError(f"Tasks not in the 'tasks' sheet of the data-file: {sorted(set(tasks[task_indexer < 0]))}")
+    task_grid[days, task_indexer] = agents_per_slot.to_numpy()  # <-- a -1 would silently write to the last column
+
+    dates = charts.index.to_numpy(dtype=object)[:, None]
+    excel = Workbook(write_only=True)
+    write_rows(excel, "Schedule", [charts.index.name] + agent_columns, np.concatenate([dates, schedule], axis=1))
+    write_rows(excel, "Task Assignments", [workbook.tasks.index.name] + task_columns, np.concatenate([dates, task_grid], axis=1))
+    totals = np.column_stack([np.array(solution.agents, dtype=object), solution.totals.astype(object)])
+    write_rows(excel, "Agent Assignments", ["Agent", "Total Assignments"], totals)
+    excel.save(filename)
+
+    stem = os.path.splitext(filename)[0]
+    for extra_format in formats or []:
+        if extra_format == "csv":
+            frame = solution.keys().to_frame(index=False)
+            frame.insert(0, "Date", charts.index[solution.day])
+            frame.to_csv(f"{stem}.csv", index=False)
+        elif extra_format == "parquet":
+            solution.save(f"{stem}.parquet")
+        else:
+            raise ValueError(f"Unknown result format '{extra_format}', expected one of {RESULT_FORMATS}")
 
     if verbose:
         print(f"Schedule and agent assignments written to {filename}")
+
+
+def read_schedule_results(path: str) -> tuple[pd.DataFrame, dict[str, int]]:
+    """
+    Reads a results file written by `write_schedule_to_excel`.
+
+    :param path: Path to the results file.
+
+    :return: Tuple of the schedule (dates as index, agents as columns, the assigned task - or whatever the doctor chart said - as cells)
+    and the agent assignments (total assignments for each agent).
+    """
+    with pd.ExcelFile(path) as excel:
+        schedule_df = excel.parse("Schedule", index_col=0)
+        agent_assignments_df = excel.parse("Agent Assignments")
+
+    agent_assignments = dict(zip(agent_assignments_df["Agent"], agent_assignments_df["Total Assignments"].astype(int), strict=True))
+
+    return schedule_df, agent_assignments
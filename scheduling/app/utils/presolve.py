@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import eligibility_cube, rygvagt_mandatory_leave_info, schedule_matrix
+from app.utils.scheduling_model import TASKS_REQUIRING_MULTIPLE_AGENTS
+
+
+def presolve_forced_assignments(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    eligibility: np.ndarray | None = None,
+    day_offset: int = 2,
+    verbose: bool = True,
+    dates: pd.Index | None = None,
+    requirements: dict[str, int] | None = None,
+) -> tuple[np.ndarray, list[tuple[int, int, int]], dict[str, any]]:
+    """
+    Domain reduction before the CP-SAT model is built.
+
+    Task-days with exactly as many eligible agents as they require are forced, and the consequences of every forced assignment
+    are propagated until nothing changes:
+    - the agent can't do any other task that day, and nobody else can take a task-day that is full,
+    - a forced Rygvagt weekend day forces the other day of the weekend, and gives the agent the Mondays around it off,
+    - an agent forced on a Monday can't work Rygvagt on the weekend(s) around it.
+    Dominated variables, which can't be part of any solution, are dropped: agents eligible for only one day of a Rygvagt weekend.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param eligibility: (optional) Eligibility (agent x task x day) to start from. Default is None (read from the agents).
+    :param day_offset: (optional) Day of the week of index 0 (0=Monday, ..., 6=Sunday). Default is 2.
+    :param verbose: (optional) If True, prints what was fixed. Default is True.
+    :param dates: (optional) The date of each day (e.g. `ScheduleWorkbook.dates`), which replace `day_offset`. Default is None.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of the reduced eligibility (agent x task x day), the forced (agent index, task index, day) triples
+    and a report with the keys 'rounds', 'forced', 'removed' and 'infeasible' (empty, unless the input is obviously infeasible).
+    """
+    num_days = max(max(task_schedules[task]) for task in tasks) + 1
+    _, weekend_info = rygvagt_mandatory_leave_info(num_days - 1, range(num_days), day_offset, dates)
+
+    eligible = eligibility_cube(tasks, task_schedules, agents, num_days) if eligibility is None else eligibility.copy()
+    initially_eligible = eligible.sum()
+    scheduled = schedule_matrix(tasks, task_schedules, num_days)
+    requirements = requirements or TASKS_REQUIRING_MULTIPLE_AGENTS
+    required = np.array([requirements.get(task, 1) for task in tasks])[:, None] * scheduled  # <-- task x day
+    forced = np.zeros_like(eligible)
+
+    ryg = tasks.index("Rygvagt") if "Rygvagt" in tasks else None
+    weekends = []  # <-- (saturday, sunday if paired else None, mondays)
+    if ryg is not None:
+        for info in weekend_info:
+            paired = scheduled[ryg, info["saturday"]] and scheduled[ryg, info["sunday"]]
+            mondays = [monday for monday in [info["monday_before"], info["monday_after"]] if monday is not None]
+            weekends.append((info["saturday"], info["sunday"] if paired else None, mondays))
+
+    infeasible = []
+    rounds = 0
+    changed = True
+    while changed and not infeasible:
+        rounds += 1
+        before = (eligible.sum(), forced.sum())
+
+        for saturday, sunday, mondays in weekends:
+            if sunday is not None:
+                # Dominated: eligible for only one day of a paired weekend. And one forced day forces the other.
+                both = eligible[:, ryg, saturday] & eligible[:, ryg, sunday]
+                eligible[:, ryg, saturday] &= both
+                eligible[:, ryg, sunday] &= both
+                forced[:, ryg, saturday] |= forced[:, ryg, sunday]
+                forced[:, ryg, sunday] |= forced[:, ryg, saturday]
+
+            # Monday leave, in both directions
+            if not mondays:
+                continue
+            works_weekend = np.flatnonzero(forced[:, ryg, saturday])
+            eligible[np.ix_(works_weekend, np.arange(len(tasks)), mondays)] = False
+            works_monday = forced[:, :, mondays].any(axis=(1, 2))
+            eligible[works_monday, ryg, saturday] = False
+            if sunday is not None:
+                eligible[works_monday, ryg, sunday] = False
+
+        # Task-days with exactly as many eligible agents as required are forced
+        counts = eligible.sum(axis=0)
+        tight = scheduled & (counts == required)
+        forced |= eligible & tight[None, :, :]
+
+        # Forced agents can't do anything else that day, and full task-days are closed to everybody else
+        busy = forced.any(axis=1)  # <-- agent x day
+        eligible &= forced | ~busy[:, None, :]
+        full = forced.sum(axis=0) >= required
+        eligible &= forced | ~full[None, :, :]
+
+        # Obviously infeasible: too few eligible agents, forced twice on one day, or forced where not eligible
+        for task_indx, day in np.argwhere(scheduled & (eligible.sum(axis=0) < required)).tolist():
+            infeasible.append({"Task": tasks[task_indx], "Day": day, "Eligible": int(eligible[:, task_indx, day].sum())})
+        for agent_indx, day in np.argwhere(forced.sum(axis=1) > 1).tolist():
+            infeasible.append({"Agent": agents[agent_indx].name, "Day": day, "Forced": int(forced[agent_indx, :, day].sum())})
+        for agent_indx, task_indx, day in np.argwhere(forced & ~eligible).tolist():
+            infeasible.append({"Agent": agents[agent_indx].name, "Task": tasks[task_indx], "Day": day, "Forced": 1})
+
+        changed = (eligible.sum(), forced.sum()) != before
+
+    fixed = [tuple(triple) for triple in np.argwhere(forced).tolist()]
+    report = {
+        "rounds": rounds,
+        "forced": [{"Day": day, "Task": tasks[task_indx], "Agent": agents[agent_indx].name} for agent_indx, task_indx, day in fixed],
+        "removed": int(initially_eligible - eligible.sum()),
+        "infeasible": infeasible,
+    }
+
+    if verbose:
+        print(f"Presolve ({rounds} rounds): fixed {len(fixed)} assignments, removed {report['removed']} of {initially_eligible} variables")
+        for problem in infeasible:
+            print(f"  Infeasible: {problem}")
+
+    return eligible, fixed, report
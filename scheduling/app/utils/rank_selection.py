@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def naive_rank_selection(fitness_scores: list[float], ties: str = "first") -> np.ndarray:
+    ranks = ranking(fitness_scores, ties)
+    return ranks / ranks.sum()
+
+
+def linear_rank_selection(fitness_scores: list[float], selection_pressure: float | np.ndarray, ties: str = "first") -> np.ndarray:
+    """
+    Linear rank selection probabilities of the fitness scores.
+
+    A vector of selection pressures is evaluated in one broadcasted operation, giving one row of probabilities per selection pressure.
+    :return: Array of shape (n,) for a single selection pressure, or (len(selection_pressure), n) for a vector of them.
+    """
+    sp = np.asarray(selection_pressure, dtype=float)
+    assert np.all((1 <= sp) & (sp <= 2)), "Selection pressure must be between 1 and 2"
+
+    ranks = ranking(fitness_scores, ties)
+    n = len(ranks)
+    relative_ranks = (ranks - 1) / (n - 1) if n > 1 else np.ones(n)
+
+    return (2 - sp[..., None] + 2 * (sp[..., None] - 1) * relative_ranks) / n
+
+
+def exponential_rank_selection(fitness_scores: list[float], weight: float | np.ndarray, ties: str = "first") -> np.ndarray:
+    """
+    Exponential rank selection probabilities of the fitness scores.
+
+    A vector of weights is evaluated in one broadcasted operation, giving one row of probabilities per weight.
+    :return: Array of shape (n,) for a single weight, or (len(weight), n) for a vector of them.
+    """
+    w = np.asarray(weight, dtype=float)
+    assert np.all((0 <= w) & (w <= 1)), "Weight must be between 0 and 1"
+
+    ranks = ranking(fitness_scores, ties)
+    n = len(ranks)
+    weight_sum = (w[..., None] ** np.arange(n)).sum(axis=-1, keepdims=True)
+
+    return w[..., None] ** (n - ranks) / weight_sum
+
+
+def ranking(fitness_scores: list[float], ties: str = "first") -> np.ndarray:
+    """
+    Ranks the fitness scores in ascending order from 1 to N ('num elements'). But retains the original index of the fitness score.
+
+    Ties are ranked by their original index ('first'), or share the lowest ('min') or the average ('average') of their ranks.
+    """
+    fitness_scores = np.asarray(fitness_scores)
+    sorting_indices = get_sorting_indices(fitness_scores)
+    ranks = get_rank_from_sorting_indices(sorting_indices)
+    if ties == "first":
+        return ranks
+
+    # Groups of tied scores, in sorted order
+    sorted_scores = fitness_scores[sorting_indices]
+    group = np.concatenate([[0], np.cumsum(sorted_scores[1:] != sorted_scores[:-1])])
+    first = np.flatnonzero(np.concatenate([[True], group[1:] != group[:-1]])) + 1  # <-- lowest rank of each group
+    match ties:
+        case "min":
+            group_ranks = first.astype(float)
+        case "average":
+            last = np.append(first[1:] - 1, len(sorted_scores))  # <-- highest rank of each group
+            group_ranks = (first + last) / 2
+        case _:
+            raise ValueError("Invalid ties method, must be 'first', 'min' or 'average'")
+
+    tied_ranks = np.empty(len(fitness_scores))
+    tied_ranks[sorting_indices] = group_ranks[group]
+    return tied_ranks
+
+
+def get_rank_from_sorting_indices(sorting_indices: np.ndarray) -> np.ndarray:
+    """
+    Returns the rank of each element in the list from the sorting indices (the inverse permutation, plus one).
+    """
+    ranks = np.empty(len(sorting_indices), dtype=np.int64)
+    ranks[sorting_indices] = np.arange(1, len(sorting_indices) + 1)
+    return ranks
+
+
+def get_sorting_indices(some_list: list | np.ndarray) -> np.ndarray:
+    """
+    Returns the indices that would sort the list in ascending order (stable, such that ties keep their original order).
+    """
+    return np.argsort(some_list, kind="stable")
@@ -0,0 +1,110 @@
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from app.data_structures.agent import Agent
+from app.utils.matching_engine import matching_scheduling
+from app.utils.os_structure import read_schedule_results
+from app.utils.presolve import presolve_forced_assignments
+from app.utils.rolling_horizon import resolve_task
+from app.utils.scheduling_engines import solve_back_model
+from app.utils.scheduling_model import BackSchedulingModel
+
+
+def published_assignments(tasks: list[str], task_schedules: dict[str, list[int]], published_path: str) -> list[tuple[str, str, int]]:
+    """
+    The (agent name, task, day) assignments of a published results file (written by `write_schedule_to_excel` for the same period).
+    """
+    schedule_df, _ = read_schedule_results(published_path)
+    scheduled = {task: set(task_schedules[task]) for task in tasks}
+
+    assignments = []
+    for day, (_, row) in enumerate(schedule_df.iterrows()):
+        for name, cell in row.items():
+            task = resolve_task(cell, day, tasks, scheduled)
+            if task is not None:
+                assignments.append((name, task, day))
+
+    return assignments
+
+
+def replan_schedule(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    published_path: str,
+    fairness_slack: int = 0,
+    max_time_in_seconds: float = 60.0,
+    verbose: bool = True,
+    dates: pd.Index | None = None,
+    requirements: dict[str, int] | None = None,
+) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
+    """
+    Engine for re-planning a published schedule of the 'back' (ryg) sector after the input was edited (e.g. a new day off).
+
+    Instead of solving from scratch, the number of changed assignments is minimized, subject to all constraints and to a fairness
+    bound: nobody may end up with more than the published maximum plus `fairness_slack` assignments. Assignments that are no longer
+    possible at all (e.g. on the new day off) count as changed. Symmetry breaking is off, as it could force interchangeable agents
+    to swap schedules that were already published.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled), from the edited input
+    :param agents: List of Agent objects, from the edited input
+    :param published_path: Path to the published results (written by `write_schedule_to_excel`)
+    :param fairness_slack: (optional) How many assignments the busiest agent may exceed the published maximum by. Default is 0.
+    :param max_time_in_seconds: (optional) Time limit for the solver. Default is 60 seconds.
+    :param verbose: (optional) If True, prints the changed assignments. Default is True.
+    :param dates: (optional) The date of each day (e.g. `ScheduleWorkbook.dates`), for the weekends. Default is None.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each),
+    or None if no feasible re-plan is found (e.g. the slack is too small).
+    """
+    published = published_assignments(tasks, task_schedules, published_path)
+    _, published_totals = read_schedule_results(published_path)
+    fairness_bound = max(published_totals.values(), default=0) + fairness_slack
+
+    eligibility, fixed, report = presolve_forced_assignments(
+        tasks, task_schedules, agents, verbose=verbose, dates=dates, requirements=requirements
+    )
+    if report["infeasible"]:
+        print("No feasible solution found.")
+        return
+
+    back_model = BackSchedulingModel(
+        tasks,
+        task_schedules,
+        agents,
+        symmetry_breaking=False,
+        eligibility=eligibility,
+        fixed=fixed,
+        dates=dates,
+        requirements=requirements,
+    ).build()
+
+    # Minimal perturbation: keep as many published assignments as possible, within the fairness bound
+    kept = [back_model.x[key] for key in published if key in back_model.x]
+    impossible = len(published) - len(kept)  # <-- changed in any case
+    back_model.model.Add(back_model.max_assignments <= fairness_bound)
+    back_model.model.Minimize(impossible + sum(1 - var for var in kept))
+
+    # The published schedule, repaired into a complete hint
+    draft = matching_scheduling(tasks, task_schedules, agents, follow=published, verbose=False, dates=dates, requirements=requirements)
+    if draft is not None:
+        back_model.add_hints([(assignment["Agent"], assignment["Task"], assignment["Day"]) for assignment in draft[0]], complete=True)
+
+    status, solver = solve_back_model(back_model, max_time_in_seconds)
+    if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        print(f"No feasible re-plan found within a maximum of {fairness_bound} assignments.")
+        return
+
+    assignments, agent_assignments = back_model.extract_solution(solver)
+    if verbose:
+        replanned = {(assignment["Agent"], assignment["Task"], assignment["Day"]) for assignment in assignments}
+        print(f"Re-plan ({solver.StatusName(status)}): {int(solver.ObjectiveValue())} of {len(published)} assignments changed")
+        for name, task, day in sorted(set(published) - replanned, key=lambda key: (key[2], key[0])):
+            print(f"  Day {day}: {name} no longer on {task}")
+        for name, task, day in sorted(replanned - set(published), key=lambda key: (key[2], key[0])):
+            print(f"  Day {day}: {name} now on {task}")
+
+    return assignments, agent_assignments
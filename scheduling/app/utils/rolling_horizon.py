@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import eligibility_cube
+from app.utils.os_structure import TASK_ALIASES, read_schedule_results
+from app.utils.presolve import presolve_forced_assignments
+from app.utils.scheduling_engines import solve_back_model
+from app.utils.scheduling_model import BackSchedulingModel
+
+HINT_SHIFT = pd.Timedelta(days=28)  # <-- Hint each day with the same weekday, four weeks earlier
+
+
+def resolve_task(cell: any, day: int, tasks: list[str], scheduled: dict[str, set[int]]) -> str | None:
+    """
+    The task a cell of a results schedule refers to on the given day (undoing `TASK_ALIASES`, preferring tasks scheduled
+    on the day), or None if it isn't a task.
+    """
+    if not isinstance(cell, str):
+        return None
+    candidates = [task for task in tasks if task == cell or TASK_ALIASES.get(task) == cell]
+    for task in candidates:
+        if day in scheduled[task]:
+            return task
+    return candidates[0] if candidates else None
+
+
+def previous_period_constraints(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    dates: pd.DatetimeIndex,
+    previous_schedule: pd.DataFrame,
+    previous_totals: dict[str, int],
+) -> tuple[dict[str, list[int]], np.ndarray, list[tuple[int, int, int]], dict[str, int], list[tuple[str, str, int]]]:
+    """
+    Everything a new period inherits from the previous period's results.
+
+    - Overlap days (dates in both periods) are frozen to the previous assignments, which also decide what is scheduled on them.
+    - Weekend constraints across the boundary: the Monday after a previous Rygvagt weekend is off, agents who worked the Monday
+      before a new weekend can't take its Rygvagt, and a Sunday continues the previous period's Saturday Rygvagt.
+    - Assignments are carried over, minus those on the overlap days (which are counted again in the new period).
+    - Hints for the new period from the previous one, four weeks earlier.
+
+    :return: Tuple of the task schedules (adjusted to the frozen overlap), the eligibility (agent x task x day),
+    the fixed (agent index, task index, day) triples, the carried assignments per agent name,
+    and the hinted (agent name, task, day) assignments.
+    """
+    num_days = max(max(task_schedules[task]) for task in tasks) + 1
+    dates = pd.DatetimeIndex(dates[:num_days]).normalize()
+    previous_dates = pd.DatetimeIndex(previous_schedule.index).normalize()
+    previous_schedule = previous_schedule.set_axis(previous_schedule.index.map(lambda date: pd.Timestamp(date).normalize()))
+
+    scheduled = {task: set(task_schedules[task]) for task in tasks}
+    task_position = {task: indx for indx, task in enumerate(tasks)}
+    ryg = task_position.get("Rygvagt")
+    day_position = {date: day for day, date in enumerate(dates)}
+    names = [agent.name for agent in agents]
+    known = [name for name in names if name in previous_schedule.columns]
+    task_names = set(tasks) | set(TASK_ALIASES.values())  # <-- as written in the results
+
+    def previous_task(name: str, date: pd.Timestamp, day: int) -> str | None:
+        if date not in previous_schedule.index or name not in previous_schedule.columns:
+            return None
+        return resolve_task(previous_schedule.at[date, name], day, tasks, scheduled)
+
+    fixed = []
+    carried = {name: int(previous_totals.get(name, 0)) for name in names}
+
+    # Freeze the overlap days - what was assigned there is what is scheduled there
+    overlap = [day for day, date in enumerate(dates) if date in previous_dates]
+    for day in overlap:
+        for task in tasks:
+            scheduled[task].discard(day)
+        for agent_indx, name in enumerate(names):
+            task = previous_task(name, dates[day], day)
+            if task is not None:
+                scheduled[task].add(day)
+                fixed.append((agent_indx, task_position[task], day))
+                carried[name] -= 1
+
+    task_schedules = {task: sorted(scheduled[task]) for task in tasks}
+    eligible = eligibility_cube(tasks, task_schedules, agents, num_days)
+    for agent_indx, task_indx, day in fixed:
+        eligible[agent_indx, :, day] = False
+        eligible[agent_indx, task_indx, day] = True  # <-- Frozen, whatever the doctor chart of the new period says
+
+    # Weekend constraints across the boundary
+    if ryg is not None:
+        for previous_date in previous_dates:
+            monday = previous_date + pd.Timedelta(days=7 - previous_date.weekday())
+            if previous_date.weekday() < 5 or monday not in day_position or day_position[monday] in overlap:
+                continue
+            for name in known:
+                if previous_schedule.at[previous_date, name] == "Rygvagt":
+                    eligible[names.index(name), :, day_position[monday]] = False
+
+        for day, date in enumerate(dates):
+            if day in overlap:
+                continue
+            monday_before = date - pd.Timedelta(days=5)
+            if date.weekday() == 5 and monday_before in previous_dates and monday_before not in day_position:
+                weekend = [day] + ([day + 1] if day + 1 < num_days else [])
+                for name in known:
+                    if previous_schedule.at[monday_before, name] in task_names:
+                        eligible[names.index(name), ryg, weekend] = False
+
+            saturday = date - pd.Timedelta(days=1)
+            if date.weekday() == 6 and saturday in previous_dates and saturday not in day_position and day in scheduled["Rygvagt"]:
+                for name in known:
+                    if previous_schedule.at[saturday, name] == "Rygvagt":
+                        eligible[names.index(name), ryg, day] = True
+                        fixed.append((names.index(name), ryg, day))
+
+    # Hints from four weeks earlier
+    hints = []
+    for day, date in enumerate(dates):
+        for name in known:
+            task = previous_task(name, date - HINT_SHIFT, day)
+            if task is not None:
+                hints.append((name, task, day))
+
+    return task_schedules, eligible, fixed, carried, hints
+
+
+def rolling_horizon_scheduling(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    dates: pd.DatetimeIndex,
+    previous_results_path: str,
+    max_time_in_seconds: float = 300.0,
+    requirements: dict[str, int] | None = None,
+) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
+    """
+    Engine for scheduling the 'back' (ryg) sector as the continuation of a previous period.
+
+    The overlap with the previous period's results is frozen, the weekend constraints across the boundary are kept,
+    the previous assignment counts are carried into the fairness objective, and the solver is hinted from the previous period.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param dates: The dates of the new period (the index of the data-file, see `ScheduleWorkbook.dates`)
+    :param previous_results_path: Path to the previous period's results (written by `write_schedule_to_excel`)
+    :param max_time_in_seconds: (optional) Time limit for the solver. Default is 300 seconds.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (cumulative total assignments,
+    such that the results can seed the next period), or None if no feasible solution is found.
+    """
+    previous_schedule, previous_totals = read_schedule_results(previous_results_path)
+    task_schedules, eligibility, fixed, carried, hints = previous_period_constraints(
+        tasks, task_schedules, agents, dates, previous_schedule, previous_totals
+    )
+
+    eligibility, forced, report = presolve_forced_assignments(
+        tasks, task_schedules, agents, eligibility, dates=dates, requirements=requirements
+    )
+    if report["infeasible"]:
+        print("No feasible solution found.")
+        return
+
+    back_model = BackSchedulingModel(
+        tasks,
+        task_schedules,
+        agents,
+        eligibility=eligibility,
+        fixed=sorted(set(fixed) | set(forced)),
+        carried_assignments=carried,
+        dates=dates,
+        requirements=requirements,
+    ).build()
+    back_model.add_hints(hints)
+
+    status, solver = solve_back_model(back_model, max_time_in_seconds)
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        return back_model.extract_solution(solver)
+    else:
+        print("No feasible solution found.")
+        return
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+def as_generator(rng: np.random.Generator | int | None = None) -> np.random.Generator:
+    """
+    Returns a numpy generator, seeded with `rng` if it is an integer (or None), or `rng` itself if it is already a generator.
+    """
+    return rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+
+
+class AliasTable:
+    """
+    Walker's alias method (Vose's construction) for drawing from fixed discrete probabilities in O(1) per draw.
+
+    Build the table once per probability vector, e.g. the output of `linear_rank_selection`, `exponential_rank_selection` or
+    `naive_rank_selection`, and draw as often as needed. A matrix of probabilities (one row per population, e.g. one per selection
+    pressure) gives one table per row, and `draw` draws from all of them at once.
+    """
+
+    def __init__(self, probabilities: np.ndarray) -> None:
+        probabilities = np.asarray(probabilities, dtype=float)
+        assert np.all(probabilities >= 0), "Probabilities must be non-negative"
+
+        self.batched = probabilities.ndim == 2
+        probabilities = np.atleast_2d(probabilities)
+        self.num_rows, self.n = probabilities.shape
+
+        self.prob = np.ones(probabilities.shape)  # <-- probability of keeping the drawn column
+        self.alias = np.tile(np.arange(self.n), (self.num_rows, 1))  # <-- the column drawn otherwise
+        for row, row_probabilities in enumerate(probabilities):
+            self.build_row(row, row_probabilities / row_probabilities.sum())
+
+    def build_row(self, row: int, probabilities: np.ndarray) -> None:
+        scaled = probabilities * self.n
+        small = np.flatnonzero(scaled < 1).tolist()
+        large = np.flatnonzero(scaled >= 1).tolist()
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[row, less] = scaled[less]
+            self.alias[row, less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left is 1 up to rounding, and keeps `prob` 1
+
+    def draw(self, k: int, rng: np.random.Generator | int | None = None) -> np.ndarray:
+        """
+        Draws k indices (with replacement) from each row.
+        :return: Array of shape (k,), or (rows, k) for a matrix of probabilities.
+        """
+        rng = as_generator(rng)
+        rows = np.arange(self.num_rows)[:, None]
+        columns = rng.integers(self.n, size=(self.num_rows, k))
+        keep = rng.random((self.num_rows, k)) < self.prob[rows, columns]
+        draws = np.where(keep, columns, self.alias[rows, columns])
+
+        return draws if self.batched else draws[0]
+
+
+def alias_sampling(probabilities: np.ndarray, k: int, rng: np.random.Generator | int | None = None) -> np.ndarray:
+    """
+    Draws k indices (with replacement) from the probabilities (or from each row of a matrix of probabilities) with an alias table.
+    Prefer building an `AliasTable` once when drawing repeatedly from the same probabilities.
+    """
+    return AliasTable(probabilities).draw(k, rng)
+
+
+def stochastic_universal_sampling(
+    probabilities: np.ndarray, k: int, rng: np.random.Generator | int | None = None, shuffle: bool = True
+) -> np.ndarray:
+    """
+    Stochastic universal sampling (SUS): k equally spaced pointers with a single random offset, such that every index is drawn
+    either floor(k * p) or ceil(k * p) times - the lowest variance a sample of k can have.
+
+    A matrix of probabilities (one row per population) is sampled in one vectorized operation.
+    :param shuffle: (optional) If True, the draws are shuffled, as SUS draws them in index order (bad for pairing parents). Default is True.
+    :return: Array of shape (k,), or (rows, k) for a matrix of probabilities.
+    """
+    rng = as_generator(rng)
+    probabilities = np.asarray(probabilities, dtype=float)
+    batched = probabilities.ndim == 2
+    probabilities = np.atleast_2d(probabilities)
+    num_rows, n = probabilities.shape
+
+    # Offsetting row r by r lets a single `searchsorted` handle every row
+    cumulative = np.cumsum(probabilities / probabilities.sum(axis=1, keepdims=True), axis=1)
+    cumulative[:, -1] = 1.0  # <-- no pointer may fall beyond the last index due to rounding
+    offsets = np.arange(num_rows)[:, None]
+    pointers = (rng.random((num_rows, 1)) + np.arange(k)) / k
+    draws = np.searchsorted((cumulative + offsets).ravel(), (pointers + offsets).ravel(), side="right").reshape(num_rows, k)
+    draws = np.minimum(draws - offsets * n, n - 1)
+
+    if shuffle:
+        draws = rng.permuted(draws, axis=1)
+
+    return draws if batched else draws[0]
@@ -1,136 +1,130 @@
-import pandas as pd
+import numpy as np
 
-from app.data_structures.agent import Agent
+from app.data_structures.agent import Agent, AgentTable
+from app.data_structures.workbook import ScheduleWorkbook
+from app.utils.scheduling_model import TASKS_REQUIRING_MULTIPLE_AGENTS
 
+NEURO_SURGEONS = ["TSJ", "MA", "AJ"]
 
-def str_and_x(cell: any) -> bool:
-    return type(cell) is str and cell.lower() == "x"
 
-
-def read_tasks(path: str) -> tuple[list[str], dict[str, list[int]]]:
+def read_workbook(path: str) -> ScheduleWorkbook:
     """
-    Read the 'tasks' sheet from the 'data-file'.
+    Read every sheet of the 'data-file' in a single pass.
 
     :param path: Path to the Excel file.
 
-    :return: Tuple of tasks (list of task names) and task schedules (dictionary of which days each task is scheduled).
+    :return: The parsed workbook, which can be shared between preprocessing and output.
     """
+    return ScheduleWorkbook(path)
 
-    # Read the Excel file, without enumerating the rows, first column as index
-    df = pd.read_excel(path, index_col=0, sheet_name="tasks")
 
-    tasks = []
-    task_schedules = {}
+def read_tasks(workbook: ScheduleWorkbook) -> tuple[list[str], dict[str, list[int]]]:
+    """
+    Read the 'tasks' sheet from the 'data-file'.
+
+    :param workbook: The parsed data-file.
 
-    # Iterate through cols (tasks) in dataframe
-    for task in df.columns:
-        tasks.append(task)
-        task_schedule = []
-        for indx, day in enumerate(df.index):
-            if str_and_x(df[task][day]):
-                task_schedule.append(indx)
-        task_schedules[task] = task_schedule
+    :return: Tuple of tasks (list of task names) and task schedules (dictionary of which days each task is scheduled).
+    """
+    tasks = workbook.task_names
+    task_schedules = {task: np.flatnonzero(workbook.task_markers[:, indx]).tolist() for indx, task in enumerate(tasks)}
 
     return tasks, task_schedules
 
 
-def read_agent_qualifications(path: str) -> dict[str, Agent]:
+def read_agent_qualifications(workbook: ScheduleWorkbook) -> dict[str, Agent]:
     """
     Read the 'doctors' sheet from the 'data-file'.
 
-    :param path: Path to the Excel file.
+    :param workbook: The parsed data-file.
 
-    :return: Dictionary (name to Agent) of Agent objects.
+    :return: Dictionary (name to Agent) of Agent objects, all viewing the same `AgentTable`.
     """
+    table = AgentTable(workbook.agent_names, list(workbook.doctors.columns), num_days=len(workbook.doctor_charts.index))
+    table.qualifications[:, :] = workbook.qualification_markers
 
-    # Read the Excel file, without enumerating the rows, first column as index
-    df = pd.read_excel(path, index_col=0, sheet_name="doctors")
+    return {agent.name: agent for agent in table.agents()}
 
-    agents = {}
-    for indx, row in df.iterrows():
-        agent = Agent(name=indx)
-        qualifications = {}
-        for task in df.columns:
-            if str_and_x(row[task]):
-                qualifications[task] = True
-            else:
-                qualifications[task] = False
 
-        agent.add_qualifications(qualifications)
-        agents[agent.name] = agent
-
-    return agents
-
-
-def read_agents(path: str, agents: dict[str, Agent]) -> dict[str, Agent]:
+def read_agents(workbook: ScheduleWorkbook, agents: dict[str, Agent]) -> dict[str, Agent]:
     """
     Read the 'doctor_charts' sheet from the 'data-file'.
 
-    :param path: Path to the Excel file.
+    :param workbook: The parsed data-file.
     :param agents: Dictionary (name to Agent) of Agent objects.
 
     :return: Updated dictionary (name to Agent) of Agent objects.
     """
-    df = pd.read_excel(path, index_col=0, sheet_name="doctor_charts")
-
-    # Iterate through cols (tasks) in dataframe
-    for agent in df.columns:
-        days_off = []
-        for indx, day in enumerate(df.index):
-            cell = df[agent][day]
-            if type(cell) is str and cell in ["ønskefridag", "afspadsere", "ønskefri", "FU-dag"]:
-                days_off.append(indx)
-        agents[agent].add_days_off(days_off)
+    rows = [agents[agent].index for agent in workbook.doctor_charts.columns]
+    if rows:
+        table = agents[workbook.doctor_charts.columns[0]].table
+        table.availability[rows, :] = ~workbook.days_off_markers.T
 
     return agents
 
 
 def read_rolling_chart(
-    path: str, agents: dict[str, Agent], task_schedules: dict[str : list[int]]
+    workbook: ScheduleWorkbook, agents: dict[str, Agent], task_schedules: dict[str : list[int]]
 ) -> tuple[dict[str, Agent], dict[str : list[int]]]:
     """
     Read the 'rolling_chart' sheet from the 'data-file'. The preferences for the 'rygvagt' task.
 
-    :param path: Path to the Excel file.
+    :param workbook: The parsed data-file.
     :param agents: Dictionary (name to Agent) of Agent objects.
     :param task_schedules: Dictionary of task schedules (which days each task is scheduled).
 
     :return: Tuple of updated dictionary (name to Agent) of Agent objects
     and updated dictionary of task schedules (which days each task is scheduled)..
     """
-    df = pd.read_excel(path, index_col=1, sheet_name="rolling_chart")
-
-    col = df.columns[1]
-    schedule_horizon = len(df.index)
-    task_preferences = {name: [0 for _ in range(schedule_horizon)] for name in agents.keys()}
-    for indx, day in enumerate(df.index):
-        agent_name = df[col][day]
-        # Handling the neuro-surgeons
-        if agent_name in ["TSJ", "MA", "AJ"]:
-            task_schedules["Rygvagt"].remove(indx)
-        else:
-            task_preferences[agent_name][indx] = 1
-
-    for agent in agents.values():
-        agent.add_task_preferences(task_preferences[agent.name])
+    if workbook.rolling_chart is None or "Rygvagt" not in task_schedules:
+        return agents, task_schedules  # <-- a sector without 'Rygvagt'
+
+    chart_names = workbook.rolling_chart_names
+
+    # Handling the neuro-surgeons
+    neuro_days = set(np.flatnonzero(np.isin(chart_names, NEURO_SURGEONS)).tolist())
+    task_schedules["Rygvagt"] = [day for day in task_schedules["Rygvagt"] if day not in neuro_days]
+
+    unknown = set(chart_names[~np.isin(chart_names, NEURO_SURGEONS + list(agents.keys()))].tolist())
+    if unknown:
+        raise ValueError(f"The rolling chart refers to unknown agents: {sorted(map(str, unknown))}")
+
+    if agents:
+        table = next(iter(agents.values())).table
+        table.preferences = (np.asarray(table.names, dtype=object)[:, None] == chart_names[None, :]).astype(np.int8)
 
     return agents, task_schedules
 
 
-def parse_constraints(path: str) -> tuple[list[str], dict[str, list[int]], list[Agent]]:
+def read_requirements(workbook: ScheduleWorkbook) -> dict[str, int]:
+    """
+    Read the optional 'requirements' sheet from the 'data-file': how many agents each task requires.
+
+    :param workbook: The parsed data-file.
+
+    :return: Dictionary of the number of agents required per task. Tasks missing from the sheet (or every task, without the sheet)
+    fall back to the 'back' (ryg) sector's requirements, `TASKS_REQUIRING_MULTIPLE_AGENTS`, and otherwise require a single agent.
+    """
+    requirements = workbook.requirements
+    return {task: requirements.get(task, TASKS_REQUIRING_MULTIPLE_AGENTS.get(task, 1)) for task in workbook.task_names}
+
+
+def parse_constraints(data: str | ScheduleWorkbook) -> tuple[list[str], dict[str, list[int]], list[Agent]]:
     """
     Gather all functions for reading input into one.
     Parse all constraints for the back-scheduling problem.
 
-    :param path: Path to the Excel file (data-file/ input).
+    :param data: Path to the Excel file (data-file/ input) or the already parsed workbook.
 
     :return: Tuple of tasks (list of task names), task schedules (dictionary of which days each task is scheduled),
     and list of Agent objects.
     """
-    tasks, task_schedules = read_tasks(path)
-    agents = read_agent_qualifications(path)
-    agents = read_agents(path, agents)
-    agents, task_schedules = read_rolling_chart(path, agents, task_schedules)
+    workbook = data if isinstance(data, ScheduleWorkbook) else read_workbook(data)
+
+    tasks, task_schedules = read_tasks(workbook)
+    agents = read_agent_qualifications(workbook)
+    agents = read_agents(workbook, agents)
+    agents, task_schedules = read_rolling_chart(workbook, agents, task_schedules)
 
     agents = list(agents.values())  # <-- convert agents to list
 
@@ -0,0 +1,255 @@
+import numpy as np
+import pandas as pd
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import availability_matrix, qualification_matrix, rygvagt_mandatory_leave_info, schedule_matrix
+from app.utils.os_structure import read_schedule_results
+from app.utils.rolling_horizon import resolve_task
+from app.utils.scheduling_model import TASKS_REQUIRING_MULTIPLE_AGENTS
+
+# The rules of `back_scheduling`, in the order of the columns of `ScheduleValidator.violation_counts`
+RULES = ["qualifications", "days_off", "coverage", "one_task_per_day", "weekend_pairing", "monday_leave"]
+
+
+class ScheduleValidator:
+    """
+    Checks schedules against every rule `back_scheduling` encodes, with array operations only.
+
+    A schedule is a set of (agent index, task index, day) assignments, given as three arrays. A batch of schedules is given as
+    2D arrays (schedules x assignments), where the task and day arrays may also be 1D and shared by the whole batch, as in
+    the slot encoding of the genetic algorithm (see `ScheduleEncoding`).
+
+    `violation_counts` counts the violations of each rule for a whole batch (the fitness kernel of the heuristic engines),
+    `violations` locates the violations of a single schedule (for the planners).
+    """
+
+    def __init__(
+        self,
+        tasks: list[str],
+        task_schedules: dict[str, list[int]],
+        agents: list[Agent],
+        day_offset: int = 2,
+        requirements: dict[str, int] | None = None,
+        dates: pd.Index | None = None,
+    ) -> None:
+        self.tasks = tasks
+        self.names = [agent.name for agent in agents]
+        self.num_agents = len(agents)
+        self.num_tasks = len(tasks)
+        self.num_days = max(max(task_schedules[task]) for task in tasks) + 1
+
+        requirements = requirements or TASKS_REQUIRING_MULTIPLE_AGENTS
+        self.qualified = qualification_matrix(tasks, agents)  # <-- agent x task
+        self.available = availability_matrix(agents, self.num_days)  # <-- agent x day
+        required = np.array([requirements.get(task, 1) for task in tasks], dtype=np.int64)
+        self.required = schedule_matrix(tasks, task_schedules, self.num_days) * required[:, None]  # <-- task x day
+
+        # Rygvagt weekends: the paired (saturday, sunday) days, and the (saturday, monday) days of the Monday leave
+        self.ryg = tasks.index("Rygvagt") if "Rygvagt" in tasks else None
+        pairs, leaves = [], []
+        if self.ryg is not None:
+            scheduled = set(task_schedules["Rygvagt"])
+            _, weekend_info = rygvagt_mandatory_leave_info(self.num_days - 1, range(self.num_days), day_offset, dates)
+            for info in weekend_info:
+                if info["saturday"] in scheduled and info["sunday"] in scheduled:
+                    pairs.append((info["saturday"], info["sunday"]))
+                leaves += [(info["saturday"], monday) for monday in [info["monday_before"], info["monday_after"]] if monday is not None]
+        self.pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.leaves = np.array(leaves, dtype=np.int64).reshape(-1, 2)
+
+        # Rygvagt only matters on the weekend days and work only on the Mondays around them, each counted on a compact axis
+        self.weekend_days = np.union1d(self.pairs.ravel(), self.leaves[:, 0])
+        self.weekend_position = np.full(self.num_days, -1, dtype=np.int64)
+        self.weekend_position[self.weekend_days] = np.arange(len(self.weekend_days))
+        self.monday_days = np.unique(self.leaves[:, 1])
+        self.monday_position = np.full(self.num_days, -1, dtype=np.int64)
+        self.monday_position[self.monday_days] = np.arange(len(self.monday_days))
+
+    @staticmethod
+    def batch(agent: np.ndarray, task: np.ndarray, day: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        A schedule or a batch of schedules (see the class docstring) as an agent array of shape (schedules, assignments),
+        and task and day arrays of the same shape - or 1D, if the whole batch shares them.
+        """
+        agent = np.atleast_2d(agent)
+        if np.ndim(task) == 1 and np.ndim(day) == 1:
+            return agent, np.asarray(task), np.asarray(day)
+        return agent, np.broadcast_to(task, agent.shape), np.broadcast_to(day, agent.shape)
+
+    @staticmethod
+    def select(agent: np.ndarray, columns: np.ndarray, mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """The masked assignments, as flat arrays - or, if the whole batch shares the mask, as a selection of the columns."""
+        if mask.ndim == 1:
+            return agent[:, mask], columns[mask]
+        return agent, np.where(mask, columns, -1)
+
+    def count(
+        self, rows: np.ndarray, num_rows: int, columns: np.ndarray, num_columns: int | None = None, mask: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        :return: Integer array of shape (schedules, rows, columns), the number of assignments of each (row, column) in each schedule,
+        where the rows and columns are given per assignment (e.g. the agent index and the day).
+        """
+        size = len(rows)
+        num_columns = num_columns or self.num_days
+        flat = (np.arange(size)[:, None] * num_rows + rows) * num_columns + columns
+        if mask is not None:
+            flat = flat[np.broadcast_to(mask, flat.shape)]
+        return np.bincount(flat.ravel(), minlength=size * num_rows * num_columns).reshape(size, num_rows, num_columns)
+
+    def on_rygvagt(self, agent: np.ndarray, task: np.ndarray, day: np.ndarray) -> np.ndarray:
+        """:return: Boolean array of shape (schedules, agents, weekend days), True where the agent works Rygvagt that day."""
+        position = self.weekend_position[day]
+        agent, position = self.select(agent, position, (task == self.ryg) & (position >= 0))
+        return self.count(agent, self.num_agents, position, len(self.weekend_days), position >= 0) > 0
+
+    def works_monday(self, agent: np.ndarray, day: np.ndarray) -> np.ndarray:
+        """:return: Boolean array of shape (schedules, agents, Mondays), True where the agent works the Monday around a weekend."""
+        agent, position = self.select(agent, self.monday_position[day], self.monday_position[day] >= 0)
+        return self.count(agent, self.num_agents, position, len(self.monday_days), position >= 0) > 0
+
+    def weekend_violations(self, on_rygvagt: np.ndarray, works_monday: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param on_rygvagt: Boolean array of shape (schedules, agents, weekend days), see `on_rygvagt`.
+        :param works_monday: Boolean array of shape (schedules, agents, Mondays), see `works_monday`.
+
+        :return: Tuple of boolean arrays, (schedules, agents, pairs) True where the agent works only one day of the paired weekend,
+        and (schedules, agents, leaves) True where the agent works a Monday around their Rygvagt weekend.
+        """
+        saturdays, sundays = self.weekend_position[self.pairs[:, 0]], self.weekend_position[self.pairs[:, 1]]
+        unpaired = on_rygvagt[:, :, saturdays] != on_rygvagt[:, :, sundays]
+        on_leave = on_rygvagt[:, :, self.weekend_position[self.leaves[:, 0]]] & works_monday[:, :, self.monday_position[self.leaves[:, 1]]]
+        return unpaired, on_leave
+
+    def violation_counts(self, agent: np.ndarray, task: np.ndarray, day: np.ndarray, rules: list[str] | None = None) -> np.ndarray:
+        """
+        :param rules: (optional) The rules to check, e.g. only those an encoding can violate. Default is None (all `RULES`).
+
+        :return: Integer array of shape (schedules, rules), the number of violations of each rule (see `RULES`) in each schedule,
+        0 for the rules that aren't checked. A task-day with the wrong number of agents and a weekend with different agents count
+        as one violation each, as does every unqualified or unavailable assignment, every task beyond the first of an agent on a day,
+        and every Monday worked around a Rygvagt weekend.
+        """
+        rules = RULES if rules is None else rules
+        agent, task, day = self.batch(agent, task, day)
+        counts = np.zeros((len(agent), len(RULES)), dtype=np.int64)
+
+        if "qualifications" in rules:
+            counts[:, 0] = (~self.qualified[agent, task]).sum(axis=1)
+        if "days_off" in rules:
+            counts[:, 1] = (~self.available[agent, day]).sum(axis=1)
+        if "coverage" in rules:
+            coverage = self.count(np.atleast_2d(task), self.num_tasks, np.atleast_2d(day))  # <-- once, if the batch shares the tasks
+            counts[:, 2] = (coverage != self.required).sum(axis=(1, 2))
+
+        if "one_task_per_day" in rules:
+            agent_days = np.sort(agent * self.num_days + day, axis=1)  # <-- repeated (agent, day) pairs are adjacent
+            counts[:, 3] = (np.diff(agent_days, axis=1) == 0).sum(axis=1)
+        if self.ryg is not None and {"weekend_pairing", "monday_leave"} & set(rules):
+            unpaired, on_leave = self.weekend_violations(self.on_rygvagt(agent, task, day), self.works_monday(agent, day))
+            counts[:, 4] = unpaired.any(axis=1).sum(axis=1) if "weekend_pairing" in rules else 0
+            counts[:, 5] = on_leave.sum(axis=(1, 2)) if "monday_leave" in rules else 0
+
+        return counts
+
+    def violations(self, agent: np.ndarray, task: np.ndarray, day: np.ndarray) -> list[dict[str, int | str]]:
+        """
+        Locate the violations of a single schedule (1D arrays of its assignments).
+
+        :return: List of dictionaries with the 'Rule' (see `RULES`) and its location: 'Day' and, where it applies, 'Agent' and 'Task',
+        with the counts of coverage ('Assigned' against 'Required') and of one task per day ('Assigned').
+        """
+        agent, task, day = (np.asarray(array, dtype=np.int64) for array in (agent, task, day))
+        coverage = self.count(task[None, :], self.num_tasks, day[None, :])[0]
+        tasks_per_day = self.count(agent[None, :], self.num_agents, day[None, :])[0]
+
+        found = []
+        for indx in np.flatnonzero(~self.qualified[agent, task]).tolist():
+            found.append({"Rule": "qualifications", "Day": int(day[indx]), "Agent": self.names[agent[indx]], "Task": self.tasks[task[indx]]})
+        for indx in np.flatnonzero(~self.available[agent, day]).tolist():
+            found.append({"Rule": "days_off", "Day": int(day[indx]), "Agent": self.names[agent[indx]], "Task": self.tasks[task[indx]]})
+        for task_indx, day_indx in np.argwhere(coverage != self.required).tolist():
+            assigned, required = int(coverage[task_indx, day_indx]), int(self.required[task_indx, day_indx])
+            found.append({"Rule": "coverage", "Day": day_indx, "Task": self.tasks[task_indx], "Assigned": assigned, "Required": required})
+        for agent_indx, day_indx in np.argwhere(tasks_per_day > 1).tolist():
+            assigned = int(tasks_per_day[agent_indx, day_indx])
+            found.append({"Rule": "one_task_per_day", "Day": day_indx, "Agent": self.names[agent_indx], "Assigned": assigned})
+
+        if self.ryg is not None:
+            on_rygvagt = self.on_rygvagt(agent[None, :], task[None, :], day[None, :])
+            unpaired, on_leave = self.weekend_violations(on_rygvagt, self.works_monday(agent[None, :], day[None, :]))
+            for agent_indx, pair in np.argwhere(unpaired[0]).tolist():
+                saturday, sunday = self.pairs[pair].tolist()
+                worked = saturday if on_rygvagt[0, agent_indx, self.weekend_position[saturday]] else sunday
+                found.append({"Rule": "weekend_pairing", "Day": worked, "Agent": self.names[agent_indx], "Task": "Rygvagt"})
+            for agent_indx, leave in np.argwhere(on_leave[0]).tolist():
+                found.append({"Rule": "monday_leave", "Day": int(self.leaves[leave, 1]), "Agent": self.names[agent_indx]})
+
+        return sorted(found, key=lambda violation: (violation["Day"], RULES.index(violation["Rule"])))
+
+
+def schedule_from_sheet(
+    schedule_df: pd.DataFrame, tasks: list[str], task_schedules: dict[str, list[int]], agents: list[Agent]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The assignments of a schedule sheet: the 'Schedule' sheet of a results workbook (see `write_schedule_to_excel`), or a filled
+    'doctor_charts' sheet (dates as index, agents as columns, task names as cells). Cells that aren't tasks (e.g. days off) and
+    columns of unknown agents are skipped.
+
+    :return: Tuple of the agent index, task index and day arrays of the assignments.
+    """
+    scheduled = {task: set(task_schedules[task]) for task in tasks}
+    task_position = {task: indx for indx, task in enumerate(tasks)}
+    agent_position = {agent.name: indx for indx, agent in enumerate(agents)}
+
+    assignments = []
+    for name in [column for column in schedule_df.columns if column in agent_position]:
+        for day, cell in enumerate(schedule_df[name].tolist()):
+            task = resolve_task(cell, day, tasks, scheduled)
+            if task is not None:
+                assignments.append((agent_position[name], task_position[task], day))
+
+    agent, task, day = np.array(assignments, dtype=np.int64).reshape(-1, 3).T
+    return agent, task, day
+
+
+def validate_schedule_file(
+    path: str,
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    day_offset: int | None = None,
+    verbose: bool = True,
+    requirements: dict[str, int] | None = None,
+) -> list[dict[str, int | str]]:
+    """
+    Validate a results workbook (see `write_schedule_to_excel`), or a data-file with a filled 'doctor_charts' sheet,
+    against the parsed instance.
+
+    :param path: Path to the results workbook or the filled data-file.
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param day_offset: (optional) Day of the week of index 0 (0=Monday, ..., 6=Sunday). Default is None (from the sheet's dates).
+    :param verbose: (optional) If True, prints the violations. Default is True.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: The violations, see `ScheduleValidator.violations`.
+    """
+    with pd.ExcelFile(path) as excel:
+        is_results = "Schedule" in excel.sheet_names
+        schedule_df = None if is_results else excel.parse("doctor_charts", index_col=0)
+    if is_results:
+        schedule_df, _ = read_schedule_results(path)
+
+    dates = schedule_df.index if day_offset is None else None
+    validator = ScheduleValidator(tasks, task_schedules, agents, day_offset or 0, requirements, dates)
+    violations = validator.violations(*schedule_from_sheet(schedule_df, tasks, task_schedules, agents))
+
+    if verbose:
+        print(f"{path}: {len(violations)} violations")
+        for violation in violations:
+            print("  " + ", ".join(f"{key}: {value}" for key, value in violation.items()))
+
+    return violations
@@ -1,11 +1,170 @@
+import time
+from collections.abc import Callable
+
+import pandas as pd
 from ortools.sat.python import cp_model
 
 from app.data_structures.agent import Agent
-from app.utils.engine_utils import rygvagt_mandatory_leave_info
+from app.data_structures.workbook import ScheduleWorkbook
+from app.utils.matching_engine import matching_scheduling
+from app.utils.presolve import presolve_forced_assignments
+from app.utils.schedule_preprocess import read_requirements
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solution_callbacks import IncumbentCallback, TrajectoryCallback
+from app.utils.solve_cache import SolveCache, instance_hashes
+from app.utils.telemetry import SolveLog, solve_record
+
+
+def solve_back_model(
+    back_model: BackSchedulingModel,
+    max_time_in_seconds: float = 300.0,
+    solution_callback: cp_model.CpSolverSolutionCallback | None = None,
+    bound_callback: Callable[[float], None] | None = None,
+) -> tuple[int, cp_model.CpSolver]:
+    """
+    Solve an already built model of the 'back' (ryg) sector.
+
+    :param back_model: The built model.
+    :param max_time_in_seconds: (optional) Time limit for the solver. Default is 300 seconds.
+    :param solution_callback: (optional) Callback invoked on every improving solution. Default is None.
+    :param bound_callback: (optional) Called with every improving objective bound. Default is None.
+
+    :return: Tuple of the solver status and the solver (to read the solution from).
+    """
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    if bound_callback is not None:
+        solver.best_bound_callback = bound_callback
+    status = solver.Solve(back_model.model, solution_callback)
+
+    return status, solver
+
+
+def minimal_conflict(back_model: BackSchedulingModel, keys: list[tuple], max_time_in_seconds: float = 10.0) -> list[tuple] | None:
+    """
+    Find a minimal subset of the guarded constraints (by their keys in `back_model.guards`) that cannot be satisfied together.
+
+    The solver's sufficient assumptions give a first (not necessarily minimal) conflict, which is then shrunk by
+    deletion: each key is dropped in turn, and kept out if the rest is still infeasible.
+    NOTE: A check that times out counts the key as necessary, so the result is only minimal if no check times out.
+
+    :param back_model: A model built in diagnose mode.
+    :param keys: The keys of the guards to assume.
+    :param max_time_in_seconds: (optional) Time limit for each feasibility check. Default is 10 seconds.
+
+    :return: The keys of a minimal conflict, or None if the assumptions are satisfiable.
+    """
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    solver.parameters.cp_model_presolve = False  # <-- Presolve dominates the (many, small) feasibility checks
+    solver.parameters.num_workers = 1  # <-- Deterministic conflicts
+
+    def conflict(candidate: list[tuple]) -> list[tuple] | None:
+        back_model.model.ClearAssumptions()
+        back_model.model.AddAssumptions([back_model.guards[key] for key in candidate])
+        if solver.Solve(back_model.model) != cp_model.INFEASIBLE:
+            return None
+        sufficient = set(solver.SufficientAssumptionsForInfeasibility())
+        return [key for key in candidate if back_model.guards[key].Index() in sufficient]
+
+    core = conflict(keys)
+    if core is None:
+        return None
+
+    indx = 0
+    while indx < len(core):
+        smaller = conflict(core[:indx] + core[indx + 1 :])
+        if smaller is None:
+            indx += 1  # <-- `core[indx]` is necessary
+        else:
+            core = [key for key in core if key in smaller]  # <-- keeps the order, such that `indx` stays valid
+            indx = min(indx, len(core))
+
+    back_model.model.ClearAssumptions()
+    return core
+
+
+def diagnose_infeasibility(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    max_time_in_seconds: float = 10.0,
+    verbose: bool = True,
+    dates: pd.Index | None = None,
+    requirements: dict[str, int] | None = None,
+) -> list[dict[str, str | int]] | None:
+    """
+    Explain why the 'back' (ryg) scheduling problem is infeasible.
+
+    Every constraint family (qualifications, days off, coverage, one task per day, weekend Rygvagt pairing and Monday leave) and
+    every agent's day-off set is guarded by an assumption literal, and a minimal conflicting subset is extracted. The days off
+    and coverage in that subset are then refined into the single days (and tasks) that conflict.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param max_time_in_seconds: (optional) Time limit for each feasibility check. Default is 10 seconds.
+    :param verbose: (optional) If True, prints the conflict. Default is True.
+    :param dates: (optional) The date of each day (e.g. `ScheduleWorkbook.dates`), for the weekends. Default is None.
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (those of the ryg sector, `TASKS_REQUIRING_MULTIPLE_AGENTS`).
+
+    :return: The conflicting constraints as dictionaries with the key 'constraint' (and 'agent', 'task', 'day' where relevant),
+    or None if the problem is feasible.
+    """
+    # Families and each agent's set of days off
+    back_model = BackSchedulingModel(tasks, task_schedules, agents, diagnose=True, dates=dates, requirements=requirements).build()
+    core = minimal_conflict(back_model, list(back_model.guards), max_time_in_seconds)
+    if core is None:
+        if verbose:
+            print("The problem is feasible, there is no conflict to diagnose.")
+        return None
+
+    # Refine days off and coverage into single days
+    refined_model = BackSchedulingModel(
+        tasks, task_schedules, agents, diagnose=True, refine=True, dates=dates, requirements=requirements
+    ).build()
+    keys = [key for key in refined_model.guards if key[:2] in core or key[:1] in core]
+    core = minimal_conflict(refined_model, keys, max_time_in_seconds) or core
+
+    conflicts = []
+    for key in core:
+        match key:
+            case ("days_off", agent, day):
+                conflicts.append({"constraint": "days_off", "agent": agent, "day": day})
+            case ("days_off", agent):
+                conflicts.append({"constraint": "days_off", "agent": agent})
+            case ("coverage", task, day):
+                conflicts.append({"constraint": "coverage", "task": task, "day": day})
+            case _:
+                conflicts.append({"constraint": key[0]})
+
+    if verbose:
+        print("Minimal set of conflicting constraints:")
+        for conflict in conflicts:
+            print("  " + ", ".join(f"{key}: {value}" for key, value in conflict.items()))
+
+    return conflicts
 
 
 def back_scheduling(
-    tasks: list[str], task_schedules: dict[str, list[int]], agents: list[Agent]
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    sparse: bool = True,
+    on_incumbent: Callable[[dict], bool | None] | None = None,
+    incumbent_path: str | None = None,
+    data: str | ScheduleWorkbook | None = None,
+    diagnose: bool = False,
+    presolve: bool = True,
+    preference_hints: bool = True,
+    preference_weight: int = 0,
+    cache_dir: str | None = None,
+    telemetry_path: str | None = None,
+    dates: pd.Index | None = None,
+    disabled_families: list[str] | None = None,
+    requirements: dict[str, int] | None = None,
+    max_time_in_seconds: float = 300.0,
 ) -> tuple[list[dict[str, int | str]], dict[str, int]] | None:
     """
     Engine for scheduling the 'back' (ryg) sector.
@@ -13,115 +172,124 @@ def back_scheduling(
     :param tasks: List of task names
     :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
     :param agents: List of Agent objects
+    :param sparse: (optional) If True, only creates decision variables for eligible (qualified, available, scheduled-day)
+    triples. If False, builds the dense agent x task x day model. Default is True.
+    :param on_incumbent: (optional) Called with every improving solution (objective, bound, elapsed time and assignments)
+    as soon as it is found. Returning True stops the search, e.g. when the gap is acceptable. Default is None.
+    :param incumbent_path: (optional) If given, every improving solution is written to this (rolling) Excel file. Default is None.
+    :param data: (optional) The data-file or parsed workbook, required for writing incumbents. Default is None.
+    :param diagnose: (optional) If True and the problem is infeasible, prints a minimal set of conflicting constraints. Default is False.
+    :param presolve: (optional) If True (and sparse), fixes forced assignments and drops dominated variables before the model
+    is built, see `presolve_forced_assignments`. Default is True.
+    :param preference_hints: (optional) If True, the solver starts from the rolling chart's 'Rygvagt' preferences, completed into
+    a schedule by `matching_scheduling`. Default is True.
+    :param preference_weight: (optional) Weight of the satisfied preferences next to the fairness objective, see
+    `BackSchedulingModel`. Default is 0 (fairness only).
+    :param cache_dir: (optional) If given, results are cached there (see `SolveCache`): an unchanged instance returns the cached
+    result without solving, and the result of a similar instance (same tasks and agents) is followed by the hint. Default is None.
+    :param telemetry_path: (optional) If given, the metrics of the solve (model size and build time per constraint family, presolve,
+    solver statistics, objective and bound trajectories) are appended to this log, see `solve_record` and `compare_log`.
+    Default is None.
+    :param dates: (optional) The date of each day, for the weekends (see `rygvagt_mandatory_leave_info`). Default is None
+    (the dates of `data`, if given as a parsed workbook, and otherwise a horizon that starts on a Wednesday).
+    :param disabled_families: (optional) Constraint families to leave out of the model, by name (see `CONSTRAINT_FAMILIES`).
+    Default is None (every family the model needs).
+    :param requirements: (optional) The number of agents each task requires (see `read_requirements`). Default is None
+    (the 'requirements' sheet of `data`, if given as a parsed workbook, and otherwise those of the ryg sector).
+    :param max_time_in_seconds: (optional) Time limit for the solver. Default is 300 seconds.
 
     :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each),
     or None if no feasible solution is found.
     """
-    num_tasks = len(tasks)
-
-    num_days = 0
-    for task in tasks:
-        # Finding the task with the most days - equals `num_days` or "scheduling horizon"
-        num_days = max(num_days, max(task_schedules[task]))
-
-    all_days = range(num_days + 1)  # <-- +1, because task_schedule is 0-indexed
-    print(num_days)
-
-    day_of_week, weekend_info = rygvagt_mandatory_leave_info(num_days, all_days)
-
-    # Tasks that require multiple agents
-    # NOTE: This design is manual (NOT GOOD!)
-    tasks_requiring_multiple_agents = {"O-OP": 2, "O-OP (tirsdag)": 2}
-
-    model = cp_model.CpModel()
-
-    # Decision variables
-    x = {}
-    for agent in agents:
-        for task in tasks:
-            for day in all_days:
-                x[(agent.name, task, day)] = model.NewBoolVar(f"x_{agent.name}_{task}_{day}")
-
-    # Agents can only be assigned to qualified tasks
-    for agent in agents:
-        for task in tasks:
-            if not agent.qualified(task):
-                for day in all_days:
-                    model.Add(x[(agent.name, task, day)] == 0)
-
-    # Agents cannot be assigned on unavailable days
-    for agent in agents:
-        for day in agent.days_off:
-            for task in tasks:
-                model.Add(x[(agent.name, task, day)] == 0)
-
-    # Each task must be performed on its scheduled days
-    for task in tasks:
-        for day in task_schedules[task]:
-            if task in tasks_requiring_multiple_agents:
-                num_agents_required = tasks_requiring_multiple_agents[task]
-                model.Add(sum(x[(agent.name, task, day)] for agent in agents if agent.qualified(task)) == num_agents_required)
-            else:
-                model.AddExactlyOne(x[(agent.name, task, day)] for agent in agents if agent.qualified(task))
-
-    # Agents can perform at most one task per day
-    for agent in agents:
-        for day in all_days:
-            model.AddAtMostOne(x[(agent.name, task, day)] for task in tasks)
-
-    # Weekend constraints
-    for info in weekend_info:
-        saturday = info["saturday"]
-        sunday = info["sunday"]
-        monday_before = info["monday_before"]
-        monday_after = info["monday_after"]
-
-        # Enforce the same agent works Rygvagt on both days
-        for agent in agents:
-            model.Add(x[(agent.name, "Rygvagt", saturday)] == x[(agent.name, "Rygvagt", sunday)])
-
-        # Ensure exactly one agent is assigned to Rygvagt on Saturday
-        model.AddExactlyOne(x[(agent.name, "Rygvagt", saturday)] for agent in agents if agent.qualified("Rygvagt"))
-
-        # Agents working the weekend must have corresponding Mondays off
-        for agent in agents:
-            works_weekend = x[(agent.name, "Rygvagt", saturday)]
-            if monday_before is not None:
-                model.Add(sum(x[(agent.name, task, monday_before)] for task in tasks) == 0).OnlyEnforceIf(works_weekend)
-            if monday_after is not None:
-                model.Add(sum(x[(agent.name, task, monday_after)] for task in tasks) == 0).OnlyEnforceIf(works_weekend)
-
-    # Compute total assignments per agent
-    total_assignments = {}
-    for agent in agents:
-        total_assignments[agent.name] = model.NewIntVar(0, num_days * num_tasks, f"total_assignments_{agent.name}")
-        model.Add(total_assignments[agent.name] == sum(x[(agent.name, task, day)] for task in tasks for day in all_days))
-
-    # Minimize the maximum assignments
-    max_assignments = model.NewIntVar(0, num_days * num_tasks, "max_assignments")
-    model.AddMaxEquality(max_assignments, [total_assignments[agent.name] for agent in agents])
-
-    model.Minimize(max_assignments)
-
-    # Solve the model
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 300.0  # Optional time limit
-    status = solver.Solve(model)
+    if dates is None and isinstance(data, ScheduleWorkbook):
+        dates = data.dates
+    if requirements is None and isinstance(data, ScheduleWorkbook):
+        requirements = read_requirements(data)
 
-    # Initialize a list to store the assignments
-    assignments = []
+    parameters = {"sparse": sparse, "presolve": presolve, "preference_weight": preference_weight, "max_time": max_time_in_seconds}
+    if disabled_families:
+        parameters["disabled_families"] = sorted(disabled_families)
+    if requirements:
+        parameters["requirements"] = dict(sorted(requirements.items()))
+    cache, near_miss = None, None
+    if cache_dir is not None:
+        key, family = instance_hashes(tasks, task_schedules, agents, parameters, dates)
+        cache = SolveCache(cache_dir)
+        cached = cache.get(key, family)
+        if cached is not None:
+            print(f"Cached result ({cached['status']}, objective {cached['objective']:g}) from {cache.path(key, family)}")
+            return cached["assignments"], cached["agent_assignments"]
+        near_miss = cache.near_miss(key, family)
 
-    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        for day in all_days:
-            for task in tasks:
-                if day in task_schedules[task]:
-                    assigned_agents = [agent.name for agent in agents if solver.Value(x[(agent.name, task, day)]) == 1]
-                    for agent_name in assigned_agents:
-                        assignments.append({"Day": day, "Task": task, "Agent": agent_name})
-        # Optionally, collect total assignments per agent
-        agent_assignments = {agent.name: solver.Value(total_assignments[agent.name]) for agent in agents}
+    eligibility, fixed, report = None, None, None
+    if sparse and presolve:
+        eligibility, fixed, report = presolve_forced_assignments(tasks, task_schedules, agents, dates=dates, requirements=requirements)
+        if report["infeasible"]:
+            print("No feasible solution found.")
+            if diagnose:
+                diagnose_infeasibility(tasks, task_schedules, agents, dates=dates, requirements=requirements)
+            return  # <-- Obviously infeasible, no need to build (let alone solve) the model
+
+    start = time.perf_counter()
+    back_model = BackSchedulingModel(
+        tasks,
+        task_schedules,
+        agents,
+        sparse=sparse,
+        eligibility=eligibility,
+        fixed=fixed,
+        preference_weight=preference_weight,
+        dates=dates,
+        requirements=requirements,
+        disabled_families=disabled_families,
+    ).build()
+    build_seconds = time.perf_counter() - start
+    if preference_hints or near_miss is not None:
+        # The rolling chart (or the result of a similar instance), completed into a schedule:
+        # a complete hint is a first solution before the search even starts
+        follow = None if near_miss is None else [(row["Agent"], row["Task"], row["Day"]) for row in near_miss["assignments"]]
+        draft = matching_scheduling(
+            tasks,
+            task_schedules,
+            agents,
+            follow_rolling_chart=preference_hints,
+            follow=follow,
+            verbose=False,
+            dates=dates,
+            requirements=requirements,
+        )
+        if draft is not None:
+            back_model.add_hints([(assignment["Agent"], assignment["Task"], assignment["Day"]) for assignment in draft[0]], complete=True)
+        elif preference_hints:
+            back_model.add_preference_hints()
 
+    # Solve the model, streaming incumbents if anybody is listening
+    callback, bound_callback, bounds = None, None, []
+    if on_incumbent is not None or incumbent_path is not None:
+        callback = IncumbentCallback(back_model, on_incumbent, incumbent_path, data)
+    if telemetry_path is not None:
+        callback = callback or TrajectoryCallback()
+        start = time.perf_counter()
+
+        def bound_callback(bound: float) -> None:
+            bounds.append((time.perf_counter() - start, bound))
+
+    status, solver = solve_back_model(back_model, max_time_in_seconds, solution_callback=callback, bound_callback=bound_callback)
+
+    if telemetry_path is not None:
+        instance = instance_hashes(tasks, task_schedules, agents, dates=dates)
+        parameters = parameters | {"preference_hints": preference_hints}
+        record = solve_record(back_model, solver, status, instance, parameters, build_seconds, callback.incumbents, bounds, report)
+        SolveLog(telemetry_path).append(record)
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        assignments, agent_assignments = back_model.extract_solution(solver)
+        if cache is not None:
+            entry = {"status": solver.StatusName(status), "objective": solver.ObjectiveValue(), "assignments": assignments}
+            cache.put(key, family, entry | {"agent_assignments": agent_assignments})
         return assignments, agent_assignments
     else:
         print("No feasible solution found.")
+        if diagnose and status in [cp_model.INFEASIBLE, cp_model.UNKNOWN]:
+            diagnose_infeasibility(tasks, task_schedules, agents, dates=dates, requirements=requirements)
         return  # Exit the function if no solution is found
@@ -0,0 +1,308 @@
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from ortools.sat.python import cp_model
+
+from app.data_structures.agent import Agent
+from app.utils.constraint_families import CONSTRAINT_FAMILIES
+from app.utils.engine_utils import (
+    availability_matrix,
+    equivalent_agents,
+    preference_matrix,
+    qualification_matrix,
+    rygvagt_mandatory_leave_info,
+    schedule_matrix,
+)
+from app.utils.solution_format import ColumnarSolution, variable_values
+
+# Tasks that require multiple agents in the 'back' (ryg) sector - the default when the data-file has no 'requirements' sheet
+# (see `read_requirements`)
+TASKS_REQUIRING_MULTIPLE_AGENTS = {"O-OP": 2, "O-OP (tirsdag)": 2}
+
+
+class BackSchedulingModel:
+    """
+    CP-SAT model of the 'back' (ryg) scheduling problem.
+
+    In sparse mode, decision variables are only created for eligible (agent, task, day) triples, i.e. the agent is qualified
+    for the task, available on the day, and the task is scheduled on the day. Every constraint family is built from that index,
+    so qualifications and days off never have to be stated as constraints.
+    In dense mode, a variable is created for every agent x task x day and ineligible ones are forced to zero (the original model).
+
+    In diagnose mode (sparse semantics), variables are created for every scheduled (agent, task, day), and every constraint family
+    is guarded by an assumption literal (see `guards`), such that the solver can point out which families conflict.
+    The days off are guarded per agent, and with `refine` the days off and coverage are guarded per day.
+
+    A presolved (reduced) `eligibility` and the `fixed` (agent index, task index, day) triples of the presolve
+    (see `presolve_forced_assignments`) can be passed to the sparse model. `carried_assignments` (per agent name) are added
+    to the totals of the fairness objective, for scheduling a period that continues a previous one.
+
+    The rolling chart's 'Rygvagt' preferences (`Agent.task_preferences`) can be hinted (see `add_preference_hints`), and with a
+    `preference_weight` they are rewarded in the objective: `(P + 1) * max_assignments - preference_weight * satisfied`, with P the
+    number of preferences the model can satisfy at all. A weight of 1 only breaks the ties of the fairness objective, larger weights
+    trade fairness for preferences (P + 1 weighted satisfied preferences are worth one more assignment of the busiest agent).
+
+    The number of agents each task requires is given by `requirements` (see `read_requirements`), by default those of the ryg sector.
+    Several sectors can be built into one `model` (see `MultiSectorModel`).
+
+    The constraint families and the objective are registered in `CONSTRAINT_FAMILIES` (see `constraint_family`), each with the
+    inputs it needs: a family whose inputs are empty (e.g. the weekend rules of a sector without Rygvagt) is skipped, and
+    `disabled_families` are skipped by name. The size and build time of every family are recorded in `build_stats`.
+    The weekends come from the real `dates` of the days (e.g. `ScheduleWorkbook.dates`), or else from `day_offset`.
+    """
+
+    def __init__(
+        self,
+        tasks: list[str],
+        task_schedules: dict[str, list[int]],
+        agents: list[Agent],
+        sparse: bool = True,
+        diagnose: bool = False,
+        refine: bool = False,
+        symmetry_breaking: bool = True,
+        eligibility: np.ndarray | None = None,
+        fixed: list[tuple[int, int, int]] | None = None,
+        carried_assignments: dict[str, int] | None = None,
+        day_offset: int = 2,
+        preference_weight: int = 0,
+        requirements: dict[str, int] | None = None,
+        model: cp_model.CpModel | None = None,
+        dates: pd.Index | None = None,
+        disabled_families: list[str] | None = None,
+    ) -> None:
+        self.tasks = tasks
+        self.task_schedules = task_schedules
+        self.agents = agents
+        self.sparse = sparse or diagnose
+        self.diagnose = diagnose
+        self.refine = refine
+        self.symmetry_breaking = symmetry_breaking
+        self.preference_weight = preference_weight
+        requirements = requirements or TASKS_REQUIRING_MULTIPLE_AGENTS
+        self.requirements = {task: requirements.get(task, 1) for task in tasks}
+
+        self.num_tasks = len(tasks)
+        self.num_days = 0
+        for task in tasks:
+            # Finding the task with the most days - equals `num_days` or "scheduling horizon"
+            self.num_days = max(self.num_days, max(task_schedules[task]))
+
+        self.all_days = range(self.num_days + 1)  # <-- +1, because task_schedule is 0-indexed
+        self.dates = dates
+        self.day_of_week, self.weekend_info = rygvagt_mandatory_leave_info(self.num_days, self.all_days, day_offset, dates)
+        if "Rygvagt" not in tasks:
+            self.weekend_info = []  # <-- a sector without weekend duty
+
+        self.agent_position = {agent.name: indx for indx, agent in enumerate(agents)}
+        self.task_position = {task: indx for indx, task in enumerate(tasks)}
+        self.qualified = qualification_matrix(tasks, agents)  # <-- agent x task
+        self.available = availability_matrix(agents, len(self.all_days))  # <-- agent x day
+        self.scheduled = schedule_matrix(tasks, task_schedules, len(self.all_days))  # <-- task x day
+        self.preferred = preference_matrix(agents, len(self.all_days))  # <-- agent x day, the rolling chart's 'Rygvagt'
+        self.eligibility = self.qualified[:, :, None] & self.available[:, None, :] & self.scheduled[None, :, :]  # <-- agent x task x day
+        if eligibility is not None:
+            self.eligibility = eligibility
+        self.fixed = fixed or []
+        carried_assignments = carried_assignments or {}
+        self.carried = np.array([carried_assignments.get(agent.name, 0) for agent in agents], dtype=np.int64)
+
+        self.model = model if model is not None else cp_model.CpModel()
+
+        # Decision variables and the index every constraint family is built from
+        self.x = {}  # <-- (agent name, task, day) to BoolVar
+        self.by_agent = defaultdict(list)  # <-- agent name to BoolVars
+        self.by_agent_day = defaultdict(list)  # <-- (agent name, day) to BoolVars
+        self.by_task_day = defaultdict(list)  # <-- (task, day) to BoolVars
+
+        self.total_assignments = {}
+        self.max_assignments = None
+        self.satisfied_preferences = None
+        self.lower_bound = 0  # <-- on `max_assignments`, see `add_fairness_objective`
+
+        self.guards = {}  # <-- (family, ...) to assumption literal, only in diagnose mode
+        self.triples = np.zeros((0, 3), dtype=np.int64)
+        self.value_indices = None  # <-- of the decision variables and the totals, see `extract_columnar`
+        self.disabled_families = set(disabled_families or [])
+        unknown = self.disabled_families - set(CONSTRAINT_FAMILIES)
+        if unknown:
+            raise ValueError(f"Unknown constraint families {sorted(unknown)}, expected some of {list(CONSTRAINT_FAMILIES)}")
+        self.build_stats = {}  # <-- family to its size and build time, see `profile`
+
+    def build(self) -> "BackSchedulingModel":
+        """
+        Create the decision variables, then add every registered constraint family (and the objective) the model needs.
+
+        :return: The model itself, such that `BackSchedulingModel(...).build()` can be chained.
+        """
+        self.profile("variables", self.add_variables)
+        for family in CONSTRAINT_FAMILIES.values():
+            # NOTE: Checked when the family's turn comes, as a family's inputs may be built by an earlier one (e.g. the totals)
+            if family.name not in self.disabled_families and family.is_needed(self):
+                self.profile(family.name, partial(family.add, self))
+
+        return self
+
+    def profile(self, family: str, add: Callable[[], None]) -> None:
+        """
+        Add a part of the model, recording its size (the variables and constraints it added) and build time in `build_stats`.
+        """
+        proto = self.model.Proto()
+        num_variables, num_constraints = len(proto.variables), len(proto.constraints)
+        start = time.perf_counter()
+        add()
+        self.build_stats[family] = {
+            "variables": len(proto.variables) - num_variables,
+            "constraints": len(proto.constraints) - num_constraints,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def guard(self, constraint: cp_model.Constraint, *key: str | int) -> cp_model.Constraint:
+        """
+        In diagnose mode, only enforce the constraint if the assumption literal of `key` (family, ...) holds.
+        """
+        if self.diagnose:
+            if key not in self.guards:
+                self.guards[key] = self.model.NewBoolVar(f"assume_{'_'.join(map(str, key))}")
+            constraint.OnlyEnforceIf(self.guards[key])
+
+        return constraint
+
+    def add_variables(self) -> None:
+        if self.diagnose:
+            triples = np.argwhere(np.broadcast_to(self.scheduled[None, :, :], self.eligibility.shape))
+            qualified = np.ones(self.eligibility.shape[:2], dtype=bool)  # <-- Qualifications are (guarded) constraints
+        elif self.sparse:
+            triples = np.argwhere(self.eligibility)
+            qualified = np.ones(self.eligibility.shape[:2], dtype=bool)  # <-- Every variable is eligible, hence qualified
+        else:
+            triples = np.argwhere(np.ones_like(self.eligibility))
+            qualified = self.qualified
+
+        names = [agent.name for agent in self.agents]
+        self.triples = triples  # <-- (agent index, task index, day) of each variable, in the order of `x`
+
+        for agent_indx, task_indx, day in triples.tolist():
+            name = names[agent_indx]
+            task = self.tasks[task_indx]
+
+            var = self.model.NewBoolVar(f"x_{name}_{task}_{day}")
+            self.x[(name, task, day)] = var
+            self.by_agent[name].append(var)
+            self.by_agent_day[(name, day)].append(var)
+            if qualified[agent_indx, task_indx]:  # <-- The dense coverage constraints only sum over qualified agents
+                self.by_task_day[(task, day)].append(var)
+
+    def capacities(self) -> np.ndarray:
+        """
+        Upper bound on the total assignments of each agent: one task per day, on the days the agent has a variable at all.
+        """
+        if not self.sparse:
+            return np.full(len(self.agents), len(self.all_days))
+        has_variable = np.zeros((len(self.agents), len(self.all_days)), dtype=bool)
+        for name, day in self.by_agent_day:
+            has_variable[self.agent_position[name], day] = True
+        return has_variable.sum(axis=1)
+
+    def coverage_demand(self) -> int:
+        return sum(self.requirements[task] * len(self.task_schedules[task]) for task in self.tasks)
+
+    def preferred_variables(self) -> list[cp_model.IntVar]:
+        """The 'Rygvagt' variables of the rolling chart's preferences (those the model has, i.e. eligible ones)."""
+        preferred = []
+        for agent_indx, day in np.argwhere(self.preferred).tolist():
+            var = self.x.get((self.agents[agent_indx].name, "Rygvagt", day))
+            if var is not None:
+                preferred.append(var)
+        return preferred
+
+    def symmetry_key(self, agent_indx: int) -> bytes:
+        """Agents with the same key are interchangeable in the model."""
+        key = self.qualified[agent_indx].tobytes() + self.available[agent_indx].tobytes() + self.eligibility[agent_indx].tobytes()
+        key += self.carried[agent_indx].tobytes()
+        if self.preference_weight > 0:
+            key += self.preferred[agent_indx].tobytes()  # <-- Agents with different preferences are no longer interchangeable
+        return key
+
+    def add_hints(self, assignments: list[tuple[str, str, int]], complete: bool = False) -> int:
+        """
+        Hint the solver towards the given (agent name, task, day) assignments, e.g. a previous or cached solution.
+
+        A `complete` schedule hints every variable (the totals and the objective included), which the solver checks at once.
+        Only a complete and feasible hint is a solution from the start - a partial hint is merely a search direction.
+        Interchangeable agents swap schedules, such that the hint respects the symmetry breaking (see `add_symmetry_breaking_constraints`).
+
+        :return: Number of hints that match a variable of the model.
+        """
+        hinted = {key for key in assignments if key in self.x}
+        if not complete:
+            for key in hinted:
+                self.model.AddHint(self.x[key], 1)
+            return len(hinted)
+
+        totals = self.carried.copy()
+        for name, _, _ in hinted:
+            totals[self.agent_position[name]] += 1
+        if "symmetry_breaking" in self.build_stats:
+            rename = {}
+            for indices in equivalent_agents([self.symmetry_key(indx) for indx in range(len(self.agents))]):
+                ordered = sorted(indices, key=lambda indx: -totals[indx])  # <-- the busiest first, as the constraints order them
+                rename |= {self.agents[old].name: self.agents[new].name for new, old in zip(indices, ordered, strict=True)}
+                totals[indices] = totals[ordered]
+            hinted = {(rename.get(name, name), task, day) for name, task, day in hinted}
+
+        for key, var in self.x.items():
+            self.model.AddHint(var, int(key in hinted))
+        if self.total_assignments:
+            for agent, total in zip(self.agents, totals.tolist(), strict=True):
+                self.model.AddHint(self.total_assignments[agent.name], total)
+            self.model.AddHint(self.max_assignments, int(totals.max(initial=0)))
+        if self.satisfied_preferences is not None:
+            preferred = {var.Index() for var in self.preferred_variables()}
+            self.model.AddHint(self.satisfied_preferences, sum(self.x[key].Index() in preferred for key in hinted))
+
+        return len(hinted)
+
+    def add_preference_hints(self) -> int:
+        """
+        Hint the solver towards the rolling chart's 'Rygvagt' preferences (a partial hint, see `add_hints`).
+        The engines rather complete the rolling chart into a schedule first, see `matching_scheduling(follow_rolling_chart=True)`.
+
+        :return: Number of hinted preferences (those the model has a variable for).
+        """
+        names = [agent.name for agent in self.agents]
+        return self.add_hints([(names[agent_indx], "Rygvagt", day) for agent_indx, day in np.argwhere(self.preferred).tolist()])
+
+    def extract_columnar(self, solver: cp_model.CpSolver | cp_model.CpSolverSolutionCallback) -> ColumnarSolution:
+        """
+        Read the assignments of a solved model in bulk (see `variable_values`).
+
+        :param solver: The solver that solved `self.model` (or a solution callback, during the solve).
+
+        :return: The solution as columns of day, task index and agent index (in the order of `tasks` and `agents`).
+        """
+        variables = list(self.x.values()) + [self.total_assignments[agent.name] for agent in self.agents]
+        if self.value_indices is None:
+            self.value_indices = np.array([var.Index() for var in variables], dtype=np.int64)
+        values = variable_values(solver, variables, self.value_indices)
+        agent, task, day = self.triples.T
+        assigned = (values[: len(self.x)] == 1) & self.scheduled[task, day]  # <-- the dense model has variables on unscheduled days
+
+        names = [agent.name for agent in self.agents]
+        return ColumnarSolution(day[assigned], task[assigned], agent[assigned], self.tasks, names, values[len(self.x) :])
+
+    def extract_solution(
+        self, solver: cp_model.CpSolver | cp_model.CpSolverSolutionCallback
+    ) -> tuple[list[dict[str, int | str]], dict[str, int]]:
+        """
+        Read the assignments of a solved model.
+
+        :param solver: The solver that solved `self.model` (or a solution callback, during the solve).
+
+        :return: Tuple of assignments (agent assigned to task on given day) and agent assignments (total assignments for each).
+        """
+        solution = self.extract_columnar(solver)
+        return solution.assignments(), solution.agent_assignments()
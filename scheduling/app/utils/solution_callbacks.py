@@ -0,0 +1,75 @@
+import os
+from collections.abc import Callable
+
+from ortools.sat.python import cp_model
+
+from app.data_structures.workbook import ScheduleWorkbook
+from app.utils.os_structure import write_schedule_to_excel
+from app.utils.scheduling_model import BackSchedulingModel
+
+
+class TrajectoryCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Records the trajectory of the search: (elapsed, objective, bound) of every improving solution, without reading the solutions.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.incumbents = []  # <-- trajectory of (elapsed, objective, bound)
+
+    def on_solution_callback(self) -> None:
+        self.incumbents.append((self.WallTime(), self.ObjectiveValue(), self.BestObjectiveBound()))
+
+
+class IncumbentCallback(TrajectoryCallback):
+    """
+    Emits every improving solution (incumbent) of a `BackSchedulingModel` while the solver is still running.
+
+    Each incumbent is a dictionary with the keys 'objective', 'bound', 'elapsed', 'assignments' and 'agent_assignments'.
+    It is passed to `on_incumbent` (which may return True to stop the search, e.g. when the gap is acceptable)
+    and can be written through `write_schedule_to_excel` to a rolling output file, which always holds the best schedule so far.
+    """
+
+    def __init__(
+        self,
+        back_model: BackSchedulingModel,
+        on_incumbent: Callable[[dict], bool | None] | None = None,
+        incumbent_path: str | None = None,
+        data: str | ScheduleWorkbook | None = None,
+        verbose: bool = True,
+    ) -> None:
+        super().__init__()
+        assert incumbent_path is None or data is not None, "Writing incumbents requires the data-file (or parsed workbook)"
+
+        self.back_model = back_model
+        self.on_incumbent = on_incumbent
+        self.incumbent_path = incumbent_path
+        self.verbose = verbose
+        self.best = None
+
+        # Parse the workbook once, not on every incumbent
+        self.workbook = ScheduleWorkbook(data) if isinstance(data, str) else data
+
+    def on_solution_callback(self) -> None:
+        assignments, agent_assignments = self.back_model.extract_solution(self)
+        self.best = {
+            "objective": self.ObjectiveValue(),
+            "bound": self.BestObjectiveBound(),
+            "elapsed": self.WallTime(),
+            "assignments": assignments,
+            "agent_assignments": agent_assignments,
+        }
+        self.incumbents.append((self.best["elapsed"], self.best["objective"], self.best["bound"]))
+
+        if self.verbose:
+            objective, bound, elapsed = self.best["objective"], self.best["bound"], self.best["elapsed"]
+            print(f"Incumbent {len(self.incumbents)}: objective {objective:g}, bound {bound:g}, {elapsed:.2f} s")
+
+        if self.incumbent_path is not None:
+            # Write to a temporary file first, such that the rolling output is never a half-written workbook
+            tmp_path = f"{self.incumbent_path}.tmp.xlsx"
+            write_schedule_to_excel(tmp_path, self.workbook, assignments, agent_assignments, verbose=False)
+            os.replace(tmp_path, self.incumbent_path)
+
+        if self.on_incumbent is not None and self.on_incumbent(self.best):
+            self.StopSearch()
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def variable_values(solver: object, variables: list, indices: np.ndarray | None = None) -> np.ndarray:
+    """
+    The values of CP-SAT variables in bulk, read from the response of the solver (or of a solution callback, during the solve).
+    Solvers without a CP-SAT response (e.g. `MipModel`) are asked for each value in turn.
+
+    :param indices: (optional) The variables' indices, if the caller keeps them. Default is None (read from the variables).
+
+    :return: Integer array of the values, in the order of `variables`.
+    """
+    response = getattr(solver, "response_proto", None)
+    if response is None:
+        return np.array([solver.Value(var) for var in variables], dtype=np.int64)
+
+    if indices is None:
+        indices = np.array([var.Index() for var in variables], dtype=np.int64)
+    return np.asarray(response.solution, dtype=np.int64)[indices]
+
+
+class ColumnarSolution:
+    """
+    A schedule in columns: the day, task index and agent index of every assignment (sorted by day, then task, then agent),
+    next to the task and agent names and the total assignments of each agent (carried assignments included).
+
+    Unlike the list of assignment dictionaries the engines return, the columns can be saved and reloaded at once (NPZ, Parquet),
+    compared between runs (`diff`) and aggregated over many runs (`concat_solutions`).
+    """
+
+    def __init__(self, day: np.ndarray, task: np.ndarray, agent: np.ndarray, tasks: list[str], agents: list[str], totals: np.ndarray) -> None:
+        order = np.lexsort((agent, task, day))
+        self.day = np.asarray(day, dtype=np.int64)[order]
+        self.task = np.asarray(task, dtype=np.int64)[order]
+        self.agent = np.asarray(agent, dtype=np.int64)[order]
+        self.tasks = list(tasks)
+        self.agents = list(agents)
+        self.totals = np.asarray(totals, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @classmethod
+    def from_assignments(
+        cls, assignments: list[dict[str, int | str]], agent_assignments: dict[str, int], tasks: list[str]
+    ) -> "ColumnarSolution":
+        """The columns of an engine's result (assignments and agent assignments)."""
+        agents = list(agent_assignments)
+        task_position = {task: indx for indx, task in enumerate(tasks)}
+        agent_position = {name: indx for indx, name in enumerate(agents)}
+        day = np.array([assignment["Day"] for assignment in assignments], dtype=np.int64)
+        task = np.array([task_position[assignment["Task"]] for assignment in assignments], dtype=np.int64)
+        agent = np.array([agent_position[assignment["Agent"]] for assignment in assignments], dtype=np.int64)
+        return cls(day, task, agent, tasks, agents, np.array(list(agent_assignments.values()), dtype=np.int64))
+
+    def assignments(self) -> list[dict[str, int | str]]:
+        """The assignments as the engines return them (agent assigned to task on given day)."""
+        return [
+            {"Day": day, "Task": self.tasks[task], "Agent": self.agents[agent]}
+            for day, task, agent in zip(self.day.tolist(), self.task.tolist(), self.agent.tolist(), strict=True)
+        ]
+
+    def agent_assignments(self) -> dict[str, int]:
+        """The total assignments of each agent, as the engines return them."""
+        return dict(zip(self.agents, self.totals.tolist(), strict=True))
+
+    def to_frame(self) -> pd.DataFrame:
+        """:return: DataFrame with a row per assignment: 'Day', and 'Task' and 'Agent' as categoricals (of all tasks and agents)."""
+        return pd.DataFrame(
+            {
+                "Day": self.day,
+                "Task": pd.Categorical.from_codes(self.task, categories=self.tasks),
+                "Agent": pd.Categorical.from_codes(self.agent, categories=self.agents),
+            }
+        )
+
+    def save(self, path: str) -> None:
+        """Save as '.npz' (NumPy only) or '.parquet' (requires pyarrow, the totals are kept in the file's metadata)."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npz":
+            names = {"tasks": np.array(self.tasks), "agents": np.array(self.agents)}
+            np.savez_compressed(path, day=self.day, task=self.task, agent=self.agent, totals=self.totals, **names)
+        elif extension == ".parquet":
+            frame = self.to_frame()
+            frame.attrs = {"tasks": self.tasks, "agents": self.agents, "totals": self.totals.tolist()}
+            frame.to_parquet(path, index=False)
+        else:
+            raise ValueError(f"Unknown solution format '{extension}', expected '.npz' or '.parquet'")
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnarSolution":
+        """Load a solution saved by `save`."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npz":
+            with np.load(path) as data:
+                return cls(data["day"], data["task"], data["agent"], data["tasks"].tolist(), data["agents"].tolist(), data["totals"])
+        if extension == ".parquet":
+            frame = pd.read_parquet(path)
+            tasks, agents = frame.attrs["tasks"], frame.attrs["agents"]
+            task = pd.Categorical(frame["Task"], categories=tasks).codes
+            agent = pd.Categorical(frame["Agent"], categories=agents).codes
+            return cls(frame["Day"].to_numpy(), task, agent, tasks, agents, np.array(frame.attrs["totals"]))
+        raise ValueError(f"Unknown solution format '{extension}', expected '.npz' or '.parquet'")
+
+    def keys(self) -> pd.MultiIndex:
+        """The (day, task, agent) assignments by name, such that solutions with other orders of tasks or agents compare."""
+        return pd.MultiIndex.from_arrays(
+            [self.day, np.array(self.tasks, dtype=object)[self.task], np.array(self.agents, dtype=object)[self.agent]],
+            names=["Day", "Task", "Agent"],
+        )
+
+    def diff(self, other: "ColumnarSolution") -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        :return: Tuple of the assignments of this solution that are not in `other` (removed), and those of `other`
+        that are not in this solution (added), as DataFrames with the columns 'Day', 'Task' and 'Agent'.
+        """
+        keys, other_keys = self.keys(), other.keys()
+        removed = keys[~keys.isin(other_keys)].to_frame(index=False)
+        added = other_keys[~other_keys.isin(keys)].to_frame(index=False)
+        return removed, added
+
+
+def concat_solutions(solutions: dict[str, ColumnarSolution]) -> pd.DataFrame:
+    """
+    The assignments of many runs (e.g. sectors or months) in one DataFrame, for aggregation.
+
+    :param solutions: Dictionary of run label to solution.
+
+    :return: DataFrame with the columns 'Run', 'Day', 'Task' and 'Agent' (the names as categoricals).
+    """
+    frames = [solution.keys().to_frame(index=False).assign(Run=label) for label, solution in solutions.items()]
+    if not frames:
+        return pd.DataFrame(columns=["Run", "Day", "Task", "Agent"])
+
+    frame = pd.concat(frames, ignore_index=True)[["Run", "Day", "Task", "Agent"]]
+    return frame.astype({"Run": "category", "Task": "category", "Agent": "category"})
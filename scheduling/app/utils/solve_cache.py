@@ -0,0 +1,119 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.data_structures.agent import Agent
+from app.utils.engine_utils import availability_matrix, preference_matrix, qualification_matrix
+
+CACHE_MAX_BYTES = 64 * 1024**2
+
+
+def instance_hashes(
+    tasks: list[str],
+    task_schedules: dict[str, list[int]],
+    agents: list[Agent],
+    parameters: dict | None = None,
+    dates: pd.Index | None = None,
+) -> tuple[str, str]:
+    """
+    Canonical hashes of a parsed instance, independent of how (or from which file) it was parsed.
+
+    :param tasks: List of task names
+    :param task_schedules: Dictionary of task schedules (which days each task is scheduled)
+    :param agents: List of Agent objects
+    :param parameters: (optional) Solver parameters that change the result (JSON-serializable). Default is None.
+    :param dates: (optional) The date of each day, which place the weekends (see `rygvagt_mandatory_leave_info`). Default is None
+    (the calendar of a horizon that starts on a Wednesday).
+
+    :return: Tuple of the key (tasks, schedules, qualifications, days off, preferences, dates and parameters)
+    and the family (tasks and agent names only - instances of one family are near misses of each other).
+    """
+    num_days = max(max(task_schedules[task]) for task in tasks) + 1
+    names = [agent.name for agent in agents]
+
+    family = hashlib.sha256(json.dumps({"tasks": tasks, "agents": names}).encode())
+
+    key = family.copy()
+    key.update(json.dumps({task: sorted(task_schedules[task]) for task in tasks}, sort_keys=True).encode())
+    for matrix in [qualification_matrix(tasks, agents), availability_matrix(agents, num_days), preference_matrix(agents, num_days)]:
+        key.update(np.ascontiguousarray(matrix, dtype=bool).tobytes())
+    calendar = None if dates is None else [date.isoformat() for date in pd.DatetimeIndex(dates)[:num_days].normalize()]
+    key.update(json.dumps(calendar).encode())
+    key.update(json.dumps(parameters or {}, sort_keys=True).encode())
+
+    return key.hexdigest(), family.hexdigest()
+
+
+class SolveCache:
+    """
+    Content-addressed cache of solve results on disk, one JSON file per result named `<family>_<key>.json`.
+
+    Hits are returned immediately, near misses (same family, different key) can seed the solver with a hint.
+    The cache is bounded by `max_bytes`: the least recently used results are evicted first (reading a result touches it).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: str, family: str) -> str:
+        return os.path.join(self.cache_dir, f"{family[:16]}_{key}.json")
+
+    def read(self, path: str) -> dict | None:
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None  # <-- evicted in the meantime, or not a cache entry
+        os.utime(path)  # <-- recently used
+        return entry
+
+    def get(self, key: str, family: str) -> dict | None:
+        """
+        :return: The cached entry with the keys 'assignments', 'agent_assignments', 'status' and 'objective', or None.
+        """
+        return self.read(self.path(key, family))
+
+    def near_miss(self, key: str, family: str) -> dict | None:
+        """
+        :return: The most recently used entry of the same family (but another key), or None.
+        """
+        candidates = [path for path in glob.glob(os.path.join(self.cache_dir, f"{family[:16]}_*.json")) if path != self.path(key, family)]
+        for path in sorted(candidates, key=os.path.getmtime, reverse=True):
+            entry = self.read(path)
+            if entry is not None:
+                return entry
+        return None
+
+    def put(self, key: str, family: str, entry: dict) -> None:
+        path = self.path(key, family)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, path)  # <-- never a half-written entry
+        self.evict()
+
+    def evict(self) -> list[str]:
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`.
+
+        :return: The paths of the evicted entries.
+        """
+        paths = sorted(glob.glob(os.path.join(self.cache_dir, "*.json")), key=os.path.getmtime)
+        sizes = [os.path.getsize(path) for path in paths]
+        total = sum(sizes)
+
+        evicted = []
+        for path, size in zip(paths, sizes, strict=True):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            evicted.append(path)
+            total -= size
+
+        return evicted
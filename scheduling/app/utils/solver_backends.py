@@ -0,0 +1,172 @@
+import os
+import time
+
+from ortools.linear_solver import pywraplp
+from ortools.sat.python import cp_model
+
+from app.utils.scheduling_model import BackSchedulingModel
+
+# The CP-SAT solver and the MIP solvers bundled with OR-Tools (through `pywraplp`)
+BACKENDS = ["CP-SAT", "SCIP", "CBC", "HIGHS"]
+MIP_BACKENDS = BACKENDS[1:]
+
+# CP-SAT bounds beyond this are "unbounded"
+INFINITE_BOUND = 2**62
+
+
+class MipModel:
+    """
+    Mixed-integer (linear) program of a built CP-SAT model, for solving the same constraint set with a MIP solver.
+
+    The constraint set is stated once, by `BackSchedulingModel` (or any CP-SAT model of the same kinds of constraints),
+    and translated from the model's proto:
+    - linear constraints (a single interval) are kept, an enforcement literal `l` makes them big-M constraints (`M * (1 - l)` slack),
+    - at-most-one, exactly-one and bool-or constraints become sums of literals (`1 - x` for a negated literal),
+    - `max_assignments == max(totals)` becomes `max >= total` for every total, and `max <= total + M * (1 - z)` with
+      one binary `z` per total that selects the maximum (`sum(z) == 1`).
+
+    The variables keep their indices, such that `Value` reads a MIP solution as if it came from CP-SAT (see `extract_solution`).
+    Solution hints are not translated.
+    """
+
+    def __init__(self, model: cp_model.CpModel, backend: str = "SCIP") -> None:
+        self.backend = backend
+        self.solver = pywraplp.Solver.CreateSolver(backend)
+        if self.solver is None:
+            raise ValueError(f"The MIP backend '{backend}' is not available, expected one of {MIP_BACKENDS}")
+        self.solver.SuppressOutput()
+
+        proto = model.Proto()
+        self.variables = []  # <-- by CP-SAT variable index
+        self.bounds = []  # <-- (lower, upper) by CP-SAT variable index
+        for indx, variable in enumerate(proto.variables):
+            domain = list(variable.domain)
+            lower, upper = domain[0], domain[-1]  # <-- holes in the domain are ignored (the scheduling models have none)
+            self.bounds.append((lower, upper))
+            self.variables.append(self.solver.IntVar(lower, upper, variable.name or f"v{indx}"))
+
+        for constraint in proto.constraints:
+            self.add_constraint(constraint)
+
+        objective = self.solver.Objective()
+        for var, coeff in zip(proto.objective.vars, proto.objective.coeffs, strict=True):
+            objective.SetCoefficient(self.variables[var], coeff)
+        objective.SetOffset(proto.objective.offset)
+        objective.SetMinimization()  # <-- a CP-SAT objective is always minimized (a maximization is negated, see `scaling_factor`)
+        self.scaling_factor = proto.objective.scaling_factor or 1
+
+    def literal(self, ref: int) -> pywraplp.LinearExpr:
+        """A CP-SAT literal (a negative reference is the negation of variable `-ref - 1`)."""
+        return self.variables[ref] if ref >= 0 else 1 - self.variables[-ref - 1]
+
+    def expression(self, indices: list[int], coeffs: list[int], offset: int = 0) -> tuple[pywraplp.LinearExpr, int, int]:
+        """
+        :return: Tuple of the linear expression and its lowest and highest value (from the variables' bounds).
+        """
+        expression, lowest, highest = offset, offset, offset
+        for var, coeff in zip(indices, coeffs, strict=True):
+            lower, upper = self.bounds[var]
+            expression += coeff * self.variables[var]
+            lowest += min(coeff * lower, coeff * upper)
+            highest += max(coeff * lower, coeff * upper)
+        return expression, lowest, highest
+
+    def add_constraint(self, constraint: object) -> None:
+        if constraint.has_linear():
+            domain = list(constraint.linear.domain)
+            if len(domain) != 2:
+                raise NotImplementedError("Linear constraints with holes in their domain have no MIP translation")
+            expression, lowest, highest = self.expression(list(constraint.linear.vars), list(constraint.linear.coeffs))
+            self.add_enforced(expression, lowest, highest, domain[0], domain[1], list(constraint.enforcement_literal))
+        elif constraint.has_at_most_one() or constraint.has_exactly_one() or constraint.has_bool_or():
+            kind = "at_most_one" if constraint.has_at_most_one() else "exactly_one" if constraint.has_exactly_one() else "bool_or"
+            literals = list(getattr(constraint, kind).literals)
+            lower, upper = {"at_most_one": (0, 1), "exactly_one": (1, 1), "bool_or": (1, len(literals))}[kind]
+            expression = sum(self.literal(ref) for ref in literals)
+            self.add_enforced(expression, 0, len(literals), lower, upper, list(constraint.enforcement_literal))
+        elif constraint.has_lin_max():
+            if constraint.enforcement_literal:
+                raise NotImplementedError("Enforced max-equalities have no MIP translation")
+            self.add_max_equality(constraint.lin_max)
+        else:
+            raise NotImplementedError(f"No MIP translation for the constraint {constraint}")
+
+    def add_enforced(self, expression: pywraplp.LinearExpr, lowest: int, highest: int, lower: int, upper: int, enforcement: list[int]) -> None:
+        """`lower <= expression <= upper`, only if all the enforcement literals hold (big-M, from the expression's range)."""
+        slack = sum(1 - self.literal(ref) for ref in enforcement)  # <-- 0 if enforced, at least 1 otherwise
+        if lower > -INFINITE_BOUND and lower > lowest:
+            self.solver.Add(expression >= lower - (lower - lowest) * slack)
+        if upper < INFINITE_BOUND and upper < highest:
+            self.solver.Add(expression <= upper + (highest - upper) * slack)
+
+    def add_max_equality(self, lin_max: object) -> None:
+        target, _, _ = self.expression(list(lin_max.target.vars), list(lin_max.target.coeffs), lin_max.target.offset)
+        expressions = [self.expression(list(expr.vars), list(expr.coeffs), expr.offset) for expr in lin_max.exprs]
+        highest = max(expression_highest for _, _, expression_highest in expressions)
+
+        selected = [self.solver.BoolVar(f"max_selects_{indx}") for indx in range(len(expressions))]
+        self.solver.Add(sum(selected) == 1)
+        for (expression, lowest, _), select in zip(expressions, selected, strict=True):
+            self.solver.Add(target >= expression)
+            self.solver.Add(target <= expression + (highest - lowest) * (1 - select))
+
+    def solve(self, max_time_in_seconds: float = 300.0) -> int:
+        """:return: The `pywraplp` result status."""
+        self.solver.SetTimeLimit(int(max_time_in_seconds * 1000))
+        return self.solver.Solve()
+
+    def Value(self, var: cp_model.IntVar) -> int:  # noqa: N802 - the name of `CpSolver.Value`, such that `extract_solution` accepts both
+        return round(self.variables[var.Index()].solution_value())
+
+    def objective_value(self) -> float:
+        return self.scaling_factor * self.solver.Objective().Value()
+
+    def best_bound(self) -> float:
+        return self.scaling_factor * self.solver.Objective().BestBound()
+
+
+def export_model(back_model: BackSchedulingModel, path: str) -> None:
+    """
+    Export a built model by the file extension: '.mps' or '.lp' as a MIP (see `MipModel`), '.pb' or '.pbtxt' as a CP-SAT proto.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in [".pb", ".pbtxt"]:
+        if not back_model.model.ExportToFile(path):
+            raise OSError(f"Could not export the model to {path}")
+        return
+    if extension not in [".mps", ".lp"]:
+        raise ValueError(f"Unknown model format '{extension}', expected '.mps', '.lp', '.pb' or '.pbtxt'")
+
+    solver = MipModel(back_model.model, "SCIP").solver
+    # Free format and the variables' own names (not obfuscated)
+    exported = solver.ExportModelAsMpsFormat(False, False) if extension == ".mps" else solver.ExportModelAsLpFormat(False)
+    with open(path, "w") as file:
+        file.write(exported)
+
+
+def solve_with_backend(
+    back_model: BackSchedulingModel, backend: str = "CP-SAT", max_time_in_seconds: float = 300.0
+) -> tuple[str, float | None, float | None, float, tuple[list[dict[str, int | str]], dict[str, int]] | None]:
+    """
+    Solve a built model with one of the `BACKENDS`.
+
+    :return: Tuple of the status name, the objective and the best bound (None without a solution), the solve time in seconds
+    (the translation to a MIP included), and the solution (as `BackSchedulingModel.extract_solution`, None without a solution).
+    """
+    start = time.perf_counter()
+    if backend == "CP-SAT":
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = max_time_in_seconds
+        status = solver.Solve(back_model.model)
+        if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            return solver.StatusName(status), None, None, time.perf_counter() - start, None
+        solution = back_model.extract_solution(solver)
+        return solver.StatusName(status), solver.ObjectiveValue(), solver.BestObjectiveBound(), time.perf_counter() - start, solution
+
+    mip = MipModel(back_model.model, backend)
+    status = mip.solve(max_time_in_seconds)
+    status_name = {pywraplp.Solver.OPTIMAL: "OPTIMAL", pywraplp.Solver.FEASIBLE: "FEASIBLE", pywraplp.Solver.INFEASIBLE: "INFEASIBLE"}
+    if status not in [pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE]:
+        return status_name.get(status, "UNKNOWN"), None, None, time.perf_counter() - start, None
+    solution = back_model.extract_solution(mip)
+    return status_name[status], mip.objective_value(), mip.best_bound(), time.perf_counter() - start, solution
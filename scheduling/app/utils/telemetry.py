@@ -0,0 +1,219 @@
+import datetime
+import json
+import os
+import subprocess
+
+from ortools.sat.python import cp_model
+
+from app.utils.scheduling_model import BackSchedulingModel
+
+# The metrics `compare_runs` checks, and whether a higher value is a regression (the objective is minimized)
+REGRESSION_METRICS = {
+    "build_seconds": True,
+    "wall_time": True,
+    "deterministic_time": True,
+    "conflicts": True,
+    "branches": True,
+    "objective": True,
+    "gap": True,
+}
+
+# Differences below these are noise, not regressions (e.g. a few milliseconds of wall time)
+REGRESSION_MIN_DIFFERENCE = {
+    "build_seconds": 0.05,
+    "wall_time": 0.1,
+    "deterministic_time": 0.1,
+    "conflicts": 100,
+    "branches": 1000,
+    "gap": 0.01,
+}
+
+
+def code_version() -> str | None:
+    """The git commit of the code (with a '-dirty' suffix for uncommitted changes), or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def solve_record(
+    back_model: BackSchedulingModel,
+    solver: cp_model.CpSolver,
+    status: int,
+    instance: tuple[str, str],
+    parameters: dict,
+    build_seconds: float,
+    trajectory: list[tuple[float, float, float]],
+    bounds: list[tuple[float, float]],
+    presolve_report: dict | None = None,
+) -> dict:
+    """
+    The metrics of a solved `BackSchedulingModel`, as a JSON-serializable record.
+
+    :param instance: Tuple of the instance key and family (see `instance_hashes`, without parameters).
+    :param parameters: The engine's parameters (e.g. sparse, presolve, time limit).
+    :param build_seconds: Time to build the model.
+    :param trajectory: The (elapsed, objective, bound) of every improving solution (see `TrajectoryCallback`).
+    :param bounds: The (elapsed, bound) of every improving bound.
+    :param presolve_report: (optional) The report of `presolve_forced_assignments`. Default is None (no presolve).
+
+    :return: Dictionary with the keys 'time', 'code_version', 'instance', 'family', 'parameters', 'solver_parameters', 'model'
+    (size per constraint family, see `BackSchedulingModel.profile`), 'presolve', the solver's statistics and the trajectories.
+    """
+    proto = back_model.model.Proto()
+    response = solver.response_proto
+    has_solution = status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+    objective = solver.ObjectiveValue() if has_solution else None
+    bound = solver.BestObjectiveBound() if has_solution else None
+
+    return {
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "code_version": code_version(),
+        "instance": instance[0],
+        "family": instance[1],
+        "parameters": parameters,
+        "solver_parameters": str(solver.parameters),
+        "model": {
+            "variables": len(proto.variables),
+            "constraints": len(proto.constraints),
+            "families": back_model.build_stats,
+        },
+        "build_seconds": build_seconds,
+        "presolve": {
+            "rounds": presolve_report["rounds"],
+            "forced": len(presolve_report["forced"]),
+            "removed": presolve_report["removed"],
+        }
+        if presolve_report is not None
+        else None,
+        "status": solver.StatusName(status),
+        "objective": objective,
+        "bound": bound,
+        "gap": (objective - bound) / max(abs(objective), 1) if has_solution else None,
+        "wall_time": response.wall_time,
+        "user_time": response.user_time,
+        "deterministic_time": response.deterministic_time,
+        "conflicts": response.num_conflicts,
+        "branches": response.num_branches,
+        "booleans": response.num_booleans,
+        "fixed_booleans": response.num_fixed_booleans,  # <-- fixed by the solver's presolve (and at the root)
+        "restarts": response.num_restarts,
+        "lp_iterations": response.num_lp_iterations,
+        "gap_integral": response.gap_integral,
+        "trajectory": [list(incumbent) for incumbent in trajectory],
+        "bounds": [list(improvement) for improvement in bounds],
+    }
+
+
+class SolveLog:
+    """
+    Append-only log of solve records (see `solve_record`), one JSON object per line.
+    A line is written at once, such that concurrent runs appending to the same log don't interleave.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def append(self, record: dict) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+    def records(self) -> list[dict]:
+        """:return: The records, oldest first (lines that aren't records, e.g. of an interrupted write, are skipped)."""
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+def change_causes(baseline: dict, current: dict) -> list[str]:
+    """
+    What changed between two runs: 'data' (another instance), 'parameters' (the engine's or the solver's), 'code' (another
+    code version) and 'model' (the same instance, but another model size per family - a change in how the model is built).
+    """
+    causes = []
+    if baseline["instance"] != current["instance"]:
+        causes.append("data")
+    if baseline["parameters"] != current["parameters"] or baseline["solver_parameters"] != current["solver_parameters"]:
+        causes.append("parameters")
+    if baseline["code_version"] != current["code_version"]:
+        causes.append("code")
+
+    def sizes(run: dict) -> dict:
+        return {family: (stats["variables"], stats["constraints"]) for family, stats in run["model"]["families"].items()}
+
+    if "data" not in causes and sizes(baseline) != sizes(current):
+        causes.append("model")
+
+    return causes
+
+
+def compare_runs(baseline: dict, current: dict, tolerance: float = 0.2) -> list[dict]:
+    """
+    Flag the metrics (see `REGRESSION_METRICS`) that got worse by more than `tolerance` (relative) from `baseline` to `current`.
+    A run that lost its solution is a regression of the status.
+
+    :return: List of regressions, dictionaries with the keys 'metric', 'baseline', 'current' and 'causes' (see `change_causes`).
+    """
+    causes = change_causes(baseline, current)
+
+    regressions = []
+    if baseline["objective"] is not None and current["objective"] is None:
+        regressions.append({"metric": "status", "baseline": baseline["status"], "current": current["status"], "causes": causes})
+
+    for metric, higher_is_worse in REGRESSION_METRICS.items():
+        before, after = baseline.get(metric), current.get(metric)
+        if before is None or after is None:
+            continue
+        difference = (after - before) if higher_is_worse else (before - after)
+        if difference > tolerance * abs(before) and difference >= REGRESSION_MIN_DIFFERENCE.get(metric, 0):
+            regressions.append({"metric": metric, "baseline": before, "current": after, "causes": causes})
+
+    return regressions
+
+
+def compare_log(path: str, tolerance: float = 0.2, verbose: bool = True) -> list[dict]:
+    """
+    Compare the latest run of every instance family (same tasks and agents) in a solve log with the run before it.
+
+    :param path: Path to the solve log (see `SolveLog`).
+    :param tolerance: (optional) Relative worsening of a metric that counts as a regression. Default is 0.2 (20%).
+    :param verbose: (optional) If True, prints the comparison of each family. Default is True.
+
+    :return: The regressions (see `compare_runs`), with the 'family' and the 'time' of both runs.
+    """
+    runs = {}
+    for record in SolveLog(path).records():
+        runs.setdefault(record["family"], []).append(record)
+
+    regressions = []
+    for family, records in runs.items():
+        if len(records) < 2:
+            continue
+        baseline, current = records[-2], records[-1]
+        found = compare_runs(baseline, current, tolerance)
+        times = {"family": family, "baseline_time": baseline["time"], "current_time": current["time"]}
+        regressions += [regression | times for regression in found]
+
+        if verbose:
+            causes = ", ".join(change_causes(baseline, current)) or "nothing"
+            print(f"Family {family[:16]}: {baseline['time']} -> {current['time']} (changed: {causes})")
+            for regression in found:
+                print(f"  REGRESSION {regression['metric']}: {regression['baseline']} -> {regression['current']}")
+            if not found:
+                print("  No regressions")
+
+    return regressions
@@ -0,0 +1,21 @@
+import argparse
+import sys
+
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
+from app.utils.schedule_validator import validate_schedule_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check schedules of the back (ryg) sector against every rule of the scheduling model.")
+    parser.add_argument("data", help="The data-file (input) the schedules are for.")
+    parser.add_argument("schedules", nargs="+", help="Results workbooks, or data-files with a filled 'doctor_charts' sheet.")
+    parser.add_argument("--day-offset", type=int, help="Day of the week of the first day (0=Monday, ..., 6=Sunday), default from the dates.")
+    args = parser.parse_args()
+
+    workbook = read_workbook(args.data)
+    tasks, task_schedules, agents = parse_constraints(workbook)
+    requirements = read_requirements(workbook)  # <-- the data-file's 'requirements' sheet, if any
+    num_violations = sum(
+        len(validate_schedule_file(path, tasks, task_schedules, agents, args.day_offset, requirements=requirements)) for path in args.schedules
+    )
+
+    sys.exit(1 if num_violations else 0)
@@ -0,0 +1,28 @@
+import pytest
+
+from app.data_structures.agent import Agent
+from app.data_structures.workbook import ScheduleWorkbook
+from app.utils.instance_generator import generate_instance
+from app.utils.schedule_preprocess import parse_constraints, read_workbook
+
+# Small generated instances (10 agents, two weeks) that every engine solves to optimality in well under a second
+INSTANCE_SEEDS = [2, 3]
+
+
+@pytest.fixture(scope="session", params=INSTANCE_SEEDS)
+def instance_path(request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory) -> str:
+    path = tmp_path_factory.mktemp("instances") / f"ryg_data_{request.param}.xlsx"
+    return generate_instance(
+        str(path), num_agents=10, num_tasks=6, num_days=14, qualification_density=0.35, days_off_rate=0.15, seed=request.param
+    )
+
+
+@pytest.fixture
+def workbook(instance_path: str) -> ScheduleWorkbook:
+    return read_workbook(instance_path)
+
+
+@pytest.fixture
+def instance(workbook: ScheduleWorkbook) -> tuple[list[str], dict[str, list[int]], list[Agent]]:
+    """The parsed instance (tasks, task schedules, agents), parsed anew for every test such that tests may edit it."""
+    return parse_constraints(workbook)
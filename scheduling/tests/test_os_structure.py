@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from ortools.sat.python import cp_model
+
+from app.utils.os_structure import read_schedule_results, write_schedule_to_excel
+from app.utils.schedule_validator import schedule_from_sheet, validate_schedule_file
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solution_format import ColumnarSolution
+
+
+@pytest.fixture
+def solved(workbook, instance) -> tuple[BackSchedulingModel, cp_model.CpSolver]:
+    tasks, task_schedules, agents = instance
+    back_model = BackSchedulingModel(tasks, task_schedules, agents, dates=workbook.dates).build()
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 30.0
+    solver.parameters.num_workers = 1
+    assert solver.Solve(back_model.model) == cp_model.OPTIMAL
+    return back_model, solver
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_written_schedule_reads_back_without_violations(tmp_path, workbook, instance, solved, columnar: bool):
+    tasks, task_schedules, agents = instance
+    back_model, solver = solved
+    solution = back_model.extract_columnar(solver)
+    path = str(tmp_path / "ryg_results.xlsx")
+    if columnar:
+        write_schedule_to_excel(path, workbook, solution, verbose=False)
+    else:
+        write_schedule_to_excel(path, workbook, *back_model.extract_solution(solver), verbose=False)
+
+    assert validate_schedule_file(path, tasks, task_schedules, agents, verbose=False) == []
+
+    # The schedule read back is the solved one, and so are the totals
+    schedule_df, agent_assignments = read_schedule_results(path)
+    agent, task, day = schedule_from_sheet(schedule_df, tasks, task_schedules, agents)
+    read_back = ColumnarSolution(day, task, agent, tasks, solution.agents, solution.totals)
+    assert np.array_equal(read_back.day, solution.day)
+    assert np.array_equal(read_back.task, solution.task)
+    assert np.array_equal(read_back.agent, solution.agent)
+    assert agent_assignments == solution.agent_assignments()
+
+
+def test_assignment_of_an_unknown_task_is_rejected(tmp_path, workbook, solved):
+    back_model, solver = solved
+    solution = back_model.extract_columnar(solver)
+    solution.tasks[-1] = "Opgave 99"  # <-- not in the data-file's 'tasks' sheet
+
+    with pytest.raises(ValueError, match="Opgave 99"):
+        write_schedule_to_excel(str(tmp_path / "ryg_results.xlsx"), workbook, solution, verbose=False)
@@ -0,0 +1,53 @@
+import numpy as np
+from ortools.sat.python import cp_model
+
+from app.utils.engine_utils import eligibility_cube
+from app.utils.presolve import presolve_forced_assignments
+from app.utils.scheduling_model import BackSchedulingModel
+
+
+def is_feasible_with(back_model: BackSchedulingModel, key: tuple[str, str, int], value: int) -> bool:
+    """Whether the (not presolved) model is feasible with the variable of `key` fixed to `value`."""
+    model = back_model.model.Clone()
+    model.Add(model.GetBoolVarFromProtoIndex(back_model.x[key].Index()) == value)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 30.0
+    solver.parameters.num_workers = 1
+    status = solver.Solve(model)
+    assert status != cp_model.UNKNOWN
+    return status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+
+
+def test_presolve_only_fixes_what_every_solution_agrees_with(workbook, instance):
+    tasks, task_schedules, agents = instance
+    num_days = max(max(task_schedules[task]) for task in tasks) + 1
+    eligibility, forced, report = presolve_forced_assignments(tasks, task_schedules, agents, dates=workbook.dates, verbose=False)
+    assert not report["infeasible"]
+
+    removed = np.argwhere(eligibility_cube(tasks, task_schedules, agents, num_days) & ~eligibility)
+    assert len(forced) + len(removed) > 0  # <-- the instances are tight enough for the presolve to do something
+
+    back_model = BackSchedulingModel(tasks, task_schedules, agents, dates=workbook.dates).build()
+    for agent_indx, task_indx, day in forced:
+        key = (agents[agent_indx].name, tasks[task_indx], int(day))
+        assert not is_feasible_with(back_model, key, 0), f"Forced {key}, but there is a schedule without it"
+    for agent_indx, task_indx, day in removed.tolist():
+        key = (agents[agent_indx].name, tasks[task_indx], day)
+        assert not is_feasible_with(back_model, key, 1), f"Removed {key}, but there is a schedule with it"
+
+
+def test_presolved_model_has_the_same_optimum(workbook, instance):
+    tasks, task_schedules, agents = instance
+    eligibility, forced, _ = presolve_forced_assignments(tasks, task_schedules, agents, dates=workbook.dates, verbose=False)
+
+    objectives = []
+    for presolved in [False, True]:
+        kwargs = {"eligibility": eligibility, "fixed": forced} if presolved else {}
+        back_model = BackSchedulingModel(tasks, task_schedules, agents, dates=workbook.dates, **kwargs).build()
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = 30.0
+        solver.parameters.num_workers = 1
+        assert solver.Solve(back_model.model) == cp_model.OPTIMAL
+        objectives.append(solver.ObjectiveValue())
+
+    assert objectives[0] == objectives[1]
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.utils.rank_selection import exponential_rank_selection, linear_rank_selection, naive_rank_selection, ranking
+
+FITNESS_SCORES = [0.05, 0.1111, 0.169, 0.31, 0.33, 0.42, 0.58, 0.69, 0.8, 0.96]
+
+
+def test_ranking():
+    assert ranking([0.3, 0.1, 0.2]).tolist() == [3, 1, 2]
+    assert ranking([0.2, 0.1, 0.2, 0.1]).tolist() == [3, 1, 4, 2]  # <-- ties in order of appearance
+    assert ranking([0.2, 0.1, 0.2, 0.1], ties="min").tolist() == [3, 1, 3, 1]
+    assert ranking([0.2, 0.1, 0.2, 0.1], ties="average").tolist() == [3.5, 1.5, 3.5, 1.5]
+    with pytest.raises(ValueError):
+        ranking([0.1, 0.1], ties="max")
+
+
+def test_naive_rank_selection():
+    n = len(FITNESS_SCORES)
+    assert np.allclose(naive_rank_selection(FITNESS_SCORES), np.arange(1, n + 1) / (n * (n + 1) / 2))
+
+
+@pytest.mark.parametrize("selection_pressure", [1.0, 1.5, 2.0])
+def test_linear_rank_selection(selection_pressure: float):
+    n = len(FITNESS_SCORES)
+    probabilities = linear_rank_selection(FITNESS_SCORES, selection_pressure)
+
+    # The textbook formula: (2 - sp + 2 (sp - 1) (rank - 1) / (n - 1)) / n
+    expected = (2 - selection_pressure + 2 * (selection_pressure - 1) * np.arange(n) / (n - 1)) / n
+    assert np.allclose(probabilities, expected)
+    assert np.isclose(probabilities.sum(), 1)
+
+
+@pytest.mark.parametrize("weight", [0.1, 0.5, 0.9])
+def test_exponential_rank_selection(weight: float):
+    n = len(FITNESS_SCORES)
+    probabilities = exponential_rank_selection(FITNESS_SCORES, weight)
+
+    expected = weight ** (n - np.arange(1, n + 1)) / sum(weight**indx for indx in range(n))
+    assert np.allclose(probabilities, expected)
+    assert np.isclose(probabilities.sum(), 1)
+    assert np.all(np.diff(probabilities) > 0)  # <-- the fitter, the likelier
+
+
+def test_batched_rank_selection_equals_one_at_a_time():
+    selection_pressures = np.linspace(1, 2, 5)
+    batched = linear_rank_selection(FITNESS_SCORES, selection_pressures)
+    assert batched.shape == (5, len(FITNESS_SCORES))
+    for row, selection_pressure in zip(batched, selection_pressures, strict=True):
+        assert np.allclose(row, linear_rank_selection(FITNESS_SCORES, selection_pressure))
+
+    weights = np.linspace(0.1, 1, 4)
+    batched = exponential_rank_selection(FITNESS_SCORES, weights)
+    for row, weight in zip(batched, weights, strict=True):
+        assert np.allclose(row, exponential_rank_selection(FITNESS_SCORES, weight))
+
+
+def test_tied_scores_are_equally_likely():
+    probabilities = linear_rank_selection([0.5, 0.1, 0.5, 0.9], 1.8, ties="average")
+    assert np.isclose(probabilities[0], probabilities[2])
+    assert np.isclose(probabilities.sum(), 1)
@@ -0,0 +1,50 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from app.utils.instance_generator import generate_instance
+from app.utils.matching_engine import matching_scheduling
+from app.utils.os_structure import write_schedule_to_excel
+from app.utils.replan import replan_schedule
+from app.utils.schedule_preprocess import parse_constraints, read_requirements, read_workbook
+from app.utils.schedule_validator import validate_schedule_file
+
+DOUBLED_TASK = "Opgave 1"
+
+
+@pytest.fixture
+def doubled_path(tmp_path) -> str:
+    """A data-file whose 'requirements' sheet asks for two agents on `DOUBLED_TASK` (which the ryg sector staffs with one)."""
+    path = generate_instance(str(tmp_path / "ryg_data.xlsx"), num_agents=20, num_tasks=6, num_days=14, qualification_density=0.6, seed=0)
+    with pd.ExcelWriter(path, engine="openpyxl", mode="a") as writer:
+        pd.DataFrame({"Agents": [2]}, index=pd.Index([DOUBLED_TASK], name="Task")).to_excel(writer, sheet_name="requirements")
+    return path
+
+
+def test_replan_enforces_the_requirements_sheet(tmp_path, doubled_path: str):
+    workbook = read_workbook(doubled_path)
+    tasks, task_schedules, agents = parse_constraints(workbook)
+    requirements = read_requirements(workbook)
+    assert requirements[DOUBLED_TASK] == 2
+    assert requirements["O-OP"] == 2  # <-- tasks the sheet doesn't list keep the ryg sector's requirements
+
+    # Publish a schedule that staffs every task with a single agent (the default for `DOUBLED_TASK`)
+    published = matching_scheduling(tasks, task_schedules, agents, verbose=False, dates=workbook.dates)
+    published_path = str(tmp_path / "ryg_results.xlsx")
+    write_schedule_to_excel(published_path, workbook, *published, verbose=False)
+    assert validate_schedule_file(published_path, tasks, task_schedules, agents, verbose=False) == []
+    understaffed = validate_schedule_file(published_path, tasks, task_schedules, agents, verbose=False, requirements=requirements)
+    assert {(violation["Rule"], violation["Task"]) for violation in understaffed} == {("coverage", DOUBLED_TASK)}
+
+    # The re-plan staffs `DOUBLED_TASK` with two agents on every scheduled day
+    results = replan_schedule(
+        tasks, task_schedules, agents, published_path, fairness_slack=5, verbose=False, dates=workbook.dates, requirements=requirements
+    )
+    assert results is not None
+    staffed = Counter(assignment["Day"] for assignment in results[0] if assignment["Task"] == DOUBLED_TASK)
+    assert staffed == {day: 2 for day in task_schedules[DOUBLED_TASK]}
+
+    replanned_path = str(tmp_path / "ryg_replanned.xlsx")
+    write_schedule_to_excel(replanned_path, workbook, *results, verbose=False)
+    assert validate_schedule_file(replanned_path, tasks, task_schedules, agents, verbose=False, requirements=requirements) == []
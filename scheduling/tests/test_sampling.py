@@ -0,0 +1,63 @@
+import numpy as np
+
+from app.utils.rank_selection import exponential_rank_selection, linear_rank_selection
+from app.utils.sampling import AliasTable, alias_sampling, stochastic_universal_sampling
+
+FITNESS_SCORES = [0.05, 0.1111, 0.169, 0.31, 0.33, 0.42, 0.58, 0.69, 0.8, 0.96]
+
+
+def test_alias_sampling_follows_the_probabilities():
+    probabilities = exponential_rank_selection(FITNESS_SCORES, 0.7)
+    num_draws = 200_000
+    draws = AliasTable(probabilities).draw(num_draws, rng=0)
+
+    assert draws.shape == (num_draws,)
+    frequencies = np.bincount(draws, minlength=len(probabilities)) / num_draws
+    # Within 5 standard deviations of the binomial frequency of every index
+    assert np.all(np.abs(frequencies - probabilities) <= 5 * np.sqrt(probabilities * (1 - probabilities) / num_draws))
+
+
+def test_alias_sampling_never_draws_impossible_indices():
+    probabilities = np.array([0.0, 0.5, 0.0, 0.5])
+    draws = alias_sampling(probabilities, 10_000, rng=1)
+    assert set(np.unique(draws).tolist()) == {1, 3}
+
+
+def test_batched_alias_sampling():
+    probabilities = linear_rank_selection(FITNESS_SCORES, np.array([1.0, 2.0]))
+    draws = AliasTable(probabilities).draw(100_000, rng=2)
+
+    assert draws.shape == (2, 100_000)
+    uniform, pressured = (np.bincount(row, minlength=len(FITNESS_SCORES)) / 100_000 for row in draws)
+    assert np.allclose(uniform, 1 / len(FITNESS_SCORES), atol=0.01)
+    assert pressured[0] == 0  # <-- a selection pressure of 2 never selects the worst
+    assert np.allclose(pressured, probabilities[1], atol=0.01)
+
+
+def test_alias_sampling_is_seeded():
+    probabilities = linear_rank_selection(FITNESS_SCORES, 1.5)
+    assert np.array_equal(alias_sampling(probabilities, 100, rng=3), alias_sampling(probabilities, 100, rng=3))
+
+
+def test_stochastic_universal_sampling_has_minimal_spread():
+    probabilities = exponential_rank_selection(FITNESS_SCORES, 0.8)
+    k = 37
+    for seed in range(20):
+        counts = np.bincount(stochastic_universal_sampling(probabilities, k, rng=seed), minlength=len(probabilities))
+        # Every index is drawn floor(k * p) or ceil(k * p) times
+        assert counts.sum() == k
+        assert np.all(counts >= np.floor(k * probabilities - 1e-9))
+        assert np.all(counts <= np.ceil(k * probabilities + 1e-9))
+
+
+def test_batched_stochastic_universal_sampling():
+    probabilities = linear_rank_selection(FITNESS_SCORES, np.linspace(1, 2, 6))
+    k = 25
+    draws = stochastic_universal_sampling(probabilities, k, rng=4, shuffle=False)
+
+    assert draws.shape == (6, k)
+    assert np.all(np.diff(draws, axis=1) >= 0)  # <-- unshuffled, SUS draws in index order
+    for row, row_probabilities in zip(draws, probabilities, strict=True):
+        counts = np.bincount(row, minlength=len(FITNESS_SCORES))
+        assert np.all(counts >= np.floor(k * row_probabilities - 1e-9))
+        assert np.all(counts <= np.ceil(k * row_probabilities + 1e-9))
@@ -0,0 +1,23 @@
+from ortools.sat.python import cp_model
+
+from app.utils.scheduling_model import BackSchedulingModel
+
+
+def solve(back_model: BackSchedulingModel) -> tuple[int, cp_model.CpSolver]:
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = 30.0
+    solver.parameters.num_workers = 1  # <-- deterministic
+    return solver.Solve(back_model.model), solver
+
+
+def test_sparse_and_dense_models_have_the_same_optimum(workbook, instance):
+    tasks, task_schedules, agents = instance
+    sparse_model = BackSchedulingModel(tasks, task_schedules, agents, sparse=True, dates=workbook.dates).build()
+    dense_model = BackSchedulingModel(tasks, task_schedules, agents, sparse=False, dates=workbook.dates).build()
+
+    sparse_status, sparse_solver = solve(sparse_model)
+    dense_status, dense_solver = solve(dense_model)
+
+    assert sparse_status == dense_status == cp_model.OPTIMAL
+    assert sparse_solver.ObjectiveValue() == dense_solver.ObjectiveValue()
+    assert len(sparse_model.x) < len(dense_model.x)  # <-- the sparse model only has the eligible triples
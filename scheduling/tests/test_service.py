@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+from ortools.sat.python import cp_model
+
+from app.service import Instance, Job, SchedulingService, apply_edits
+from app.utils.instance_generator import generate_instance
+
+
+@pytest.fixture(scope="module")
+def slow_instance(tmp_path_factory: pytest.TempPathFactory) -> Instance:
+    """An instance that takes CP-SAT a few seconds to solve to optimality (without symmetry breaking, as in the service)."""
+    path = generate_instance(str(tmp_path_factory.mktemp("service") / "ryg_data.xlsx"), num_agents=40, num_days=92, seed=1)
+    return Instance("instance-1", path)
+
+
+def run_job(instance: Instance, edits: list[dict], max_time_in_seconds: float = 60.0) -> Job:
+    async def run() -> Job:
+        loop = asyncio.get_running_loop()
+        job = Job("job-1", instance, edits, max_time_in_seconds, loop)
+        await loop.run_in_executor(None, job.run)
+        await asyncio.sleep(0)  # <-- let the published events arrive
+        return job
+
+    return asyncio.run(run())
+
+
+def test_cancel_just_before_the_solve_stops_it(monkeypatch: pytest.MonkeyPatch, slow_instance: Instance):
+    jobs = []
+
+    class CancelledSolver(cp_model.CpSolver):
+        def Solve(self, *args, **kwargs) -> int:  # noqa: N802
+            jobs[0].cancel()  # <-- after the job's last check, before the solve started: `StopSearch` has no search to stop yet
+            return super().Solve(*args, **kwargs)
+
+    original_init = Job.__init__
+
+    def init(job: Job, *args, **kwargs) -> None:
+        original_init(job, *args, **kwargs)
+        jobs.append(job)
+
+    monkeypatch.setattr(Job, "__init__", init)
+    monkeypatch.setattr(cp_model, "CpSolver", CancelledSolver)
+    job = run_job(slow_instance, [])
+
+    assert job.status == "cancelled"
+    assert job.events[-1] == {"event": "status", "status": "cancelled"}
+    assert job.solver.response_proto.wall_time < 1.0  # <-- stopped at once, rather than solved (or run to the time limit)
+
+
+@pytest.mark.parametrize("kind", ["qualify", "unqualify"])
+def test_unknown_task_in_an_edit_fails(slow_instance: Instance, kind: str):
+    agent = slow_instance.agents[0].name
+    edit = {"edit": kind, "agent": agent, "task": "NOPE"}
+    with pytest.raises(ValueError, match="Unknown task 'NOPE'"):
+        apply_edits(slow_instance.tasks, slow_instance.task_schedules, slow_instance.agents, [edit])
+
+    job = run_job(slow_instance, [edit], max_time_in_seconds=1.0)
+    assert job.status == "failed"
+    assert "Unknown task 'NOPE'" in job.events[-1]["error"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'["not", "an", "object"]',
+        b'{"edits": ["day_off"]}',
+        b'{"edits": {"edit": "day_off"}}',
+        b'{"edits": [{"edit": "day_off", "agent": "L001", "day": null}]}',
+        b'{"edits": [{"edit": "rename", "agent": "L001"}]}',
+        b'{"max_time": null}',
+    ],
+)
+def test_malformed_job_requests_are_refused(instance_path: str, body: bytes):
+    service = SchedulingService(max_workers=1)
+
+    async def request(method: str, path: str, body: bytes) -> tuple[int, dict]:
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            status_line, _, content = (await reader.read()).partition(b"\r\n")
+            writer.close()
+            return int(status_line.split()[1]), json.loads(content.partition(b"\r\n\r\n")[2])
+
+    async def run() -> tuple[int, dict]:
+        status, instance = await request("POST", "/instances", json.dumps({"path": instance_path}).encode())
+        assert status == 201
+        return await request("POST", f"/instances/{instance['instance']}/jobs", body)
+
+    status, payload = asyncio.run(run())
+    service.executor.shutdown()
+
+    assert status == 400
+    assert "error" in payload
+    assert service.jobs == {}
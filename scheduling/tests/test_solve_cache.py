@@ -0,0 +1,57 @@
+import pandas as pd
+
+from app.service import apply_edits
+from app.utils.solve_cache import SolveCache, instance_hashes
+
+
+def test_unchanged_instance_has_the_same_key(workbook, instance):
+    tasks, task_schedules, agents = instance
+    parameters = {"sparse": True, "max_time": 60.0}
+    reordered = {task: list(reversed(days)) for task, days in task_schedules.items()}
+    assert instance_hashes(tasks, task_schedules, agents, parameters, workbook.dates) == instance_hashes(
+        tasks, reordered, agents, dict(reversed(parameters.items())), workbook.dates
+    )
+
+
+def test_changed_inputs_change_the_key_but_not_the_family(workbook, instance):
+    tasks, task_schedules, agents = instance
+    key, family = instance_hashes(tasks, task_schedules, agents, dates=workbook.dates)
+
+    agent = agents[0]
+    free_day = next(day for day in range(len(workbook.dates)) if day not in agent.days_off)
+    unscheduled_day = next(day for day in range(len(workbook.dates)) if day not in task_schedules[tasks[-1]])
+    edits = [
+        {"edit": "day_off", "agent": agent.name, "day": free_day},
+        {"edit": "qualify" if not agent.qualified(tasks[-1]) else "unqualify", "agent": agent.name, "task": tasks[-1]},
+        {"edit": "task_day", "task": tasks[-1], "day": unscheduled_day},
+    ]
+    for edit in edits:
+        edited = apply_edits(tasks, task_schedules, agents, [edit])
+        assert instance_hashes(*edited, dates=workbook.dates) != (key, family)
+        assert instance_hashes(*edited, dates=workbook.dates)[1] == family, f"Edit {edit} changed the family"
+
+    # Other solver parameters, or the same days on other dates (other weekends)
+    assert instance_hashes(tasks, task_schedules, agents, {"sparse": False}, workbook.dates)[0] != key
+    shifted = pd.DatetimeIndex(workbook.dates) + pd.Timedelta(days=1)
+    shifted_key, shifted_family = instance_hashes(tasks, task_schedules, agents, dates=shifted)
+    assert shifted_key != key
+    assert shifted_family == family
+
+
+def test_changed_agents_change_the_family(workbook, instance):
+    tasks, task_schedules, agents = instance
+    _, family = instance_hashes(tasks, task_schedules, agents, dates=workbook.dates)
+    assert instance_hashes(tasks, task_schedules, agents[1:], dates=workbook.dates)[1] != family
+
+
+def test_cache_returns_entries_by_key_and_near_misses_by_family(tmp_path, workbook, instance):
+    tasks, task_schedules, agents = instance
+    cache = SolveCache(str(tmp_path))
+    key, family = instance_hashes(tasks, task_schedules, agents, dates=workbook.dates)
+    entry = {"status": "OPTIMAL", "objective": 6.0, "assignments": [], "agent_assignments": {}}
+    cache.put(key, family, entry)
+
+    other_key, _ = instance_hashes(tasks, task_schedules, agents, {"sparse": False}, workbook.dates)
+    assert cache.get(key, family)["objective"] == 6.0
+    assert cache.get(other_key, family) is None
+    assert cache.near_miss(other_key, family)["objective"] == 6.0
@@ -0,0 +1,25 @@
+import pytest
+
+from app.utils.schedule_validator import ScheduleValidator
+from app.utils.scheduling_model import BackSchedulingModel
+from app.utils.solution_format import ColumnarSolution
+from app.utils.solver_backends import solve_with_backend
+
+
+@pytest.mark.parametrize("backend", ["SCIP", "CBC", "HIGHS"])
+def test_mip_backend_agrees_with_cp_sat(workbook, instance, backend: str):
+    tasks, task_schedules, agents = instance
+    back_model = BackSchedulingModel(tasks, task_schedules, agents, dates=workbook.dates).build()
+
+    cp_sat_status, cp_sat_objective, _, _, _ = solve_with_backend(back_model, "CP-SAT", 30.0)
+    status, objective, bound, _, solution = solve_with_backend(back_model, backend, 30.0)
+
+    assert cp_sat_status == status == "OPTIMAL"
+    assert objective == pytest.approx(cp_sat_objective)
+    assert bound == pytest.approx(objective)
+
+    # The MIP's solution is a valid schedule in its own right
+    columns = ColumnarSolution.from_assignments(*solution, tasks)
+    validator = ScheduleValidator(tasks, task_schedules, agents, requirements=back_model.requirements, dates=workbook.dates)
+    assert validator.violations(columns.agent, columns.task, columns.day) == []
+    assert max(solution[1].values()) == pytest.approx(objective)